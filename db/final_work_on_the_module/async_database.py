@@ -0,0 +1,253 @@
+"""
+Модуль для асинхронной работы с бд.
+Повторяет операции класса Database поверх асинхронного пула соединений psycopg 3:
+те же метрики и повтор идемпотентных запросов после потери соединения.
+"""
+
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from config import DB_PATH, DB_POOL, config_logging
+from database import build_upsert
+from metrics import DB_COMMIT_SECONDS, DB_ERRORS, DB_REPLAYS, DB_SECONDS, current_label, timed
+
+config_logging()
+logger = logging.getLogger('async_database')
+
+# Коды ошибок, с которыми сервер PostgreSQL закрывает соединение (None - соединение оборвалось без ответа)
+_DISCONNECT_CODES = {None, psycopg.errors.AdminShutdown.sqlstate, psycopg.errors.CrashShutdown.sqlstate,
+                     psycopg.errors.CannotConnectNow.sqlstate}
+
+# Запрос подготавливается на сервере (PREPARE) с первого выполнения, как запросы Database.execute_prepared.
+# psycopg 3 хранит подготовленные запросы каждого соединения и готовит их заново на новом соединении.
+PREPARE_THRESHOLD = 0
+
+
+class AsyncDatabase:
+    """
+    Асинхронный вариант класса Database с теми же методами
+    select_data, insert_data, update_data и upsert.
+
+    Пул соединений открывается вызовом open() внутри работающего цикла событий.
+    Запросы подготавливаются на сервере при первом выполнении на соединении (prepare_threshold),
+    а идемпотентные запросы после потери соединения выполняются повторно один раз.
+    """
+
+    def __init__(self, dbname=DB_PATH['dbname'], user=DB_PATH['user'], password=DB_PATH['password'], host='localhost',
+                 port=5432, pool=None):
+        """
+        Инициализация асинхронного пула соединений базы данных.
+
+        :param dbname: Имя базы данных.
+        :param user: Имя пользователя базы данных.
+        :param password: Пароль пользователя базы данных.
+        :param host: Хост базы данных (по умолчанию 'localhost').
+        :param port: Порт базы данных (по умолчанию 5432).
+        :param pool: Необязательный готовый асинхронный пул соединений.
+        """
+        self.dbname = dbname
+        self.pool = pool or AsyncConnectionPool(
+            kwargs={'dbname': dbname, 'user': user, 'password': password, 'host': host, 'port': port,
+                    'prepare_threshold': PREPARE_THRESHOLD},
+            min_size=DB_POOL['minconn'],
+            max_size=DB_POOL['maxconn'],
+            timeout=DB_POOL['timeout'],
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+
+    async def open(self):
+        """Открытие пула соединений."""
+        await self.pool.open()
+        logger.info(f"Асинхронный пул соединений с {self.dbname} открыт")
+
+    async def close(self):
+        """Закрытие пула соединений."""
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def cursor(self):
+        """
+        Асинхронный контекстный менеджер: берёт соединение из пула и отдаёт курсор.
+        Транзакция фиксируется при успешном выходе и откатывается при ошибке.
+        Время фиксации и ошибки базы данных записываются в метрики, как в Database.cursor.
+        """
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    yield cur
+                started = time.perf_counter()
+                await conn.commit()
+                DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        except psycopg.Error:
+            DB_ERRORS.inc(operation=current_label('operation'))
+            raise
+
+    async def _execute(self, query, values=None, fetch=None, idempotent=False):
+        """
+        Выполнение запроса на соединении из пула.
+
+        :param query: SQL-запрос.
+        :param values: Значения для подстановки в запрос.
+        :param fetch: 'one' - вернуть одну строку, 'all' - все строки, None - ничего.
+        :param idempotent: Запрос можно повторить: при потере соединения он будет
+            выполнен ещё раз на новом соединении.
+        :return: Результат выборки в зависимости от fetch.
+        """
+        for attempt in range(2):
+            try:
+                async with self.cursor() as cur:
+                    await cur.execute(query, values)
+                    if fetch == 'one':
+                        return await cur.fetchone()
+                    if fetch == 'all':
+                        return await cur.fetchall()
+                    return None
+            except psycopg.Error as e:
+                if attempt or not idempotent or not self.is_disconnect(e):
+                    raise
+                operation = current_label('operation')
+                DB_REPLAYS.inc(operation=operation)
+                logger.warning(f'Соединение потеряно, запрос {operation} будет выполнен повторно: {e}')
+
+    async def execute(self, query, values=None, fetch=None, idempotent=False):
+        """
+        Выполнение запроса модуля, который хранит свои запросы сам (например, хранилища сессий).
+        Ошибки базы данных передаются вызывающему, время записывает вызывающий под своей меткой operation.
+
+        :param query: SQL-запрос.
+        :param values: Значения для подстановки в запрос.
+        :param fetch: 'one' - вернуть одну строку, 'all' - все строки, None - ничего.
+        :param idempotent: Запрос можно повторить после потери соединения.
+        :return: Результат выборки в зависимости от fetch.
+        """
+        return await self._execute(query, values, fetch=fetch, idempotent=idempotent)
+
+    @staticmethod
+    def is_disconnect(error):
+        """
+        Ошибка вызвана потерей соединения с сервером, как PostgresBackend.is_disconnect.
+        Таймаут ожидания свободного соединения в пуле к таким ошибкам не относится.
+
+        :param error: Исключение psycopg.
+        :return: bool
+        """
+        return (isinstance(error, (psycopg.OperationalError, psycopg.InterfaceError))
+                and not isinstance(error, PoolTimeout)
+                and error.sqlstate in _DISCONNECT_CODES)
+
+    def pool_stats(self):
+        """
+        Статистика использования пула соединений.
+
+        :return: dict Счётчики пула.
+        """
+        return self.pool.get_stats()
+
+    @timed(DB_SECONDS, operation='insert_data')
+    async def insert_data(self, table_name: str, data: dict):
+        """
+        Вставка данных в таблицу.
+
+        :param table_name: Имя таблицы.
+        :param data: Словарь с данными для вставки
+        в формате {'column1': value1, 'column2': value2, ...}.
+        :return: ID вставленной записи.
+        """
+        try:
+            columns = data.keys()
+            values = data.values()
+            query = sql.SQL(
+                f"INSERT INTO {table_name} ({', '.join(columns)})"
+                f" VALUES ({', '.join(['%s'] * len(values))}) RETURNING id"
+            )
+            inserted_id = (await self._execute(query, list(values), fetch='one'))[0]
+            return inserted_id
+        except psycopg.DatabaseError as e:
+            logger.error(f"Ошибка при вставке данных в таблицу {table_name}: {e}")
+            return None
+
+    @timed(DB_SECONDS, operation='upsert')
+    async def upsert(self, table_name: str, data: dict, conflict_columns: list | tuple, update: dict = None):
+        """
+        Вставка строки или обновление существующей одним запросом (INSERT ... ON CONFLICT).
+
+        :param table_name: Имя таблицы.
+        :param data: Словарь с данными для вставки {'column': value}. Значение может быть Subquery.
+        :param conflict_columns: Столбцы уникального индекса.
+        :param update: Словарь {'column': 'SQL-выражение'} для обновления существующей строки.
+        :return: ID вставленной или обновлённой записи, None при ошибке или если строка не изменилась.
+        """
+        try:
+            query, query_values = build_upsert(table_name, data, conflict_columns, update)
+            row = await self._execute(sql.SQL(query), query_values, fetch='one')
+            return row[0] if row else None
+        except psycopg.DatabaseError as e:
+            logger.error(f"Ошибка при upsert в таблицу {table_name}: {e}")
+            return None
+
+    @timed(DB_SECONDS, operation='select_data')
+    async def select_data(self, table_name, columns: str = '*',
+                          condition: str = None, values: tuple = None):
+        """
+        Выполнение SELECT-запроса.
+
+        :param table_name: Имя таблицы.
+        :param columns: Список столбцов для выборки, по умолчанию '*' - все столбцы.
+        :param condition: Условие WHERE для фильтрации данных, строка SQL.
+        :param values: Значения для подстановки в условие WHERE, кортеж.
+        :return: Список кортежей с данными.
+        """
+        try:
+            columns_str = ', '.join(columns) if isinstance(columns, list) else columns
+            query = f"SELECT {columns_str} FROM {table_name}"
+            if condition:
+                query += f" WHERE {condition}"
+            rows = await self._execute(sql.SQL(query), values, fetch='all', idempotent=True)
+            return rows
+        except psycopg.DatabaseError as e:
+            logger.error(f"Ошибка при выполнении SELECT из таблицы {table_name}: {e}")
+            return []
+
+    @timed(DB_SECONDS, operation='update_data')
+    async def update_data(self, table_name: str, data: dict, condition: str, values: tuple = None):
+        """
+        Обновление данных в таблице.
+
+        :param table_name: Имя таблицы.
+        :param data: Словарь с данными для обновления
+        в формате {'column1': value1, 'column2': value2, ...}. Если value1 это строка,
+        которая содержит арифметическое выражение (например, "column + 1"),
+        то она будет использована напрямую в SQL-запросе.
+        :param condition: Условие WHERE для фильтрации записей, строка SQL.
+        :param values: Необязательный параметр. Значения для подстановки в условие WHERE, кортеж.
+        :return: True, если обновление прошло успешно, иначе False.
+        """
+        try:
+            set_clause = []
+            query_values = []
+
+            for column, value in data.items():
+                # Проверка на арифметическое выражение
+                if isinstance(value, str) and any(op in value for op in ['+', '-', '*', '/']):
+                    set_clause.append(f"{column} = {value}")
+                else:
+                    set_clause.append(f"{column} = %s")
+                    query_values.append(value)
+
+            query = sql.SQL(f"UPDATE {table_name} SET {', '.join(set_clause)} WHERE {condition}")
+
+            if values:
+                query_values.extend(values)
+
+            await self._execute(query, query_values)
+            logger.info('Обновление в таблице %s прошло успешно', table_name)
+            return True
+        except psycopg.DatabaseError as e:
+            logger.error(f"Ошибка при обновлении данных в таблице {table_name}: {e}")
+            return False
@@ -0,0 +1,99 @@
+"""
+    Модуль для асинхронной обработки команд и сообщений Telegram-бота (AsyncTeleBot).
+"""
+import bot_msg, btn_text
+from buttons import start_button
+from metrics import HANDLER_ERRORS, HANDLER_SECONDS, timed
+from async_utils import AsyncGameUtils
+
+
+class AsyncHandlers:
+    """
+        Асинхронный вариант класса Handlers.
+
+        Attributes:
+        bot (telebot.async_telebot.AsyncTeleBot): Объект бота для взаимодействия с Telegram API.
+        game_utils (AsyncGameUtils): Асинхронные утилиты для работы с игровыми функциями.
+    """
+
+    def __init__(self, bot):
+        """
+            Инициализация обработчика команд и баз данных.
+
+            :param bot (telebot.async_telebot.AsyncTeleBot): Асинхронный объект бота.
+        """
+        self.bot = bot
+        self.setup_handlers()
+        self.game_utils = AsyncGameUtils(self.bot)
+
+    def setup_handlers(self):
+        """
+            Настройка обработчиков команд.
+        """
+
+        @self.bot.message_handler(commands=['start'])
+        async def start_bot(message):
+            await self.handle_start(message)
+
+        @self.bot.message_handler(commands=['help'])
+        async def help(message):
+            await self.handle_help(message)
+
+        # обработчик кнопки btn_text.BTN_STAR_GEME
+        @self.bot.message_handler(func=lambda message: message.text == btn_text.BTN_STAR_GEME)
+        async def start_geme(message):
+            """
+                Обработка нажатия кнопки BTN_STAR_GEME.
+
+                :param message: Сообщение от пользователя.
+                :type message: telebot.types.Message
+            """
+            await self.game_utils.get_user_name(message)
+
+        @self.bot.message_handler(func=lambda message: True)
+        async def all_messages(message):
+            """
+                Обработка всех входящих сообщений.
+
+                :param message: Сообщение от пользователя.
+                :type message: telebot.types.Message
+            """
+            await self.handle_all_messages(message)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_start')
+    async def handle_start(self, message):
+        """
+            Обработка команды /start и отправляет приветственное сообщение.
+
+            :param message : (telebot.types.Message) Сообщение от пользователя.
+        """
+        chat_id = message.chat.id
+        await self.bot.send_message(chat_id, bot_msg.MSG_START,
+                                    reply_markup=start_button(), parse_mode="HTML")
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_help')
+    async def handle_help(self, message):
+        """
+           Обработка команды /help и отправляет сообщение с помощью.
+
+           :param message : (telebot.types.Message) Сообщение от пользователя.
+        """
+        chat_id = message.chat.id
+        await self.bot.send_message(chat_id, bot_msg.MSG_HELP)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_all_messages')
+    async def handle_all_messages(self, message):
+        """
+            Обработка всех входящих сообщений.
+
+            Сообщение передаётся ожидающему шагу игры (ответ или имя пользователя),
+            а если его нет - пользователю сообщается, что сессия прервалась.
+
+            :param message: Сообщение от пользователя.
+            :type message: telebot.types.Message
+        """
+        if await self.game_utils.process_next_step(message):
+            return
+        chat_id = message.chat.id
+        await self.bot.send_message(chat_id, 'Сессия прервалась нажмите на кнопку',
+                                    reply_markup=start_button())
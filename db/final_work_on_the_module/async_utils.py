@@ -0,0 +1,613 @@
+"""
+    Асинхронные варианты утилит игрового процесса и работы с базой данных
+    для запуска бота на AsyncTeleBot.
+"""
+import asyncio
+import logging
+import random
+import time
+
+import psycopg
+
+from async_database import AsyncDatabase
+from cache import TTLCache
+from config import LEADERBOARD_TTL, SCHEDULE_CACHE, SESSIONS, USER_CACHE, config_logging
+from distractors import DistractorIndex
+from leaderboard import Leaderboard
+from metrics import DB_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS, timed
+from scheduler import LOAD_SCHEDULE, LOAD_WORD, SAVE_CARD, WordScheduler
+from sessions import SESSION_STATEMENTS, SessionStore
+from buttons import translation_buttons, start_button
+from btn_text import VIEW_RATING
+from bot_msg import MSG_NO_WORDS
+from utils import GameUtils, PREPARED_STATEMENTS, RANDOM_WORDS_CONDITION, SAMPLE_WINDOW, user_word_data
+from vocabulary import VocabularyStore
+
+logger = logging.getLogger('async_utils')
+config_logging()
+
+# Тот же запрос, что выполняет DatabaseUtils.update_points: возвращает очки после изменения
+UPDATE_POINTS = PREPARED_STATEMENTS['update_points']
+
+
+class AsyncGameUtils(GameUtils):
+    """
+        Асинхронный вариант GameUtils для AsyncTeleBot.
+
+        AsyncTeleBot не поддерживает register_next_step_handler, поэтому ожидаемый
+        следующий шаг каждого чата хранится в словаре next_steps и вызывается
+        из process_next_step. Ожидаемые ответы на вопросы хранятся в AsyncSessionStore:
+        в памяти и в таблице game_session, как в синхронном режиме.
+
+        GameUtils.__init__ не вызывается: он создаёт синхронные WordScheduler и SessionStore,
+        которые обращаются к базе данных через пул psycopg2 и заблокировали бы цикл событий.
+        Вместо них используются AsyncWordScheduler и AsyncSessionStore.
+
+        Attributes:
+            bot (telebot.async_telebot.AsyncTeleBot): Асинхронный объект Telegram-бота.
+            db (AsyncDatabaseUtils): Асинхронный объект для взаимодействия с базой данных.
+            vocabulary (VocabularyStore): Словарь слов из CSV-файла в памяти.
+            distractors (DistractorIndex): Неправильные варианты перевода по группам похожих слов.
+            scheduler (AsyncWordScheduler): Расписание повторений слов пользователей.
+            sessions (AsyncSessionStore): Ожидаемые ответы чатов.
+            mode (str): Всегда 'reply': инлайн-режим игры поддерживается только синхронными обработчиками.
+            next_steps (dict): Ожидаемый шаг по chat_id: (корутина-обработчик, аргументы).
+    """
+
+    def __init__(self, bot, db=None):
+        self.bot = bot
+        self.db = db or AsyncDatabaseUtils()
+        self.vocabulary = VocabularyStore('russian_english_words.csv')
+        self.distractors = DistractorIndex.build(self.vocabulary)
+        self.scheduler = AsyncWordScheduler(self.db, maxsize=SCHEDULE_CACHE['maxsize'], ttl=SCHEDULE_CACHE['ttl'])
+        self.sessions = AsyncSessionStore(self.db, ttl=SESSIONS['ttl'], maxsize=SESSIONS['maxsize'],
+                                          sweep_interval=SESSIONS['sweep_interval'])
+        self.mode = 'reply'
+        self.next_steps = {}
+
+    def register_next_step(self, chat_id, callback, *args):
+        """
+            Регистрирует обработчик следующего сообщения чата.
+
+            :param chat_id: Идентификатор чата.
+            :param callback: Корутина, которая получит следующее сообщение.
+            :param args: Дополнительные аргументы обработчика.
+        """
+        self.next_steps[chat_id] = (callback, args)
+
+    async def process_next_step(self, message):
+        """
+            Передаёт сообщение зарегистрированному обработчику следующего шага,
+            а если его нет - в check_answer, когда чат ожидает ответ на вопрос.
+
+            :param message: Сообщение от пользователя.
+
+            :return: True, если сообщение обработано, иначе False.
+        """
+        step = self.next_steps.pop(message.chat.id, None)
+        if step is None:
+            session = await self.sessions.take(message.chat.id)
+            if session is None:
+                return False
+            await self.check_answer(message, session.word_id, session.answer)
+            return True
+        callback, args = step
+        await callback(message, *args)
+        return True
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='get_user_name')
+    async def get_user_name(self, message):
+        """
+            Запрашивает имя пользователя или продолжает игру, если пользователь уже сохранён.
+
+            :param message: Сообщение от пользователя, содержащее его идентификатор.
+        """
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+        user_info = await self.db.search_user(user_id)
+        if user_info is None:
+            await self.bot.send_message(chat_id, 'Как я могу к вам обращаться?')
+            self.register_next_step(chat_id, self.save_user_name)
+        else:
+            await self.bot.send_message(chat_id, 'Игра продолжается!!')
+            await self.start_game(message)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='save_user_name')
+    async def save_user_name(self, message):
+        """
+            Сохраняет имя пользователя в базе данных и начинает игру.
+
+            :param message: Сообщение от пользователя, содержащее его имя.
+        """
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+        user_name = message.text
+
+        await self.db.save_user(user_name, user_id)
+
+        await self.bot.send_message(chat_id, f"Приятно познакомиться, {user_name}!\n Да начнется игра!!")
+        await self.start_game(message)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='start_game')
+    async def start_game(self, message):
+        """
+            Отправляет пользователю слово для перевода и варианты ответа.
+
+            :param message: Сообщение от пользователя, содержащее его идентификатор.
+        """
+        chat_id = message.chat.id
+        generated = await self.word_generator(message)
+        if generated is None:
+            await self.bot.send_message(chat_id, MSG_NO_WORDS, reply_markup=start_button())
+            return
+        word, correct_translation, text_buttons, id_word_db = generated
+
+        text_buttons.append(correct_translation)
+        if id_word_db is None:
+            id_word_db = await self.db.search_word(word)
+        markup = translation_buttons(text_buttons)
+
+        await self.sessions.set(chat_id, id_word_db, correct_translation)
+        await self.bot.send_message(chat_id, f"Как перевести слово '<b>{word}</b>'?",
+                                    reply_markup=markup, parse_mode="HTML")
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='check_answer')
+    async def check_answer(self, message, id_word, correct_translation):
+        """
+            Проверяет ответ пользователя и обновляет его очки.
+
+            :param message: Сообщение от пользователя с его выбором.
+            :param id_word: Идентификатор слова в базе данных.
+            :param correct_translation: Правильный перевод слова.
+        """
+        chat_id = message.chat.id
+        user_answer = message.text
+        user_id = message.from_user.id
+
+        if user_answer == correct_translation:
+            await self.bot.send_message(chat_id, "Превосходно! Вы справились! 🌟 +1 балл!")
+            await self.db.update_points(user_id, 1)
+            await self.db.update_times_shown(user_id, id_word)
+            if id_word is not None:
+                await self.scheduler.record(user_id, id_word, correct=True)
+            await self.start_game(message)
+        elif user_answer == VIEW_RATING:
+            result = await self.display_player_rating(user_id)
+            await self.bot.send_message(chat_id, result, parse_mode='HTML')
+            await self.bot.send_message(chat_id, 'Дя продолжения нажмите кнопку',
+                                        reply_markup=start_button())
+        else:
+            await self.bot.send_message(chat_id, "Не совсем так. Но не отчаивайтесь! 💔 -3 балла!")
+            await self.db.update_points(user_id, 3, add=False)
+            if id_word is not None:
+                await self.scheduler.record(user_id, id_word, correct=False)
+            await self.start_game(message)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='word_generator')
+    async def word_generator(self, message):
+        """
+            Выбирает слово, которое пользователю пора повторить по расписанию, а если такого нет -
+            слово и его перевод из CSV-файла или базы данных. Неправильные варианты перевода
+            берутся из индекса неправильных вариантов в памяти. Если выбранный источник
+            не вернул слов, слово читается из другого источника.
+
+            :param message: Сообщение от пользователя в Telegram.
+
+            :return: Кортеж (слово, правильный перевод, список неправильных вариантов,
+                ID слова или None, если слово выбрано не из расписания).
+                None, если слов для пользователя нет ни в CSV-файле, ни в базе данных.
+        """
+        id_user = message.from_user.id
+        word_id = None
+        due = await self.scheduler.next_due(id_user)
+        if due is not None:
+            word_id, word, translation = due
+        else:
+            sources = [self.read_words_csv, self.read_words_bd]
+            random.shuffle(sources)
+            word_dicr = await sources[0](id_user, 1) or await sources[1](id_user, 1)
+            if not word_dicr:
+                logger.warning(f'Нет слов для пользователя {id_user}')
+                return None
+            word, translation = next(iter(word_dicr.items()))
+
+        text_buttons = self.distractors.pick(translation)
+        if len(text_buttons) < 3:
+            options = await self.read_words_bd(id_user)
+            text_buttons += [option for option in options.values()
+                             if option != translation and option not in text_buttons][:3 - len(text_buttons)]
+        return word, translation, text_buttons, word_id
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='read_words_csv')
+    async def read_words_csv(self, user_id: int, quantity: int = 4):
+        """
+            Выдаёт неиспользованные слова из CSV-словаря и сохраняет новые слова в базе данных.
+
+            :param user_id: ID пользователя в Telegram.
+            :param quantity: Требуемое количество слов (по умолчанию 4).
+
+            :return: dict Словарь русских слов и их переводов.
+        """
+        words_dict = {}
+        try:
+            selected_words = await asyncio.to_thread(self.vocabulary.take, quantity)
+
+            for word, translation in selected_words:
+                if await self.db.search_word(word) is None:
+                    await self.db.save_word(word, translation)
+                words_dict[word] = translation
+
+            if len(words_dict) < quantity:
+                words_dict.update(await self.db.get_random_words_for_user(user_id, quantity - len(words_dict)))
+
+            return words_dict
+
+        except Exception as e:
+            logger.error(f'ошибка {e}')
+            words_dict.update(await self.read_words_bd(user_id))
+            return words_dict
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='read_words_bd')
+    async def read_words_bd(self, user_id, quantity: int = 4):
+        """
+            Запрашивает слова с переводом из базы данных, недостающие берутся из CSV-словаря.
+
+            :param user_id: ID пользователя в Telegram.
+            :param quantity: Требуемое количество слов (по умолчанию 4).
+
+            :return: dict Словарь русских слов и их переводов.
+        """
+        result = await self.db.get_random_words_for_user(user_id, quantity)
+
+        if len(result) < quantity:
+            result.update(await self.read_words_csv(user_id, quantity - len(result)))
+        return result
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='display_player_rating')
+    async def display_player_rating(self, telegram_user_id):
+        """
+            Формирует сообщение с рейтингом, предварительно обновив рейтинг в памяти.
+
+            :param telegram_user_id: Идентификатор пользователя в Telegram.
+
+            :return: Сообщение с рейтингом для отправки пользователю.
+        """
+        await self.db.refresh_leaderboard()
+        # Время уже записывается этим методом, поэтому вызывается синхронный метод без замера
+        return GameUtils.display_player_rating.__wrapped__(self, telegram_user_id)
+
+
+class AsyncSessionStore(SessionStore):
+    """
+        Асинхронный вариант SessionStore: сессии хранятся в памяти и в таблице game_session,
+        запросы выполняются через пул psycopg 3 (подготавливаются на сервере самим psycopg).
+
+        Фоновый поток удаляет просроченные сессии только из памяти, а из базы данных они
+        удаляются при записи сессии не чаще раза в sweep_interval секунд: пул psycopg 3
+        работает только в цикле событий.
+    """
+
+    def __init__(self, db=None, ttl=86400.0, maxsize=10000, sweep_interval=60.0):
+        """
+        :param db: Объект AsyncDatabase или None.
+        :param ttl: Время жизни сессии в секундах.
+        :param maxsize: Максимальное количество сессий в памяти.
+        :param sweep_interval: Интервал удаления просроченных сессий в секундах.
+        """
+        super().__init__(ttl=ttl, maxsize=maxsize, sweep_interval=sweep_interval)
+        self.db = db
+        self._swept_at = time.monotonic()
+
+    async def _execute(self, name, values=(), fetch=None):
+        """
+        Выполняет запрос к таблице game_session, ошибки базы данных записываются в лог.
+
+        :param name: Имя запроса из SESSION_STATEMENTS.
+        :param values: Значения параметров.
+        :param fetch: 'all' - вернуть строки, None - ничего.
+        :return: Результат запроса или None при ошибке или без базы данных.
+        """
+        if self.db is None:
+            return None
+        try:
+            # Повторная запись и чтение сессии ничего не меняют, а DELETE ... RETURNING повторять нельзя
+            with timed(DB_SECONDS, operation=name):
+                return await self.db.execute(SESSION_STATEMENTS[name], values, fetch=fetch,
+                                             idempotent=name in ('session_save', 'session_get'))
+        except psycopg.DatabaseError as e:
+            self._failed(name, e)
+            return None
+
+    async def set(self, chat_id, word_id, answer):
+        """
+        Сохраняет ожидаемый ответ чата, заменяя предыдущий.
+
+        :param chat_id: Идентификатор чата.
+        :param word_id: ID слова в базе данных или None.
+        :param answer: Правильный перевод.
+        """
+        expires = self._remember(chat_id, word_id, answer)
+        await self._execute('session_save', (chat_id, word_id, answer, expires))
+        if time.monotonic() - self._swept_at >= self.sweep_interval:
+            self._swept_at = time.monotonic()
+            await self._execute('session_sweep')
+
+    async def get(self, chat_id):
+        """
+        Ожидаемый ответ чата без его удаления.
+
+        :param chat_id: Идентификатор чата.
+        :return: Session или None, если сессии нет или она просрочена.
+        """
+        return self._found(chat_id, await self._execute('session_get', (chat_id,), fetch='all'))
+
+    async def take(self, chat_id):
+        """
+        Забирает ожидаемый ответ чата: сессия удаляется из памяти и из базы данных.
+
+        :param chat_id: Идентификатор чата.
+        :return: Session или None, если сессии нет или она просрочена.
+        """
+        session = self._pop(chat_id)
+        return self._taken(session, await self._execute('session_take', (chat_id,), fetch='all'))
+
+    def sweep(self, now=None):
+        """
+        Удаляет просроченные сессии из памяти (вызывается фоновым потоком).
+
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: int Количество удалённых сессий.
+        """
+        return self._sweep_memory(time.time() if now is None else now)
+
+
+class AsyncWordScheduler(WordScheduler):
+    """
+        Асинхронный вариант WordScheduler: те же карточки и кэш расписаний,
+        запросы к базе данных выполняются через пул psycopg 3.
+    """
+
+    async def _load(self, telegram_user_id):
+        """
+        Загружает расписание пользователя из базы данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :return: UserSchedule или None при ошибке базы данных.
+        """
+        try:
+            async with self.db.cursor() as cur:
+                await cur.execute(LOAD_SCHEDULE, (telegram_user_id,))
+                rows = await cur.fetchall()
+        except psycopg.DatabaseError as e:
+            logger.error(f'Ошибка загрузки расписания пользователя {telegram_user_id}: {e}')
+            return None
+        return self._build(rows)
+
+    async def _schedule(self, telegram_user_id):
+        """
+        Расписание пользователя из кэша или из базы данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :return: UserSchedule или None, если расписание не удалось загрузить.
+        """
+        schedule = self._users.get(telegram_user_id)
+        if schedule is None:
+            schedule = self._remember(telegram_user_id, await self._load(telegram_user_id))
+        return schedule
+
+    async def next_due(self, telegram_user_id, now=None):
+        """
+        Слово, которое пользователю пора повторить.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: Кортеж (ID слова, слово, перевод) или None, если повторять пока нечего.
+        """
+        now = time.time() if now is None else now
+        schedule = await self._schedule(telegram_user_id)
+        if schedule is None:
+            return None
+        card = self._peek(schedule, now)
+        if card is None:
+            return None
+        if card.word is not None:
+            return card.word_id, card.word, card.translation
+
+        try:
+            async with self.db.cursor() as cur:
+                await cur.execute(LOAD_WORD, (card.word_id,))
+                row = await cur.fetchone()
+        except psycopg.DatabaseError as e:
+            logger.error(f'Ошибка загрузки слова {card.word_id}: {e}')
+            return None
+        return self._word_loaded(schedule, card, row)
+
+    async def record(self, telegram_user_id, word_id, correct, now=None):
+        """
+        Учитывает ответ пользователя и записывает карточку слова в базу данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        :param correct: Ответ правильный.
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: Card Обновлённая карточка или None, если расписание не удалось загрузить.
+        """
+        now = time.time() if now is None else now
+        schedule = await self._schedule(telegram_user_id)
+        if schedule is None:
+            logger.warning(f'Ответ пользователя {telegram_user_id} не записан в расписание: оно не загружено')
+            return None
+        card, values = self._review(schedule, telegram_user_id, word_id, correct, now)
+        try:
+            async with self.db.cursor() as cur:
+                await cur.execute(SAVE_CARD, values)
+        except psycopg.DatabaseError as e:
+            logger.error(f'Ошибка записи расписания пользователя {telegram_user_id}: {e}')
+        return card
+
+
+class AsyncDatabaseUtils(AsyncDatabase):
+    """
+       Асинхронный вариант DatabaseUtils с теми же запросами.
+
+       Attributes:
+           leaderboard (Leaderboard): Рейтинг игроков в памяти, загружается через refresh_leaderboard.
+           user_cache (TTLCache): Кэш {id, name, points} пользователей по Telegram ID.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.leaderboard = Leaderboard(None, ttl=LEADERBOARD_TTL)
+        self._leaderboard_task = None
+        self.user_cache = TTLCache(maxsize=USER_CACHE['maxsize'], ttl=USER_CACHE['ttl'])
+
+    async def refresh_leaderboard(self):
+        """
+            Загружает рейтинг из базы данных при первом обращении.
+            Если загрузка не удалась, рейтинг остаётся незагруженным и загружается следующим запросом.
+            Устаревший рейтинг перечитывается в фоновой задаче, запрос не ждёт её завершения.
+        """
+        if not self.leaderboard.is_loaded():
+            try:
+                self.leaderboard.load(await self.get_player_ratings())
+            except psycopg.DatabaseError as e:
+                logger.error(f'Ошибка загрузки рейтинга: {e}')
+        elif self.leaderboard.is_stale() and self.leaderboard.begin_refresh():
+            self._leaderboard_task = asyncio.get_running_loop().create_task(self._reload_leaderboard())
+
+    async def _reload_leaderboard(self):
+        """
+            Перечитывает рейтинг из базы данных, изменения очков во время чтения не теряются.
+        """
+        try:
+            self.leaderboard.track_changes()
+            self.leaderboard.load(await self.get_player_ratings())
+        except Exception as e:
+            logger.error(f'Ошибка загрузки рейтинга: {e}')
+            self.leaderboard.refresh_failed()
+
+    async def save_user(self, name, tg_user_id):
+        """
+        Сохраняет пользователя в таблице `users`.
+
+        :param name: str Имя пользователя.
+        :param tg_user_id: int Идентификатор пользователя в Телеграме.
+        """
+        data = {
+            'telegram_user_id': tg_user_id,
+            'name': name
+        }
+        user_id = await self.insert_data(table_name='users', data=data)
+        if user_id is not None:
+            self.user_cache.set(tg_user_id, {'id': user_id, 'name': name, 'points': 0})
+            self.leaderboard.add_user(tg_user_id, name)
+
+    async def search_user(self, tg_user_id):
+        """
+        Ищет пользователя по его Telegram ID.
+
+        :param tg_user_id: int Идентификатор пользователя в Телеграме.
+
+        :return: dict Словарь с ID, именем и очками или `None`.
+        """
+        cached = self.user_cache.get(tg_user_id)
+        if cached is not None:
+            return dict(cached)
+
+        result = await self.select_data(table_name='users', columns='id,name,points',
+                                        condition='telegram_user_id = %s', values=(tg_user_id,))
+        if result:
+            user_info = {'id': result[0][0], 'name': result[0][1], 'points': result[0][2]}
+            self.user_cache.set(tg_user_id, dict(user_info))
+            return user_info
+        return None
+
+    async def search_word(self, word):
+        """
+        Ищет слово в таблице `word`.
+
+        :param word: str Слово на русском языке.
+
+        :return: int Идентификатор слова или `None`.
+        """
+        result = await self.select_data('word', 'id', condition='russian_words = %s', values=(word,))
+        return result[0][0] if result else None
+
+    async def save_word(self, word, translation):
+        """
+        Сохраняет слово и его перевод в таблице `word`.
+
+        :param word: str Слово на русском языке.
+        :param translation: str Перевод слова на английский язык.
+        """
+        await self.insert_data('word', {'russian_words': word, 'translation': translation})
+
+    async def get_random_words_for_user(self, user_id: int, quantity: int = 4):
+        """
+            Выбирает случайные слова, показанные пользователю менее 4 раз,
+            по индексированному случайному ключу.
+
+            :param user_id: int Идентификатор пользователя в Telegram.
+            :param quantity: int Количество случайных слов (по умолчанию 4).
+
+            :return: dict Словарь русских слов и их переводов.
+        """
+        window = quantity * SAMPLE_WINDOW
+        start_key = random.random()
+        table_name = 'word w'
+        columns = 'w.russian_words, w.translation'
+
+        rows = await self.select_data(table_name=table_name, columns=columns,
+                                      condition=RANDOM_WORDS_CONDITION.format(op='>='),
+                                      values=(start_key, user_id, window))
+        if len(rows) < window:
+            rows += await self.select_data(table_name=table_name, columns=columns,
+                                           condition=RANDOM_WORDS_CONDITION.format(op='<'),
+                                           values=(start_key, user_id, window - len(rows)))
+
+        return {row[0]: row[1] for row in random.sample(rows, min(quantity, len(rows)))}
+
+    @timed(DB_SECONDS, operation='update_points')
+    async def update_points(self, user_id, points: int, add=True):
+        """
+            Обновляет количество очков пользователя в базе данных и в рейтинге.
+
+            :param user_id: ID пользователя в Telegram.
+            :param points: Количество очков для добавления или вычитания.
+            :param add: Флаг, указывающий, добавлять (True) или вычитать (False) очки.
+        """
+        delta = points if add else -points
+        try:
+            row = await self._execute(UPDATE_POINTS, (delta, user_id), fetch='one')
+        except psycopg.DatabaseError as e:
+            logger.error(f'Ошибка при обновлении очков пользователя {user_id}: {e}')
+            return
+        if row is not None:
+            self.leaderboard.set_points(user_id, row[0])
+            cached = self.user_cache.get(user_id)
+            if cached is not None:
+                self.user_cache.patch(user_id, points=cached['points'] + delta)
+
+    async def update_times_shown(self, telegram_user_id, word_id: int):
+        """
+        Обновляет количество показов слова для пользователя.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        """
+        cached = self.user_cache.get(telegram_user_id)
+        await self.upsert('users_word', user_word_data(telegram_user_id, word_id, cached and cached['id']),
+                          conflict_columns=('user_id', 'word_id'),
+                          update={'times_shown': 'users_word.times_shown + 1'})
+
+    @timed(DB_SECONDS, operation='get_player_ratings')
+    async def get_player_ratings(self):
+        """
+            Получает рейтинг игроков, отсортированный по убыванию очков.
+
+            :return: list Список словарей с telegram_user_id, именем и очками.
+            :raises psycopg.Error: При ошибке базы данных, как DatabaseUtils.get_player_ratings.
+        """
+        rows = await self._execute('SELECT telegram_user_id, name, points FROM users '
+                                   'ORDER BY points DESC, telegram_user_id', fetch='all', idempotent=True)
+        return [{'telegram_user_id': row[0], 'name': row[1], 'points': row[2]} for row in rows]
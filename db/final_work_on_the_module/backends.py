@@ -0,0 +1,431 @@
+"""
+    Модуль с хранилищами (бэкендами) базы данных для Database.
+
+    Хранилище выдаёт соединения DB-API и выполняет операции, синтаксис которых
+    различается между СУБД. PostgresBackend работает через пул соединений psycopg2,
+    SQLiteBackend - со встроенной базой SQLite в режиме WAL прямо в процессе бота,
+    без сервера и сетевых запросов.
+
+    Запросы бота написаны для PostgreSQL. SQLiteBackend переводит плейсхолдеры %s в ?,
+    EXTRACT(EPOCH FROM столбец) - в сам столбец (время хранится в Unix time), а функции
+    now(), to_timestamp() и random() регистрирует с поведением PostgreSQL. Ошибки sqlite3
+    преобразуются в исключения psycopg2 того же вида, поэтому обработка ошибок
+    в Database и DatabaseUtils не зависит от хранилища.
+"""
+import csv
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import psycopg2
+from psycopg2 import errorcodes, sql
+
+from config import config_logging
+from pool import PoolTimeout
+
+config_logging()
+logger = logging.getLogger('backends')
+
+# Коды ошибок, с которыми сервер PostgreSQL закрывает соединение
+_DISCONNECT_CODES = {None, errorcodes.ADMIN_SHUTDOWN, errorcodes.CRASH_SHUTDOWN, errorcodes.CANNOT_CONNECT_NOW}
+
+# Исключения psycopg2, соответствующие исключениям sqlite3, от частных к общим
+_SQLITE_ERRORS = (
+    (sqlite3.IntegrityError, psycopg2.IntegrityError),
+    (sqlite3.OperationalError, psycopg2.OperationalError),
+    (sqlite3.ProgrammingError, psycopg2.ProgrammingError),
+    (sqlite3.DataError, psycopg2.DataError),
+    (sqlite3.NotSupportedError, psycopg2.NotSupportedError),
+    (sqlite3.DatabaseError, psycopg2.DatabaseError),
+    (sqlite3.InterfaceError, psycopg2.InterfaceError),
+)
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+_EXTRACT_EPOCH = re.compile(r'EXTRACT\s*\(\s*EPOCH\s+FROM\s+([\w.]+)\s*\)', re.IGNORECASE)
+
+
+class Backend:
+    """
+        Интерфейс хранилища, с которым работает Database.
+
+        Attributes:
+            name (str): Имя хранилища: 'postgres' или 'sqlite'.
+            dbname (str): Имя базы данных (для SQLite - путь к файлу).
+    """
+
+    name = None
+    dbname = None
+
+    def connection(self):
+        """
+        Контекстный менеджер: соединение DB-API на время одной транзакции.
+        Фиксация и откат транзакции выполняются вызывающим кодом (Database.cursor).
+        """
+        raise NotImplementedError
+
+    def is_disconnect(self, error):
+        """
+        Ошибка вызвана потерей соединения, а не самим запросом: идемпотентный запрос можно повторить.
+
+        :param error: Исключение psycopg2.
+        :return: bool
+        """
+        return False
+
+    def add_column(self, cur, table_name: str, column: str, column_type: str):
+        """
+        Добавляет столбец в таблицу, если его ещё нет.
+
+        :param cur: Курсор открытой транзакции.
+        :param table_name: Имя таблицы.
+        :param column: Имя столбца.
+        :param column_type: Тип данных столбца с ограничениями и значением по умолчанию.
+        """
+        raise NotImplementedError
+
+    def bulk_insert_csv(self, cur, table_name: str, columns, csvfile, conflict_columns):
+        """
+        Загружает CSV-файл с заголовком в таблицу с пропуском дубликатов по conflict_columns.
+
+        :param cur: Курсор открытой транзакции.
+        :param table_name: Имя целевой таблицы.
+        :param columns: Столбцы в порядке их следования в CSV-файле.
+        :param csvfile: Открытый CSV-файл.
+        :param conflict_columns: Столбцы уникального индекса.
+        :return: Кортеж (прочитано строк, вставлено строк).
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Статистика соединений хранилища.
+
+        :return: dict Счётчики.
+        """
+        return {}
+
+    def close(self):
+        """
+        Закрывает соединения хранилища.
+        """
+
+
+class PostgresBackend(Backend):
+    """
+        Хранилище PostgreSQL: соединения берутся из пула ConnectionPool.
+
+        Attributes:
+            pool (ConnectionPool): Пул соединений psycopg2.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, pool):
+        """
+        :param pool: Объект ConnectionPool.
+        """
+        self.pool = pool
+        self.dbname = pool.conn_params.get('dbname')
+
+    def connection(self):
+        return self.pool.connection()
+
+    def is_disconnect(self, error):
+        """
+        Ошибка вызвана потерей соединения с сервером. Таймаут ожидания свободного
+        соединения в пуле к таким ошибкам не относится.
+
+        :param error: Исключение psycopg2.
+        :return: bool
+        """
+        return (isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                and not isinstance(error, PoolTimeout)
+                and getattr(error, 'pgcode', None) in _DISCONNECT_CODES)
+
+    def add_column(self, cur, table_name: str, column: str, column_type: str):
+        cur.execute(sql.SQL(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+
+    def bulk_insert_csv(self, cur, table_name: str, columns, csvfile, conflict_columns):
+        """
+        Файл потоком загружается командой COPY во временную таблицу, затем строки
+        переносятся в целевую таблицу запросом INSERT ... ON CONFLICT DO NOTHING.
+        """
+        staging = f'{table_name}_staging'
+        columns_str = ', '.join(columns)
+        conflict_str = ', '.join(conflict_columns)
+        cur.execute(sql.SQL(f"CREATE TEMP TABLE {staging} ON COMMIT DROP"
+                            f" AS SELECT {columns_str} FROM {table_name} WITH NO DATA"))
+        cur.copy_expert(sql.SQL(f"COPY {staging} ({columns_str}) FROM STDIN WITH (FORMAT csv, HEADER true)"),
+                        csvfile)
+        read_rows = cur.rowcount
+        cur.execute(sql.SQL(
+            f"INSERT INTO {table_name} ({columns_str})"
+            f" SELECT DISTINCT ON ({conflict_str}) {columns_str} FROM {staging}"
+            f" ORDER BY {conflict_str}"
+            f" ON CONFLICT ({conflict_str}) DO NOTHING"
+        ))
+        return read_rows, cur.rowcount
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close()
+
+
+@lru_cache(maxsize=1024)
+def _translate_text(query: str):
+    """
+    Переводит текст запроса PostgreSQL в синтаксис SQLite.
+
+    :param query: Текст запроса с плейсхолдерами %s.
+    :return: str Текст запроса с плейсхолдерами ?.
+    """
+    query = _EXTRACT_EPOCH.sub(r'\1', query)
+    return _PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', query)
+
+
+def translate_query(query):
+    """
+    Переводит запрос (строку или psycopg2.sql.SQL) в синтаксис SQLite.
+
+    :param query: SQL-запрос.
+    :return: str Текст запроса для sqlite3.
+    """
+    if isinstance(query, sql.Composable):
+        query = query.as_string(None)
+    return _translate_text(query)
+
+
+def translate_error(error):
+    """
+    Исключение psycopg2, соответствующее исключению sqlite3.
+
+    :param error: Исключение sqlite3.
+    :return: Исключение psycopg2 с тем же текстом.
+    """
+    for sqlite_error, pg_error in _SQLITE_ERRORS:
+        if isinstance(error, sqlite_error):
+            return pg_error(str(error))
+    return psycopg2.Error(str(error))
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """
+        Курсор SQLite, принимающий запросы в синтаксисе PostgreSQL.
+        Поддерживает with, как курсор psycopg2.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def execute(self, query, vars=None):
+        try:
+            return super().execute(translate_query(query), () if vars is None else vars)
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def executemany(self, query, vars_list):
+        try:
+            return super().executemany(translate_query(query), vars_list)
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def fetchone(self):
+        try:
+            return super().fetchone()
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def fetchall(self):
+        try:
+            return super().fetchall()
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """
+        Соединение SQLite с интерфейсом соединения psycopg2, который использует Database:
+        атрибуты closed и cursor_factory, ошибки фиксации в виде исключений psycopg2.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = 0
+        self.cursor_factory = SQLiteCursor
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_factory)
+
+    def commit(self):
+        try:
+            super().commit()
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def rollback(self):
+        try:
+            super().rollback()
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def close(self):
+        super().close()
+        self.closed = 1
+
+
+class SQLiteBackend(Backend):
+    """
+        Хранилище SQLite в режиме WAL.
+
+        В режиме WAL читатели не блокируют писателя и друг друга, а записи выполняются
+        по очереди: писатель ждёт освобождения базы до timeout секунд. У каждого потока
+        свои соединения, они открываются при первом обращении потока и переиспользуются.
+        Несколько процессов (supervisor.py) могут работать с одним файлом на одном сервере.
+
+        Attributes:
+            path (str): Путь к файлу базы данных.
+            timeout (float): Сколько секунд ждать освобождения базы, занятой другим писателем.
+            synchronous (str): Режим PRAGMA synchronous: NORMAL - без fsync на каждую фиксацию
+                (при сбое питания теряются последние транзакции, но не целостность), FULL - с fsync.
+            factory (type): Класс соединения, наследник SQLiteConnection.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, timeout=5.0, synchronous='NORMAL', factory=SQLiteConnection):
+        """
+        Открывает базу данных и включает режим WAL.
+
+        :param path: Путь к файлу базы данных.
+        :param timeout: Время ожидания занятой базы в секундах.
+        :param synchronous: Режим PRAGMA synchronous.
+        :param factory: Класс соединения.
+        """
+        self.path = path
+        self.dbname = path
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.factory = factory
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {'acquired': 0, 'created': 0, 'busy': 0}
+
+        conn = self._connect()
+        journal_mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if journal_mode.lower() != 'wal':
+            logger.warning(f'Режим WAL недоступен для {path}, используется {journal_mode}')
+        self._idle().append(conn)
+        logger.info(f'База данных SQLite {path} открыта')
+
+    def _connect(self):
+        """
+        Открывает новое соединение и регистрирует функции PostgreSQL.
+
+        :return: SQLiteConnection
+        """
+        conn = sqlite3.connect(self.path, timeout=self.timeout, factory=self.factory, check_same_thread=False,
+                               cached_statements=256)
+        conn.create_function('now', 0, time.time)
+        conn.create_function('to_timestamp', 1, lambda value: value, deterministic=True)
+        # random() PostgreSQL возвращает число от 0 до 1, встроенная функция SQLite - целое
+        conn.create_function('random', 0, random.random)
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute('PRAGMA foreign_keys=ON')
+        with self._lock:
+            self._connections.append(conn)
+            self._stats['created'] += 1
+        return conn
+
+    def _idle(self):
+        """
+        Свободные соединения текущего потока.
+
+        :return: list
+        """
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Контекстный менеджер: выдаёт соединение текущего потока.
+        Незавершённая транзакция откатывается при возврате соединения.
+
+        :param timeout: Не используется, ожидание занятой базы задаётся в конструкторе.
+        """
+        if self._closed:
+            raise psycopg2.InterfaceError(f'База данных SQLite {self.path} закрыта')
+        idle = self._idle()
+        conn = idle.pop() if idle else self._connect()
+        with self._lock:
+            self._stats['acquired'] += 1
+        try:
+            yield conn
+        except psycopg2.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                with self._lock:
+                    self._stats['busy'] += 1
+            raise
+        finally:
+            if not conn.closed:
+                if conn.in_transaction:
+                    conn.rollback()
+                idle.append(conn)
+
+    def add_column(self, cur, table_name: str, column: str, column_type: str):
+        cur.execute(f'PRAGMA table_info({table_name})')
+        if column not in {row[1] for row in cur.fetchall()}:
+            cur.execute(f'ALTER TABLE {table_name} ADD COLUMN {column} {column_type}')
+
+    def bulk_insert_csv(self, cur, table_name: str, columns, csvfile, conflict_columns):
+        """
+        Строки файла вставляются одной транзакцией запросом INSERT ... ON CONFLICT DO NOTHING.
+        """
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        read_rows = 0
+
+        def rows():
+            nonlocal read_rows
+            for row in reader:
+                read_rows += 1
+                yield row
+
+        cur.executemany(f"INSERT INTO {table_name} ({', '.join(columns)})"
+                        f" VALUES ({', '.join(['%s'] * len(columns))})"
+                        f" ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING", rows())
+        return read_rows, cur.rowcount
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+            result['size'] = len(self._connections)
+        return result
+
+    def close(self):
+        """
+        Закрывает все соединения. При закрытии последнего соединения SQLite
+        переносит журнал WAL в основной файл базы данных.
+        """
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f'Ошибка закрытия соединения с {self.path}: {e}')
@@ -0,0 +1,79 @@
+"""
+    Микробенчмарк сборки клавиатур: построение ReplyKeyboardMarkup с сериализацией
+    на каждую отправку против закэшированных JSON-клавиатур из buttons.py.
+
+    Запуск:
+        python bench_buttons.py [количество повторов]
+"""
+import random
+import sys
+import timeit
+
+from keyboard import ReplyKeyboard
+from telebot import types
+from btn_text import BTN_STAR_GEME, VIEW_RATING
+from buttons import start_button, translation_buttons
+
+WORDS = ['apple', 'house', 'river', 'window', 'garden', 'street', 'winter', 'friend']
+
+
+def start_button_uncached():
+    """
+        Стартовая клавиатура, собираемая и сериализуемая заново.
+
+        :return: str JSON-представление клавиатуры.
+    """
+    reply_keyboard = ReplyKeyboard()
+    reply_keyboard.add_button(types.KeyboardButton(BTN_STAR_GEME))
+    return reply_keyboard.get_markup().to_json()
+
+
+def translation_buttons_uncached(text_buttons: list):
+    """
+        Клавиатура с вариантами перевода, собираемая и сериализуемая заново.
+
+        :param text_buttons: list Список слов для отображения на кнопках.
+        :return: str JSON-представление клавиатуры.
+    """
+    reply_keyboard = ReplyKeyboard(row_width=2)
+    random.shuffle(text_buttons)
+    buttons = [types.KeyboardButton(word) for word in text_buttons]
+    buttons.append(types.KeyboardButton(VIEW_RATING))
+    reply_keyboard.add_button(*buttons)
+    return reply_keyboard.get_markup().to_json()
+
+
+def bench(name, func, number):
+    """
+        Замеряет среднее время вызова функции.
+
+        :param name: Название замера.
+        :param func: Функция без аргументов.
+        :param number: Количество вызовов.
+        :return: float Среднее время вызова в микросекундах.
+    """
+    per_call = min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+    print(f'{name:<36} {per_call:8.2f} мкс')
+    return per_call
+
+
+def main(number=20000):
+    options = lambda: random.sample(WORDS, 4)
+
+    assert start_button() == start_button_uncached()
+    random.seed(1)
+    expected = translation_buttons_uncached(options())
+    random.seed(1)
+    assert translation_buttons(options()) == expected
+
+    before = bench('start_button (без кэша)', start_button_uncached, number)
+    after = bench('start_button (кэш)', start_button, number)
+    print(f'{"ускорение":<36} {before / after:8.1f}x')
+
+    before = bench('translation_buttons (без кэша)', lambda: translation_buttons_uncached(options()), number)
+    after = bench('translation_buttons (кэш)', lambda: translation_buttons(options()), number)
+    print(f'{"ускорение":<36} {before / after:8.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -34,3 +34,5 @@ MSG_HELP = f"""
 "3. {btn_text.BTN_STAR_GEME} - Начните игру и проверьте свои знания."        
 
 """
+
+MSG_NO_WORDS = "Слова для игры закончились 📭 Попробуйте позже, когда в словаре появятся новые слова."
@@ -3,3 +3,4 @@
 """
 BTN_STAR_GEME = 'Начать игру! 🎮'
 VIEW_RATING = 'Посмотреть рейтинг! 🏆'
+CONTINUE_GAME = 'Продолжить ▶️'
@@ -1,42 +1,157 @@
 """
     Модуль для создания различных кнопок для Telegram-бота.
     Содержит функции для генерации кнопок с помощью классов клавиатур.
+
+    Клавиатуры возвращаются уже сериализованными в JSON-строку: telebot передаёт
+    строку reply_markup в Telegram API без повторной сериализации.
+    Стартовая клавиатура собирается один раз, а клавиатуры с вариантами перевода
+    склеиваются из закэшированных JSON-фрагментов кнопок.
+
+    Инлайн-клавиатуры режима game_mode = inline передают в callback_data короткие строки:
+        a:<ID слова>:<CRC32 варианта>  - ответ на вопрос;
+        r                              - показать рейтинг;
+        n                              - следующий вопрос.
+    Правильность ответа проверяется на сервере по переводу слова из базы данных.
 """
+import json
 import random
+import zlib
+from functools import lru_cache
 
-from keyboard import ReplyKeyboard
+from keyboard import InlineKeyboard, ReplyKeyboard
 from telebot import types
-from btn_text import BTN_STAR_GEME, VIEW_RATING
+from btn_text import BTN_STAR_GEME, CONTINUE_GAME, VIEW_RATING
+
+# Сколько JSON-фрагментов кнопок хранить в кэше
+BUTTON_CACHE_SIZE = 4096
 
+# Префиксы callback_data инлайн-кнопок
+CALLBACK_ANSWER = 'a'
+CALLBACK_RATING = 'r'
+CALLBACK_NEXT = 'n'
 
+
+@lru_cache(maxsize=1)
 def start_button():
     """
         Функция для создания стартовой клавиатуры с кнопками.
+        Клавиатура сериализуется один раз при первом вызове.
 
         :return:
-            ReplyKeyboard: Объект клавиатуры .
+            str: JSON-представление клавиатуры для reply_markup.
     """
     reply_keyboard = ReplyKeyboard()
     reply_keyboard.add_button(types.KeyboardButton(BTN_STAR_GEME))
 
-    return reply_keyboard.get_markup()
+    return reply_keyboard.get_markup().to_json()
 
 
-def translation_buttons(text_buttons: list):
+@lru_cache(maxsize=BUTTON_CACHE_SIZE)
+def _button_json(text):
+    """
+        JSON-фрагмент кнопки с текстом.
+
+        :param text: str Текст кнопки.
+
+        :return: str JSON-представление кнопки.
+    """
+    return json.dumps(types.KeyboardButton(text).to_dict())
+
+
+def translation_buttons(text_buttons: list, row_width=2):
     """
         Создает клавиатуру для выбора перевода слова.
 
         Функция генерирует клавиатуру с вариантами перевода, случайно перемешивая
         предоставленные слова. В конце списка кнопок добавляется кнопка для
-        просмотра статистики.
+        просмотра статистики. Результат совпадает с ReplyKeyboard(row_width=2),
+        но на каждый вызов выполняется только перемешивание и склейка строк.
 
         :param text_buttons: list Список слов для отображения на кнопках.
+        :param row_width: int Количество кнопок в одной строке.
+
+        :return: str JSON-представление клавиатуры для выбора перевода слова и просмотра статистики.
+    """
+    random.shuffle(text_buttons)
+    buttons = [_button_json(word) for word in text_buttons]
+    buttons.append(_button_json(VIEW_RATING))
+    rows = ('[' + ', '.join(buttons[i:i + row_width]) + ']'
+            for i in range(0, len(buttons), row_width))
+    return ('{"keyboard": [' + ', '.join(rows) + '], '
+            '"one_time_keyboard": false, "resize_keyboard": true}')
+
+
+def answer_token(text):
+    """
+        Короткий отпечаток варианта ответа для callback_data (лимит Telegram - 64 байта).
+
+        :param text: str Вариант перевода.
+
+        :return: str CRC32 текста в шестнадцатеричном виде.
+    """
+    return format(zlib.crc32(text.encode('utf-8')), 'x')
+
+
+@lru_cache(maxsize=BUTTON_CACHE_SIZE)
+def _inline_button_json(text, callback_data):
+    """
+        JSON-фрагмент инлайн-кнопки.
+
+        :param text: str Текст кнопки.
+        :param callback_data: str Данные, которые Telegram вернёт при нажатии.
+
+        :return: str JSON-представление кнопки.
+    """
+    return json.dumps(types.InlineKeyboardButton(text, callback_data=callback_data).to_dict())
+
 
-        :return: Клавиатура с кнопками для выбора перевода слова и просмотра статистики.
+def answer_buttons(word_id, text_buttons: list, row_width=2):
+    """
+        Создает инлайн-клавиатуру с вариантами перевода слова.
+
+        Варианты перемешиваются, каждая кнопка несёт ID слова и отпечаток своего текста,
+        последней добавляется кнопка просмотра рейтинга.
+
+        :param word_id: int ID слова в базе данных.
+        :param text_buttons: list Список вариантов перевода.
+        :param row_width: int Количество кнопок в одной строке.
+
+        :return: str JSON-представление инлайн-клавиатуры.
     """
-    reply_keyboard = ReplyKeyboard(row_width=2)
     random.shuffle(text_buttons)
-    buttons = [types.KeyboardButton(word) for word in text_buttons]
-    buttons.append(types.KeyboardButton(VIEW_RATING))
-    reply_keyboard.add_button(*buttons)
-    return reply_keyboard.get_markup()
+    buttons = [_inline_button_json(text, f'{CALLBACK_ANSWER}:{word_id}:{answer_token(text)}')
+               for text in text_buttons]
+    buttons.append(_inline_button_json(VIEW_RATING, CALLBACK_RATING))
+    rows = ('[' + ', '.join(buttons[i:i + row_width]) + ']'
+            for i in range(0, len(buttons), row_width))
+    return '{"inline_keyboard": [' + ', '.join(rows) + ']}'
+
+
+@lru_cache(maxsize=1)
+def continue_button():
+    """
+        Инлайн-клавиатура с кнопкой перехода к следующему вопросу.
+
+        :return: str JSON-представление клавиатуры для reply_markup.
+    """
+    inline_keyboard = InlineKeyboard()
+    inline_keyboard.add_button(CONTINUE_GAME, CALLBACK_NEXT)
+
+    return inline_keyboard.get_markup().to_json()
+
+
+def parse_callback(data):
+    """
+        Разбирает callback_data инлайн-кнопки.
+
+        :param data: str callback_data из CallbackQuery.
+
+        :return: tuple (префикс, ID слова, отпечаток ответа); для кнопок без ответа
+                 ID и отпечаток равны None. Для неизвестных данных возвращается (None, None, None).
+    """
+    if data in (CALLBACK_RATING, CALLBACK_NEXT):
+        return data, None, None
+    parts = (data or '').split(':')
+    if len(parts) == 3 and parts[0] == CALLBACK_ANSWER and parts[1].isdigit():
+        return CALLBACK_ANSWER, int(parts[1]), parts[2]
+    return None, None, None
@@ -0,0 +1,103 @@
+"""
+    Модуль с ограниченным LRU-кэшем со временем жизни записей.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+        Потокобезопасный LRU-кэш со временем жизни записей.
+
+        При превышении maxsize вытесняется запись, к которой дольше всего не обращались.
+        Запись старше ttl секунд считается отсутствующей.
+
+        Attributes:
+            maxsize (int): Максимальное количество записей.
+            ttl (float): Время жизни записи в секундах.
+            hits (int): Количество попаданий.
+            misses (int): Количество промахов.
+    """
+
+    def __init__(self, maxsize=10000, ttl=600.0):
+        """
+        Инициализация кэша.
+
+        :param maxsize: Максимальное количество записей.
+        :param ttl: Время жизни записи в секундах.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Возвращает значение по ключу.
+
+        :param key: Ключ.
+        :return: Значение или None, если записи нет или она устарела.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        """
+        Сохраняет значение по ключу.
+
+        :param key: Ключ.
+        :param value: Значение.
+        """
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def patch(self, key, **changes):
+        """
+        Изменяет поля закэшированного словаря, не продлевая время жизни записи.
+
+        :param key: Ключ.
+        :param changes: Новые значения полей.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data[key] = ({**item[0], **changes}, item[1])
+
+    def pop(self, key):
+        """
+        Удаляет запись из кэша.
+
+        :param key: Ключ.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        """
+        Статистика кэша.
+
+        :return: dict Размер, попадания, промахи и доля попаданий.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
@@ -2,12 +2,105 @@
     Модуль для настройки конфигурации проекта.
     Содержит функции для загрузки токенов и настройки логирования.
 """
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
 logger = logging.getLogger('config')
 
+
+class ConfigError(ValueError):
+    """
+    Некорректное значение параметра в token.env или в переменных окружения.
+    """
+
+
+def env_int(name, default, minimum=None):
+    """
+    Целочисленный параметр конфигурации.
+
+    :param name: Имя переменной окружения.
+    :param default: Значение по умолчанию.
+    :param minimum: Минимальное допустимое значение или None.
+    :return: int
+    :raises ConfigError: Если значение не целое число или меньше minimum.
+    """
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        result = int(value)
+    except ValueError:
+        raise ConfigError(f'Параметр {name}: ожидается целое число, получено {value!r}') from None
+    if minimum is not None and result < minimum:
+        raise ConfigError(f'Параметр {name}: значение должно быть не меньше {minimum}, получено {result}')
+    return result
+
+
+def env_float(name, default, minimum=None):
+    """
+    Числовой параметр конфигурации.
+
+    :param name: Имя переменной окружения.
+    :param default: Значение по умолчанию.
+    :param minimum: Минимальное допустимое значение или None.
+    :return: float
+    :raises ConfigError: Если значение не число или меньше minimum.
+    """
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return float(default)
+    try:
+        result = float(value)
+    except ValueError:
+        raise ConfigError(f'Параметр {name}: ожидается число, получено {value!r}') from None
+    if minimum is not None and result < minimum:
+        raise ConfigError(f'Параметр {name}: значение должно быть не меньше {minimum}, получено {result}')
+    return result
+
+
+def env_flag(name, default=False):
+    """
+    Параметр-переключатель: 1 - включено, 0 - выключено.
+
+    :param name: Имя переменной окружения.
+    :param default: Значение по умолчанию.
+    :return: bool
+    :raises ConfigError: Если значение не 0 и не 1.
+    """
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    if value.strip() not in ('0', '1'):
+        raise ConfigError(f'Параметр {name}: ожидается 0 или 1, получено {value!r}')
+    return value.strip() == '1'
+
+
+def env_choice(name, default, choices):
+    """
+    Параметр с фиксированным набором значений.
+
+    :param name: Имя переменной окружения.
+    :param default: Значение по умолчанию.
+    :param choices: Допустимые значения.
+    :return: str
+    :raises ConfigError: Если значения нет среди choices.
+    """
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    value = value.strip()
+    if value not in choices:
+        raise ConfigError(f"Параметр {name}: допустимые значения {', '.join(choices)}, получено {value!r}")
+    return value
+
+
 try:
     load_dotenv(dotenv_path='./token.env')
     TELEBOT_TOKEN = os.getenv('BOT_API_TOKEN')
@@ -22,23 +115,225 @@ except Exception as e:
     print(f' Ошибка config {e}')
     logger.error(f'Ошибка {e}')
 
+# Параметры ниже разбираются по одному: некорректное значение сразу останавливает запуск
+# с ConfigError, в котором указано имя параметра
+DB_POOL = {'minconn': env_int('db_pool_min', 1, minimum=0),
+           'maxconn': env_int('db_pool_max', 10, minimum=1),
+           'timeout': env_float('db_pool_timeout', 5, minimum=0),
+           'health_check_interval': env_float('db_pool_health_check', 30, minimum=0),
+           'reconnect_base': env_float('db_reconnect_base', 0.05, minimum=0),
+           'reconnect_cap': env_float('db_reconnect_max', 5, minimum=0)
+           }
+MIGRATE = {'attempts': env_int('migrate_attempts', 10, minimum=1),
+           'retry_max': env_float('migrate_retry_max', 30, minimum=0)
+           }
+DB_BACKEND = {'engine': env_choice('db_backend', 'postgres', ('postgres', 'sqlite')),
+              'path': os.getenv('sqlite_path', 'bot.sqlite3'),
+              'synchronous': env_choice('sqlite_synchronous', 'NORMAL', ('OFF', 'NORMAL', 'FULL', 'EXTRA'))
+              }
+POLLING_RETRY = {'base': env_float('polling_retry_base', 1, minimum=0),
+                 'cap': env_float('polling_retry_max', 60, minimum=0)
+                 }
+BOT_THREADS = env_int('bot_threads', 4, minimum=1)
+BOT_MODE = env_choice('bot_mode', 'polling', ('polling', 'webhook', 'async'))
+DISPATCHER = {'enabled': env_flag('dispatcher'),
+              'shards': env_int('dispatcher_shards', BOT_THREADS, minimum=1),
+              'queue_size': env_int('dispatcher_queue_size', 1000, minimum=1)
+              }
+GAME_MODE = env_choice('game_mode', 'reply', ('reply', 'inline'))
+WEBHOOK = {'url': os.getenv('webhook_url'),
+           'host': os.getenv('webhook_host', '127.0.0.1'),
+           'port': env_int('webhook_port', 8080, minimum=1),
+           'path': os.getenv('webhook_path', '/webhook'),
+           'secret': os.getenv('webhook_secret'),
+           'queue_size': env_int('webhook_queue_size', 1000, minimum=1),
+           'workers': env_int('webhook_workers', 4, minimum=1),
+           'max_body': env_int('webhook_max_body', 1048576, minimum=1)
+           }
+LEADERBOARD_TTL = env_float('leaderboard_ttl', 300, minimum=0)
+USER_CACHE = {'maxsize': env_int('user_cache_size', 10000, minimum=1),
+              'ttl': env_float('user_cache_ttl', 600, minimum=0)
+              }
+# Telegram хранит недоставленные обновления до 24 часов: столько же помнится засчитанное нажатие кнопки
+CALLBACK_DEDUP = {'maxsize': env_int('callback_dedup_size', 100000, minimum=1),
+                  'ttl': env_float('callback_dedup_ttl', 86400, minimum=0)
+                  }
+SCHEDULE_CACHE = {'maxsize': env_int('schedule_cache_size', 10000, minimum=1),
+                  'ttl': env_float('schedule_cache_ttl', 3600, minimum=0)
+                  }
+SESSIONS = {'ttl': env_float('session_ttl', 86400, minimum=0),
+            'maxsize': env_int('session_cache_size', 10000, minimum=1),
+            'sweep_interval': env_float('session_sweep_interval', 60, minimum=0)
+            }
+OUTBOUND = {'enabled': env_flag('outbound_queue'),
+            'workers': env_int('outbound_workers', 4, minimum=1),
+            'global_rate': env_float('outbound_global_rate', 30, minimum=0),
+            'chat_rate': env_float('outbound_chat_rate', 1, minimum=0)
+            }
+SUPERVISOR = {'workers': env_int('supervisor_workers', os.cpu_count() or 2, minimum=1),
+              'queue_size': env_int('supervisor_queue_size', 1000, minimum=1),
+              'metrics_interval': env_float('supervisor_metrics_interval', 5, minimum=0)
+              }
+METRICS = {'host': os.getenv('metrics_host', '127.0.0.1'),
+           'port': env_int('metrics_port', 0, minimum=0)
+           }
+# Логгеры, которые пишут на каждый запрос: к ним применяется ограничение log_info_rate
+HOT_PATH_LOGGERS = 'database,async_database,write_behind,pool,webhook'
+LOGGING = {'mode': env_choice('log_mode', 'sync', ('sync', 'async')),
+           'format': env_choice('log_format', 'text', ('text', 'json')),
+           'info_rate': env_float('log_info_rate', 0, minimum=0),
+           'rate_loggers': [name.strip() for name in os.getenv('log_rate_loggers', HOT_PATH_LOGGERS).split(',')
+                            if name.strip()]
+           }
+WRITE_BEHIND = {'enabled': env_flag('write_behind'),
+                'max_batch': env_int('write_behind_batch', 200, minimum=1),
+                'max_delay': env_float('write_behind_delay', 1, minimum=0),
+                'retry_cap': env_float('write_behind_retry_cap', 30, minimum=0)
+                }
+
+
+LOG_FORMAT = "[%(asctime)s.%(msecs)03d] %(module)s:%(lineno)d %(levelname)7s - %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+_logging_lock = threading.Lock()
+_logging_listener = None
 
-def config_logging(level=logging.INFO):
+
+class JsonFormatter(logging.Formatter):
+    """
+        Форматирование записей лога в JSON, по одной строке на запись.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, LOG_DATEFMT) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+        Текстовое форматирование LOG_FORMAT с количеством пропущенных записей RateLimitFilter.
+    """
+
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text = f'{text} (пропущено похожих записей: {record.suppressed})'
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+        Ограничение частоты записей ниже WARNING: не больше rate записей в секунду
+        из одного места вызова (файл и строка). Количество пропущенных записей
+        передаётся со следующей записанной в атрибуте suppressed, текст записи не меняется.
+        Предупреждения и ошибки не ограничиваются. Фильтр подключается только к логгерам
+        частых операций (параметр log_rate_loggers).
+
+        Attributes:
+            rate (float): Записей в секунду из одного места вызова.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._buckets = {}  # (файл, строка) -> [токены, время пополнения, пропущено]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        record.suppressed = suppressed
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+        QueueHandler без форматирования в потоке, который пишет в лог.
+
+        Стандартный QueueHandler форматирует сообщение перед постановкой в очередь,
+        чтобы запись можно было передать в другой процесс. Очередь здесь внутри процесса,
+        поэтому запись передаётся как есть, а сообщение и трассировка исключения
+        форматируются в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def config_logging(level=logging.INFO, settings=None):
     """
         Настройка логирования для приложения.
+
+        Повторные вызовы ничего не меняют. Режим задаётся в token.env:
+        log_mode = async - записи кладутся в очередь, а форматирует и выводит их фоновый
+        QueueListener; log_format = json - одна JSON-строка на запись; log_info_rate -
+        сколько записей ниже WARNING в секунду пропускать из одного места вызова (0 - все)
+        в логгерах из log_rate_loggers.
+
         :param level: Уровень логирования. По умолчанию - INFO.
+        :param settings: Настройки в формате LOGGING. По умолчанию - LOGGING из token.env.
     """
-    logging.basicConfig(
-        level=level,
-        datefmt="%Y-%m-%d %H:%M:%S",
-        format="[%(asctime)s.%(msecs)03d] %(module)s:%(lineno)d %(levelname)7s - %(message)s"
+    global _logging_listener
+    root = logging.getLogger()
+    with _logging_lock:
+        if root.handlers:
+            return
+        if settings is None:
+            settings = LOGGING
+
+        handler = logging.StreamHandler()
+        if settings['format'] == 'json':
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(TextFormatter(LOG_FORMAT, LOG_DATEFMT))
+
+        if settings['mode'] == 'async':
+            log_queue = queue.SimpleQueue()
+            _logging_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+            _logging_listener.start()
+            atexit.register(_logging_listener.stop)
+            handler = LazyQueueHandler(log_queue)
 
-    )
+        if settings['info_rate'] > 0:
+            rate_limit = RateLimitFilter(settings['info_rate'])
+            for name in settings['rate_loggers']:
+                logging.getLogger(name).addFilter(rate_limit)
+        root.setLevel(level)
+        root.addHandler(handler)
 
 
 def disable_custom_logging():
     """
     Отключение настроенного логирования и возврат к классическим логам.
     """
+    global _logging_listener
+    if _logging_listener is not None:
+        _logging_listener.stop()
+        _logging_listener = None
     logging.getLogger().handlers.clear()  # Удаляем все обработчики
     logging.basicConfig(level=logging.CRITICAL)  # Устанавливаем уровень логирования на ERROR
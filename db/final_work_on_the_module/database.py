@@ -2,48 +2,302 @@
 Модуль для подключения к бд
 """
 
+import atexit
 import logging
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2 import sql
-from config import DB_PATH, config_logging
+from backends import PostgresBackend, SQLiteBackend
+from config import DB_BACKEND, DB_PATH, DB_POOL, config_logging
+from metrics import DB_COMMIT_SECONDS, DB_ERRORS, DB_REPLAYS, DB_SECONDS, current_label, timed
+from pool import ConnectionPool
+from prepared import PreparedConnection, StatementRegistry
 
 config_logging()
 logger = logging.getLogger('database')
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(**conn_params):
+    """
+    Возвращает общий пул соединений для указанных параметров подключения.
+
+    Пул создаётся при первом обращении и переиспользуется всеми экземплярами
+    Database с теми же параметрами, поэтому новые объекты не открывают
+    собственных соединений.
+
+    :param conn_params: Параметры подключения (dbname, user, password, host, port).
+    :return: ConnectionPool Пул соединений.
+    """
+    key = tuple(sorted(conn_params.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(**DB_POOL, connection_factory=PreparedConnection, **conn_params)
+            _pools[key] = pool
+    return pool
+
+
+def get_sqlite(path):
+    """
+    Возвращает общее хранилище SQLite для файла базы данных.
+
+    :param path: Путь к файлу базы данных.
+    :return: SQLiteBackend
+    """
+    key = (('sqlite', path),)
+    with _pools_lock:
+        backend = _pools.get(key)
+        if backend is None:
+            backend = SQLiteBackend(path, timeout=DB_POOL['timeout'], synchronous=DB_BACKEND['synchronous'])
+            _pools[key] = backend
+    return backend
+
+
+@atexit.register
+def close_pools():
+    """Закрытие всех пулов соединений и баз данных SQLite при завершении процесса."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class Subquery:
+    """
+    Значение для вставки, вычисляемое подзапросом.
+
+    Пример: Subquery('SELECT id FROM users WHERE telegram_user_id = %s', (tg_user_id,)).
+
+    Attributes:
+        query (str): Текст подзапроса, возвращающего одно значение.
+        values (tuple): Значения для подстановки в подзапрос.
+    """
+
+    __slots__ = ('query', 'values')
+
+    def __init__(self, query: str, values: tuple = ()):
+        self.query = query
+        self.values = tuple(values)
+
+
+def build_upsert(table_name: str, data: dict, conflict_columns: list | tuple, update: dict = None):
+    """
+    Формирует запрос INSERT ... ON CONFLICT.
+
+    :param table_name: Имя таблицы.
+    :param data: Словарь с данными для вставки {'column': value}. Значение может быть Subquery.
+    :param conflict_columns: Столбцы уникального индекса, по которому определяется конфликт.
+    :param update: Словарь {'column': 'SQL-выражение'} для DO UPDATE SET. Выражения подставляются
+        в запрос напрямую, существующая строка доступна по имени таблицы, новая - через EXCLUDED.
+        Пустой словарь или None - DO NOTHING.
+    :return: Кортеж (текст запроса, список значений).
+    """
+    placeholders = []
+    query_values = []
+    for value in data.values():
+        if isinstance(value, Subquery):
+            placeholders.append(f'({value.query})')
+            query_values.extend(value.values)
+        else:
+            placeholders.append('%s')
+            query_values.append(value)
+
+    query = (f"INSERT INTO {table_name} ({', '.join(data.keys())})"
+             f" VALUES ({', '.join(placeholders)})"
+             f" ON CONFLICT ({', '.join(conflict_columns)})")
+    if update:
+        query += f" DO UPDATE SET {', '.join(f'{column} = {expr}' for column, expr in update.items())}"
+    else:
+        query += " DO NOTHING"
+    return query + " RETURNING id", query_values
+
+
+class _RetryPrepared(Exception):
+    """Сигнал повторить подготовленный запрос после отката транзакции."""
+
 
 class Database:
     """
     Класс для управления подключением и операциями с базой данных.
+
+    Соединения берутся из хранилища (PostgreSQL или SQLite, см. backends.py)
+    на время одной операции, поэтому объект можно использовать из нескольких потоков.
+
+    Attributes:
+        backend (Backend): Хранилище, выдающее соединения.
+        pool (ConnectionPool): Пул соединений PostgreSQL или None для SQLite.
+        statements (StatementRegistry): Подготовленные запросы, выполняемые через execute_prepared.
     """
 
     def __init__(self, dbname=DB_PATH['dbname'], user=DB_PATH['user'], password=DB_PATH['password'], host='localhost',
-                 port=5432):
+                 port=5432, pool=None, backend=None):
         """
-        Инициализация соединения с базой данных.
+        Инициализация подключения к хранилищу базы данных.
+
+        По умолчанию хранилище выбирается параметром db_backend: 'sqlite' - файл sqlite_path,
+        иначе PostgreSQL через общий пул соединений.
 
         :param dbname: Имя базы данных.
         :param user: Имя пользователя базы данных.
         :param password: Пароль пользователя базы данных.
         :param host: Хост базы данных (по умолчанию 'localhost').
         :param port: Порт базы данных (по умолчанию 5432).
+        :param pool: Необязательный готовый пул соединений PostgreSQL.
+        :param backend: Необязательное готовое хранилище (PostgresBackend или SQLiteBackend).
+        """
+        if backend is None:
+            if pool is None and DB_BACKEND['engine'] == 'sqlite':
+                backend = get_sqlite(DB_BACKEND['path'])
+            else:
+                backend = PostgresBackend(pool or get_pool(dbname=dbname, user=user, password=password,
+                                                           host=host, port=port))
+        self.backend = backend
+        self.pool = getattr(backend, 'pool', None)
+        self.dbname = backend.dbname
+        self.statements = StatementRegistry()
+
+    @contextmanager
+    def cursor(self):
+        """
+        Контекстный менеджер: берёт соединение из хранилища и отдаёт курсор.
+
+        При успешном выходе транзакция фиксируется, при ошибке откатывается,
+        после чего соединение возвращается в хранилище. Время фиксации и ошибки
+        базы данных записываются в метрики.
         """
-        self.conn = None
-        self.cur = None
         try:
-            self.conn = psycopg2.connect(dbname=dbname, user=user,
-                                         password=password, host=host, port=port)
-            self.cur = self.conn.cursor()
-            logger.info(f"Соединение с {dbname} успешно")
-        except psycopg2.OperationalError:
-            logger.error(f"Ошибка подключения к {dbname}")
-
-    def __del__(self):
-        """Закрытие соединения и курсора при уничтожении объекта."""
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+            with self.backend.connection() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        yield cur
+                    started = time.perf_counter()
+                    conn.commit()
+                    DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+                except BaseException:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+        except psycopg2.Error:
+            DB_ERRORS.inc(operation=current_label('operation'))
+            raise
+
+    def _execute(self, query, values=None, fetch=None, idempotent=False):
+        """
+        Выполнение запроса на соединении из хранилища.
+
+        :param query: SQL-запрос.
+        :param values: Значения для подстановки в запрос.
+        :param fetch: 'one' - вернуть одну строку, 'all' - все строки, None - ничего.
+        :param idempotent: Запрос можно повторить: при потере соединения он будет
+            выполнен ещё раз на новом соединении.
+        :return: Результат выборки в зависимости от fetch.
+        """
+        def work(cur):
+            cur.execute(query, values)
+            if fetch == 'one':
+                return cur.fetchone()
+            if fetch == 'all':
+                return cur.fetchall()
+            return None
 
+        return self._run(work, idempotent)
+
+    def _run(self, work, idempotent=False):
+        """
+        Выполнение work(cur) в одной транзакции.
+
+        :param work: Функция, получающая курсор.
+        :param idempotent: Функцию можно повторить при потере соединения.
+        :return: Результат work.
+        """
+        for attempt in range(2):
+            try:
+                with self.cursor() as cur:
+                    return work(cur)
+            except psycopg2.Error as e:
+                if attempt or not idempotent or not self.backend.is_disconnect(e):
+                    raise
+                self._replay(current_label('operation'), e)
+
+    @staticmethod
+    def _replay(operation, error):
+        """
+        Учитывает повтор запроса после потери соединения.
+
+        :param operation: Имя операции для лога и метрик.
+        :param error: Исключение, после которого запрос повторяется.
+        """
+        DB_REPLAYS.inc(operation=operation)
+        logger.warning(f'Соединение потеряно, запрос {operation} будет выполнен повторно: {error}')
+
+    def execute_prepared(self, name: str, values: tuple = (), fetch=None):
+        """
+        Выполнение зарегистрированного в self.statements запроса через PREPARE / EXECUTE.
+
+        Запрос подготавливается на соединении при первом выполнении, в том числе
+        на новом соединении после переподключения. Если набор подготовленных запросов
+        соединения разошёлся с сервером или соединение оборвалось при выполнении
+        идемпотентного запроса (см. StatementRegistry.register), запрос повторяется один раз.
+
+        :param name: Имя запроса.
+        :param values: Значения параметров запроса.
+        :param fetch: 'one' - вернуть одну строку, 'all' - все строки, None - количество изменённых строк.
+        :return: Результат выборки в зависимости от fetch.
+        """
+        with timed(DB_SECONDS, operation=name):
+            for attempt in range(2):
+                started = None
+                try:
+                    with self.cursor() as cur:
+                        try:
+                            query = self.statements.prepare(cur, name)
+                            started = time.perf_counter()
+                            cur.execute(query, values)
+                            if fetch == 'one':
+                                result = cur.fetchone()
+                            elif fetch == 'all':
+                                result = cur.fetchall()
+                            else:
+                                result = cur.rowcount
+                        except psycopg2.DatabaseError as e:
+                            if not self.statements.handle_error(cur, name, e) or attempt:
+                                raise
+                            logger.warning(f'Подготовленный запрос {name} будет выполнен повторно: {e}')
+                            raise _RetryPrepared from e
+                    self.statements.record(name, time.perf_counter() - started)
+                    return result
+                except _RetryPrepared:
+                    continue
+                except psycopg2.Error as e:
+                    self.statements.record(name, time.perf_counter() - started if started else 0.0, error=True)
+                    if attempt or name not in self.statements.idempotent or not self.backend.is_disconnect(e):
+                        raise
+                    self._replay(name, e)
+
+    def prepared_stats(self):
+        """
+        Статистика выполнения подготовленных запросов.
+
+        :return: dict Счётчики и время выполнения по именам запросов.
+        """
+        return self.statements.stats()
+
+    def pool_stats(self):
+        """
+        Статистика использования пула соединений (для SQLite - соединений потоков).
+
+        :return: dict Счётчики пула.
+        """
+        return self.backend.stats()
+
+    @timed(DB_SECONDS, operation='create_table')
     def create_table(self, table_name: str, columns: list | tuple):
         """
         Создание таблицы в базе данных.
@@ -55,12 +309,49 @@ class Database:
         try:
             columns_str = ', '.join(f'{col[0]} {col[1]}' for col in columns)
             query = sql.SQL(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_str})")
-            self.cur.execute(query)
-            self.conn.commit()
+            self._execute(query, idempotent=True)
             logger.info(f"Таблица {table_name} успешно создана")
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при создании таблицы {table_name}: {e}")
 
+    @timed(DB_SECONDS, operation='add_column')
+    def add_column(self, table_name: str, column: str, column_type: str):
+        """
+        Добавление столбца в существующую таблицу, если его ещё нет.
+
+        :param table_name: Имя таблицы.
+        :param column: Имя столбца.
+        :param column_type: Тип данных столбца с ограничениями и значением по умолчанию.
+        """
+        try:
+            self._run(lambda cur: self.backend.add_column(cur, table_name, column, column_type), idempotent=True)
+            logger.info(f"Столбец {column} добавлен в таблицу {table_name}")
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при добавлении столбца {column} в таблицу {table_name}: {e}")
+
+    @timed(DB_SECONDS, operation='create_index')
+    def create_index(self, table_name: str, columns: list | tuple, unique: bool = False, index_name: str = None):
+        """
+        Создание индекса, если он ещё не существует.
+
+        :param table_name: Имя таблицы.
+        :param columns: Список столбцов индекса.
+        :param unique: Создать уникальный индекс.
+        :param index_name: Имя индекса, по умолчанию "<таблица>_<столбцы>_idx".
+        :return: True, если индекс создан или уже существует, иначе False.
+        """
+        index_name = index_name or f"{table_name}_{'_'.join(columns)}_idx"
+        try:
+            query = sql.SQL(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} "
+                            f"ON {table_name} ({', '.join(columns)})")
+            self._execute(query, idempotent=True)
+            logger.info(f"Индекс {index_name} успешно создан")
+            return True
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при создании индекса {index_name}: {e}")
+            return False
+
+    @timed(DB_SECONDS, operation='drop_table')
     def drop_table(self, table_name: str):
         """
         Удаление таблицы из базы данных.
@@ -69,12 +360,12 @@ class Database:
         """
         try:
             query = sql.SQL(f"DROP TABLE IF EXISTS {table_name}")
-            self.cur.execute(query)
-            self.conn.commit()
+            self._execute(query, idempotent=True)
             logger.info(f'Таблица успешно удалена {table_name}')
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при удалении таблицы {table_name}: {e}")
 
+    @timed(DB_SECONDS, operation='insert_data')
     def insert_data(self, table_name: str, data: dict):
         """
         Вставка данных в таблицу.
@@ -91,14 +382,58 @@ class Database:
                 f"INSERT INTO {table_name} ({', '.join(columns)})"
                 f" VALUES ({', '.join(['%s'] * len(values))}) RETURNING id"
             )
-            self.cur.execute(query, list(values))
-            inserted_id = self.cur.fetchone()[0]
-            self.conn.commit()
+            inserted_id = self._execute(query, list(values), fetch='one')[0]
             return inserted_id
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при вставке данных в таблицу {table_name}: {e}")
             return None
 
+    @timed(DB_SECONDS, operation='bulk_insert_csv')
+    def bulk_insert_csv(self, table_name: str, columns: list | tuple, path: str, conflict_columns: list | tuple):
+        """
+        Массовая загрузка CSV-файла в таблицу одной транзакцией.
+
+        Строки переносятся в целевую таблицу с пропуском дубликатов по conflict_columns
+        (INSERT ... ON CONFLICT DO NOTHING): в PostgreSQL файл сначала потоком загружается
+        командой COPY во временную таблицу. Для conflict_columns должен существовать
+        уникальный индекс. Первая строка файла считается заголовком.
+
+        :param table_name: Имя целевой таблицы.
+        :param columns: Столбцы в порядке их следования в CSV-файле.
+        :param path: Путь к CSV-файлу.
+        :param conflict_columns: Столбцы, по которым отбрасываются дубликаты.
+        :return: Кортеж (прочитано строк, вставлено строк) или None при ошибке.
+        """
+        try:
+            with self.cursor() as cur, open(path, encoding='utf-8') as csvfile:
+                return self.backend.bulk_insert_csv(cur, table_name, columns, csvfile, conflict_columns)
+        except (OSError, psycopg2.DatabaseError) as e:
+            logger.error(f"Ошибка при загрузке {path} в таблицу {table_name}: {e}")
+            return None
+
+    @timed(DB_SECONDS, operation='upsert')
+    def upsert(self, table_name: str, data: dict, conflict_columns: list | tuple, update: dict = None):
+        """
+        Вставка строки или обновление существующей одним запросом (INSERT ... ON CONFLICT).
+
+        Для conflict_columns должен существовать уникальный индекс.
+
+        :param table_name: Имя таблицы.
+        :param data: Словарь с данными для вставки {'column': value}. Значение может быть Subquery.
+        :param conflict_columns: Столбцы уникального индекса.
+        :param update: Словарь {'column': 'SQL-выражение'} для обновления существующей строки,
+            например {'times_shown': 'users_word.times_shown + 1'}. None - оставить строку без изменений.
+        :return: ID вставленной или обновлённой записи, None при ошибке или если строка не изменилась.
+        """
+        try:
+            query, query_values = build_upsert(table_name, data, conflict_columns, update)
+            row = self._execute(sql.SQL(query), query_values, fetch='one')
+            return row[0] if row else None
+        except psycopg2.DatabaseError as e:
+            logger.error(f"Ошибка при upsert в таблицу {table_name}: {e}")
+            return None
+
+    @timed(DB_SECONDS, operation='select_data')
     def select_data(self, table_name, columns: str = '*',
                     condition: str = None, values: tuple = None):
         """
@@ -115,13 +450,13 @@ class Database:
             query = sql.SQL(f"SELECT {columns_str} FROM {table_name}")
             if condition:
                 query += sql.SQL(f" WHERE {condition}")
-            self.cur.execute(query, values)
-            rows = self.cur.fetchall()
+            rows = self._execute(query, values, fetch='all', idempotent=True)
             return rows
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при выполнении SELECT из таблицы {table_name}: {e}")
             return []
 
+    @timed(DB_SECONDS, operation='update_data')
     def update_data(self, table_name: str, data: dict, condition: str, values: tuple = None):
         """
         Обновление данных в таблице.
@@ -152,9 +487,8 @@ class Database:
             if values:
                 query_values.extend(values)
 
-            self.cur.execute(query, query_values)
-            self.conn.commit()
-            logger.info(f'Обновление в таблице {table_name} прошло успешно')
+            self._execute(query, query_values)
+            logger.info('Обновление в таблице %s прошло успешно', table_name)
             return True
         except psycopg2.DatabaseError as e:
             logger.error(f"Ошибка при обновлении данных в таблице {table_name}: {e}")
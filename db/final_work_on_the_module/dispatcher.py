@@ -0,0 +1,183 @@
+"""
+    Модуль с диспетчером обновлений Telegram по чатам.
+
+    Обновления распределяются по фиксированному набору очередей (шардов) по chat_id.
+    Каждую очередь обрабатывает свой поток, поэтому обновления одного чата выполняются
+    строго по порядку, а разные чаты - параллельно в разных шардах.
+"""
+import logging
+import queue
+import threading
+import time
+
+from config import config_logging
+from metrics import DISPATCH_WAIT_SECONDS
+
+config_logging()
+logger = logging.getLogger('dispatcher')
+
+# Поля обновления с сообщением, чат которого определяет шард
+_MESSAGE_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                   'my_chat_member', 'chat_member', 'chat_join_request')
+# Поля обновления без чата: шард определяется по пользователю
+_USER_FIELDS = ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query', 'poll_answer')
+
+
+def chat_key(update):
+    """
+    Ключ шарда обновления: ID чата, а для обновлений без чата - ID пользователя или обновления.
+
+    :param update: telebot.types.Update
+    :return: int Ключ для выбора шарда.
+    """
+    for field in _MESSAGE_FIELDS:
+        item = getattr(update, field, None)
+        if item is not None:
+            return item.chat.id
+    call = getattr(update, 'callback_query', None)
+    if call is not None:
+        return call.message.chat.id if call.message is not None else call.from_user.id
+    for field in _USER_FIELDS:
+        item = getattr(update, field, None)
+        user = getattr(item, 'from_user', None) or getattr(item, 'user', None)
+        if user is not None:
+            return user.id
+    return update.update_id
+
+
+class ChatDispatcher:
+    """
+        Диспетчер обновлений с последовательной обработкой внутри чата.
+
+        Встаёт перед обработчиками бота вместо TeleBot.process_new_updates (см. install).
+        Бот должен быть создан с threaded=False: иначе TeleBot передаст обработчики
+        в свой пул потоков и порядок внутри чата снова не будет гарантирован.
+        Если очередь шарда заполнена, поток, передающий обновления (polling или webhook),
+        ждёт, пока в ней освободится место.
+
+        Attributes:
+            bot (telebot.TeleBot): Бот, обработчики которого получают обновления.
+            shards (int): Количество очередей и потоков обработки.
+            queue_size (int): Максимальная длина очереди одного шарда.
+    """
+
+    def __init__(self, bot, shards=4, queue_size=1000):
+        """
+        Инициализация очередей и запуск потоков обработки.
+
+        :param bot: Объект TeleBot.
+        :param shards: Количество шардов.
+        :param queue_size: Максимальная длина очереди шарда.
+        """
+        self.bot = bot
+        self.shards = shards
+        self.queue_size = queue_size
+        if getattr(bot, 'threaded', False):
+            logger.warning('TeleBot создан с threaded=True: порядок обработки обновлений чата не гарантирован')
+        self._process = bot.process_new_updates
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(shards)]
+        self._stats = [{'dispatched': 0, 'processed': 0, 'errors': 0, 'wait_seconds': 0.0}
+                       for _ in range(shards)]
+        self._lock = threading.Lock()
+        self._threads = []
+        for shard in range(shards):
+            thread = threading.Thread(target=self._worker, args=(shard,), name=f'dispatch-{shard}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def install(self):
+        """
+        Направляет обновления бота через диспетчер: polling и WebhookServer
+        вызывают bot.process_new_updates, который теперь раскладывает обновления по шардам.
+        """
+        self.bot.process_new_updates = self.process_new_updates
+
+    def shard_of(self, update):
+        """
+        Номер шарда обновления.
+
+        :param update: telebot.types.Update
+        :return: int Номер шарда.
+        """
+        return chat_key(update) % self.shards
+
+    def process_new_updates(self, updates):
+        """
+        Раскладывает обновления по очередям шардов.
+
+        :param updates: list Обновления telebot.types.Update.
+        """
+        for update in updates:
+            shard = self.shard_of(update)
+            self._queues[shard].put((update, time.monotonic()))
+            with self._lock:
+                self._stats[shard]['dispatched'] += 1
+
+    def _worker(self, shard):
+        """
+        Поток шарда: обрабатывает обновления своей очереди по одному.
+
+        :param shard: Номер шарда.
+        """
+        updates = self._queues[shard]
+        label = str(shard)
+        while True:
+            item = updates.get()
+            if item is None:
+                updates.task_done()
+                return
+            update, enqueued_at = item
+            wait = time.monotonic() - enqueued_at
+            DISPATCH_WAIT_SECONDS.observe(wait, shard=label)
+            error = False
+            try:
+                self._process([update])
+            except Exception as e:
+                error = True
+                logger.error(f'Ошибка обработки обновления {update.update_id} в шарде {shard}: {e}', exc_info=True)
+            finally:
+                with self._lock:
+                    stats = self._stats[shard]
+                    stats['processed'] += 1
+                    stats['errors'] += error
+                    stats['wait_seconds'] += wait
+                updates.task_done()
+
+    def join(self):
+        """
+        Ждёт, пока будут обработаны все обновления в очередях.
+        """
+        for updates in self._queues:
+            updates.join()
+
+    def close(self, timeout=5.0):
+        """
+        Останавливает потоки после обработки уже принятых обновлений.
+
+        :param timeout: Максимальное время ожидания каждого потока, секунды.
+        """
+        for updates in self._queues:
+            updates.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def stats(self):
+        """
+        Статистика по шардам: глубина очереди, возраст самого старого обновления
+        в очереди и счётчики обработки.
+
+        :return: dict {номер шарда: {показатель: число}}
+        """
+        now = time.monotonic()
+        result = {}
+        for shard, updates in enumerate(self._queues):
+            with updates.mutex:
+                depth = len(updates.queue)
+                oldest = updates.queue[0] if depth else None
+            with self._lock:
+                stats = dict(self._stats[shard])
+            stats['depth'] = depth
+            stats['queue_size'] = self.queue_size
+            stats['oldest_wait_seconds'] = round(now - oldest[1], 6) if oldest else 0.0
+            result[str(shard)] = stats
+        return result
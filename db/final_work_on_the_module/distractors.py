@@ -0,0 +1,167 @@
+"""
+    Модуль с индексом неправильных вариантов перевода (дистракторов).
+
+    Переводы словаря заранее раскладываются по группам: длина слова (диапазон)
+    и первая буква. Неправильные варианты для вопроса берутся из группы правильного
+    перевода, поэтому они похожи на него и выбираются за O(1) без запросов к базе данных.
+
+    Индекс строится из CSV-словаря и сохраняется в файл "<словарь>.distractors.json".
+    Если файла нет или словарь изменился, индекс строится заново при запуске бота.
+
+    Построить индекс заранее:
+        python distractors.py russian_english_words.csv
+"""
+import argparse
+import json
+import logging
+import os
+import random
+
+from config import config_logging
+from vocabulary import VocabularyStore
+
+config_logging()
+logger = logging.getLogger('distractors')
+
+# Границы диапазонов длины перевода: (1-3), (4-5), (6-7), (8-10), (11+)
+LENGTH_BANDS = (3, 5, 7, 10)
+
+
+def length_band(text):
+    """
+    Номер диапазона длины слова.
+
+    :param text: str Слово.
+    :return: int Номер диапазона из LENGTH_BANDS.
+    """
+    length = len(text)
+    for band, limit in enumerate(LENGTH_BANDS):
+        if length <= limit:
+            return band
+    return len(LENGTH_BANDS)
+
+
+def group_keys(text):
+    """
+    Ключи групп слова от самой узкой к самой широкой.
+
+    :param text: str Слово.
+    :return: tuple Ключи "<диапазон>:<первая буква>" и "<диапазон>".
+    """
+    band = length_band(text)
+    first = text[:1].lower()
+    return f'{band}:{first}', f'{band}'
+
+
+class DistractorIndex:
+    """
+        Индекс неправильных вариантов перевода по группам похожих слов.
+
+        Attributes:
+            groups (dict): Списки переводов по ключам групп (см. group_keys).
+            translations (list): Все переводы без повторов.
+    """
+
+    def __init__(self, translations=(), groups=None):
+        """
+        :param translations: Переводы слов словаря.
+        :param groups: Готовые группы из файла индекса, по умолчанию строятся из translations.
+        """
+        self.translations = sorted({text.strip() for text in translations if text and text.strip()})
+        if groups is None:
+            groups = {}
+            for text in self.translations:
+                for key in group_keys(text):
+                    groups.setdefault(key, []).append(text)
+        self.groups = groups
+
+    def pick(self, translation, quantity=3):
+        """
+        Неправильные варианты перевода, похожие на правильный.
+
+        Варианты берутся из группы "длина и первая буква", недостающие - из группы
+        той же длины, затем из всего словаря.
+
+        :param translation: str Правильный перевод.
+        :param quantity: int Требуемое количество вариантов.
+        :return: list Неправильные варианты, может быть короче quantity для маленького словаря.
+        """
+        result = []
+        for candidates in (*(self.groups.get(key, ()) for key in group_keys(translation)), self.translations):
+            need = quantity - len(result)
+            if need <= 0:
+                break
+            # Берётся на len(result) + 1 больше: среди выбранных может оказаться правильный перевод или повтор
+            for text in random.sample(candidates, min(len(candidates), need + len(result) + 1)):
+                if text != translation and text not in result:
+                    result.append(text)
+                    if len(result) == quantity:
+                        break
+        return result
+
+    def __len__(self):
+        """
+        Количество переводов в индексе.
+        """
+        return len(self.translations)
+
+    def save(self, path, fingerprint):
+        """
+        Сохраняет индекс в JSON-файл.
+
+        :param path: Путь к файлу индекса.
+        :param fingerprint: Отпечаток словаря, из которого построен индекс.
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({'fingerprint': fingerprint, 'translations': self.translations, 'groups': self.groups},
+                      index_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def build(cls, vocabulary, index_path=None):
+        """
+        Загружает индекс из файла или строит его из CSV-словаря и сохраняет.
+
+        :param vocabulary: VocabularyStore со словарём.
+        :param index_path: Путь к файлу индекса, по умолчанию "<путь словаря>.distractors.json".
+        :return: DistractorIndex, пустой, если словаря нет.
+        """
+        index_path = index_path or f'{vocabulary.path}.distractors.json'
+        try:
+            fingerprint = vocabulary.fingerprint()
+        except FileNotFoundError:
+            logger.warning(f'Файл {vocabulary.path} не найден, индекс неправильных вариантов пуст')
+            return cls()
+
+        try:
+            with open(index_path, encoding='utf-8') as index_file:
+                data = json.load(index_file)
+            if data.get('fingerprint') == fingerprint:
+                return cls(data['translations'], data['groups'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = cls(vocabulary.translations())
+        try:
+            index.save(index_path, fingerprint)
+        except OSError as e:
+            logger.warning(f'Не удалось сохранить индекс неправильных вариантов {index_path}: {e}')
+        logger.info(f'Построен индекс неправильных вариантов: {len(index)} переводов, {len(index.groups)} групп')
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Построение индекса неправильных вариантов перевода')
+    parser.add_argument('vocabulary', nargs='?', default='russian_english_words.csv', help='CSV-словарь')
+    parser.add_argument('--output', help='Файл индекса, по умолчанию <словарь>.distractors.json')
+    args = parser.parse_args()
+
+    index = DistractorIndex.build(VocabularyStore(args.vocabulary), args.output)
+    sizes = sorted(len(group) for key, group in index.groups.items() if ':' in key)
+    print(json.dumps({'translations': len(index), 'groups': len(sizes),
+                      'median_group': sizes[len(sizes) // 2] if sizes else 0}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
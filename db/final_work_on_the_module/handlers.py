@@ -4,6 +4,7 @@
 """
 import bot_msg, btn_text
 from buttons import start_button
+from metrics import HANDLER_ERRORS, HANDLER_SECONDS, timed
 from utils import GameUtils
 
 
@@ -16,15 +17,16 @@ class Handlers:
         game_utils (GameUtils): Утилиты для работы с игровыми функциями.
     """
 
-    def __init__(self, bot):
+    def __init__(self, bot, db=None):
         """
             Инициализация обработчика команд и баз данных.
 
             :param bot (telebot.TeleBot): Объект бота для взаимодействия с Telegram API.
+            :param db (DatabaseUtils): Необязательный объект базы данных, по умолчанию создаётся новый.
         """
         self.bot = bot
         self.setup_handlers()
-        self.game_utils = GameUtils(self.bot)
+        self.game_utils = GameUtils(self.bot, db)
 
     def setup_handlers(self):
         """
@@ -50,6 +52,16 @@ class Handlers:
             """
             self.game_utils.get_user_name(message)
 
+        @self.bot.callback_query_handler(func=lambda call: True)
+        def callback(call):
+            """
+                Обработка нажатий инлайн-кнопок (режим игры inline).
+
+                :param call: Нажатие инлайн-кнопки.
+                :type call: telebot.types.CallbackQuery
+            """
+            self.game_utils.handle_callback(call)
+
         @self.bot.message_handler(func=lambda message: True)
         def all_messages(message):
             """
@@ -60,6 +72,7 @@ class Handlers:
             """
             self.handle_all_messages(message)
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_start')
     def handle_start(self, message):
         """
             Обработка команды /start и отправляет приветственное сообщение.
@@ -70,6 +83,7 @@ class Handlers:
         self.bot.send_message(chat_id, bot_msg.MSG_START,
                               reply_markup=start_button(), parse_mode="HTML")
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_help')
     def handle_help(self, message):
         """
            Обработка команды /help и отправляет сообщение с помощью.
@@ -79,15 +93,19 @@ class Handlers:
         chat_id = message.chat.id
         self.bot.send_message(chat_id, bot_msg.MSG_HELP)
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_all_messages')
     def handle_all_messages(self, message):
         """
             Обработка всех входящих сообщений.
 
-            Отправляет пользователю сообщение о том, что сессия прервалась.
+            Если чат ожидает ответ на вопрос, сообщение проверяется как ответ.
+            Иначе отправляет пользователю сообщение о том, что сессия прервалась.
 
             :param message: Сообщение от пользователя.
             :type message: telebot.types.Message
         """
+        if self.game_utils.process_answer(message):
+            return
         chat_id = message.chat.id
         self.bot.send_message(chat_id, 'Сессия прервалась нажмите на кнопку',
                               reply_markup=start_button())
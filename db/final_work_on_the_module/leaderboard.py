@@ -0,0 +1,405 @@
+"""
+    Модуль с рейтингом игроков в памяти.
+    Рейтинг загружается из базы данных один раз и обновляется по мере начисления очков,
+    поэтому место игрока находится за O(log n) без чтения всей таблицы.
+    Устаревший рейтинг перечитывается в фоне, запросы пользователей при этом не ждут базу данных.
+"""
+import logging
+import random
+import threading
+import time
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('leaderboard')
+
+
+class _Node:
+    """
+        Узел списка с пропусками.
+
+        Attributes:
+            key: Ключ узла.
+            next (list): Следующий узел на каждом уровне.
+            width (list): Сколько элементов нижнего уровня пропускает ссылка каждого уровня.
+    """
+
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class RankedList:
+    """
+        Отсортированный список с поиском по номеру (индексируемый список с пропусками).
+
+        Вставка, удаление, номер ключа и ключ по номеру выполняются за O(log n) в среднем:
+        каждая ссылка хранит, сколько элементов она пропускает.
+
+        Attributes:
+            max_levels (int): Количество уровней списка, достаточно для 2 ** max_levels элементов.
+    """
+
+    max_levels = 24
+
+    def __init__(self, keys=()):
+        """
+        :param keys: Начальные ключи в любом порядке.
+        """
+        self._head = _Node(None, self.max_levels)
+        self._size = 0
+        self._random = random.Random()
+        for key in keys:
+            self.insert(key)
+
+    def __len__(self):
+        return self._size
+
+    def _level(self):
+        """
+        Случайная высота нового узла: каждый следующий уровень с вероятностью 1/2.
+
+        :return: int Количество уровней узла.
+        """
+        levels = 1
+        while levels < self.max_levels and self._random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def _chain(self, key):
+        """
+        Находит на каждом уровне последний узел с ключом меньше key.
+
+        :param key: Ключ.
+        :return: tuple (список узлов по уровням, список пройденных элементов по уровням)
+        """
+        chain = [None] * self.max_levels
+        steps = [0] * self.max_levels
+        node = self._head
+        for level in reversed(range(self.max_levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps
+
+    def insert(self, key):
+        """
+        Вставляет ключ.
+
+        :param key: Ключ, сравнимый с остальными ключами списка.
+        """
+        chain, steps = self._chain(key)
+        node = _Node(key, self._level())
+        passed = 0
+        for level in range(len(node.next)):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            node.width[level] = prev.width[level] - passed
+            prev.width[level] = passed + 1
+            passed += steps[level]
+        for level in range(len(node.next), self.max_levels):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """
+        Удаляет ключ.
+
+        :param key: Ключ.
+        :raises KeyError: Если ключа нет в списке.
+        """
+        chain, _ = self._chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = chain[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), self.max_levels):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def index(self, key):
+        """
+        Номер ключа в отсортированном порядке.
+
+        :param key: Ключ.
+        :return: int Номер, начиная с 0.
+        :raises KeyError: Если ключа нет в списке.
+        """
+        chain, steps = self._chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return sum(steps)
+
+    def __getitem__(self, position):
+        """
+        Ключ по номеру.
+
+        :param position: Номер, начиная с 0.
+        :return: Ключ.
+        :raises IndexError: Если номер вне списка.
+        """
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        node = self._head
+        remaining = position + 1
+        for level in reversed(range(self.max_levels)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+    def head(self, quantity):
+        """
+        Первые ключи списка.
+
+        :param quantity: Количество ключей.
+        :return: list Ключи по возрастанию.
+        """
+        result = []
+        node = self._head.next[0]
+        while node is not None and len(result) < quantity:
+            result.append(node.key)
+            node = node.next[0]
+        return result
+
+
+class Leaderboard:
+    """
+        Отсортированный по очкам рейтинг игроков.
+
+        Хранит ключи (-очки, telegram_user_id) в RankedList и словарь с именами и очками.
+        Место игрока, игрок на месте и изменение очков выполняются за O(log n).
+
+        Устаревший рейтинг перечитывается в фоновом потоке, а до окончания загрузки запросы
+        обслуживаются по старым данным. Изменения очков во время загрузки записываются в журнал
+        и применяются поверх загруженного рейтинга.
+
+        Очки передаются в рейтинг после записи в базу данных и целиком (set_points), а не приращением:
+        изменение, попавшее и в загруженные строки, и в журнал, при повторном применении ничего не меняет.
+
+        Attributes:
+            loader (callable): Функция, возвращающая список словарей
+                {'telegram_user_id', 'name', 'points'} для полной загрузки рейтинга,
+                или None, если рейтинг загружается снаружи методом load.
+                При ошибке базы данных функция должна вызывать исключение, а не возвращать пустой список.
+            ttl (float): Через сколько секунд рейтинг перечитывается из базы данных,
+                чтобы подхватить изменения других процессов. 0 - не перечитывать.
+    """
+
+    def __init__(self, loader, ttl=300.0):
+        """
+        Инициализация рейтинга. Данные загружаются при первом обращении.
+
+        :param loader: Функция полной загрузки рейтинга из базы данных.
+        :param ttl: Время жизни загруженного рейтинга в секундах.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self._ranking = RankedList()
+        self._users = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._journal = None
+        self._lock = threading.RLock()
+
+    def is_loaded(self):
+        """
+        :return: True, если рейтинг уже загружен.
+        """
+        return self._loaded_at is not None
+
+    def is_stale(self):
+        """
+        Проверяет, нужно ли (пере)загрузить рейтинг.
+
+        :return: True, если рейтинг не загружен или старше ttl.
+        """
+        if self._loaded_at is None:
+            return True
+        return bool(self.ttl) and time.monotonic() - self._loaded_at >= self.ttl
+
+    def begin_refresh(self):
+        """
+        Занимает перезагрузку рейтинга, чтобы её не запустили одновременно несколько запросов.
+
+        :return: True, если перезагрузку должен выполнить вызывающий, False - она уже идёт.
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def track_changes(self):
+        """
+        Начинает журнал изменений: вызывается непосредственно перед чтением рейтинга из базы данных.
+        Изменения из журнала применяются поверх загруженных строк в load. Изменение, записанное
+        в базу данных до чтения, попадает и в строки, и в журнал, но записанные в журнал значения
+        очков идемпотентны, поэтому оно не учитывается дважды.
+        """
+        with self._lock:
+            self._journal = []
+
+    def refresh_failed(self):
+        """
+        Завершает неудачную перезагрузку. Старый рейтинг используется ещё ttl секунд.
+        """
+        with self._lock:
+            self._journal = None
+            self._refreshing = False
+            if self._loaded_at is not None:
+                self._loaded_at = time.monotonic()
+
+    def load(self, rows):
+        """
+        Полностью заменяет рейтинг переданными строками и применяет журнал изменений.
+
+        :param rows: Список словарей {'telegram_user_id', 'name', 'points'}.
+        """
+        users = {row['telegram_user_id']: (row['name'], row['points'] or 0) for row in rows}
+        ranking = RankedList((-points, tg_id) for tg_id, (_, points) in users.items())
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._users, self._ranking = users, ranking
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+            for change, args in journal or ():
+                change(*args)
+
+    def _refresh(self):
+        """
+        Перечитывает рейтинг из базы данных через loader.
+        """
+        try:
+            self.track_changes()
+            self.load(self.loader())
+        except Exception as e:
+            logger.error(f'Ошибка загрузки рейтинга: {e}')
+            self.refresh_failed()
+
+    def _ensure_loaded(self):
+        """
+        Загружает рейтинг через loader при первом обращении, а устаревший перечитывает в фоне.
+        Если первая загрузка не удалась, рейтинг остаётся незагруженным и загружается следующим запросом.
+        Без loader рейтинг загружается снаружи методом load.
+        """
+        if self.loader is None:
+            return
+        if self._loaded_at is None:
+            try:
+                self.load(self.loader())
+            except Exception as e:
+                logger.error(f'Ошибка загрузки рейтинга: {e}')
+        elif self.is_stale() and self.begin_refresh():
+            threading.Thread(target=self._refresh, name='leaderboard-refresh', daemon=True).start()
+
+    def _entry(self, key):
+        """
+        Формирует запись рейтинга по ключу.
+
+        :param key: Ключ (-очки, telegram_user_id).
+        :return: dict Запись с ключами telegram_user_id, name, points.
+        """
+        tg_id = key[1]
+        name, points = self._users[tg_id]
+        return {'telegram_user_id': tg_id, 'name': name, 'points': points}
+
+    def add_user(self, telegram_user_id, name, points=0):
+        """
+        Добавляет нового игрока в рейтинг. Игрок, который уже есть в рейтинге, не меняется.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param name: Имя пользователя.
+        :param points: Начальное количество очков.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if self._journal is not None:
+                self._journal.append((self.add_user, (telegram_user_id, name, points)))
+            if telegram_user_id in self._users:
+                return
+            self._users[telegram_user_id] = (name, points)
+            self._ranking.insert((-points, telegram_user_id))
+
+    def set_points(self, telegram_user_id, points):
+        """
+        Заменяет очки игрока значением, записанным в базу данных, и меняет его место в рейтинге.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param points: Количество очков игрока в базе данных после изменения.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if self._journal is not None:
+                self._journal.append((self.set_points, (telegram_user_id, points)))
+            if telegram_user_id in self._users:
+                self._set_points(telegram_user_id, points)
+
+    def _set_points(self, telegram_user_id, points):
+        """
+        Заменяет очки игрока, который уже есть в рейтинге.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param points: Новое количество очков.
+        """
+        name, old_points = self._users[telegram_user_id]
+        self._ranking.remove((-old_points, telegram_user_id))
+        self._users[telegram_user_id] = (name, points)
+        self._ranking.insert((-points, telegram_user_id))
+
+    def rank(self, telegram_user_id):
+        """
+        Место игрока в рейтинге.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :return: int Место, начиная с 1, или None, если игрока нет в рейтинге.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            user = self._users.get(telegram_user_id)
+            if user is None:
+                return None
+            return self._ranking.index((-user[1], telegram_user_id)) + 1
+
+    def top(self, quantity):
+        """
+        Первые игроки рейтинга.
+
+        :param quantity: Количество игроков.
+        :return: list Список записей рейтинга.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [self._entry(key) for key in self._ranking.head(quantity)]
+
+    def at(self, position):
+        """
+        Игрок на указанном месте рейтинга.
+
+        :param position: Место, начиная с 1.
+        :return: dict Запись рейтинга или None, если такого места нет.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if 1 <= position <= len(self._ranking):
+                return self._entry(self._ranking[position - 1])
+            return None
+
+    def invalidate(self):
+        """
+        Сбрасывает рейтинг, следующий запрос загрузит его заново.
+        """
+        with self._lock:
+            self._loaded_at = None
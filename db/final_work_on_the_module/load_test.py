@@ -0,0 +1,427 @@
+"""
+    Нагрузочный тест обработчиков бота.
+
+    Настоящие Handlers и GameUtils работают с локальной базой данных PostgreSQL
+    (параметры из token.env) или, с параметром --sqlite, с файлом SQLite без сервера
+    (словарь загружается в него из CSV-файла). Вместо Telegram используется StubBot, который
+    записывает отправленные сообщения и зарегистрированные следующие шаги.
+    Ожидаемые ответы на вопросы берутся из хранилища игровых сессий.
+    N виртуальных пользователей параллельно проходят регистрацию и отвечают на вопросы.
+    В отчёте - пропускная способность, задержки хода (p50/p95/p99) и количество
+    SQL-запросов на ход. Отчёт сохраняется в JSON для сравнения между запусками.
+
+    Тест пишет в базу данных: пользователи создаются с Telegram ID начиная
+    с --id-base и удаляются в конце (если не указан --keep). Запускать на тестовой базе.
+
+    Запуск:
+        python load_test.py --users 20 --turns 50 --output load_test.json --baseline previous.json
+        python load_test.py --users 20 --turns 50 --sqlite load_test.sqlite3
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from psycopg2 import extensions
+
+import btn_text
+from btn_text import VIEW_RATING
+from backends import PostgresBackend, SQLiteBackend, SQLiteConnection, SQLiteCursor
+from config import DB_BACKEND, DB_PATH, DB_POOL, WRITE_BEHIND, config_logging
+from handlers import Handlers
+from migrations import migrate
+from pool import ConnectionPool
+from prepared import PreparedConnection
+from utils import DatabaseUtils
+from vocabulary import VocabularyStore
+
+config_logging()
+logger = logging.getLogger('load_test')
+
+_turn = threading.local()
+
+
+def count_statement():
+    """
+    Учитывает выполненный запрос в текущем ходе своего потока.
+    """
+    if getattr(_turn, 'statements', None) is not None:
+        _turn.statements += 1
+
+
+class CountingCursor(extensions.cursor):
+    """
+        Курсор, считающий выполненные запросы текущего хода в своём потоке.
+    """
+
+    def execute(self, query, vars=None):
+        count_statement()
+        return super().execute(query, vars)
+
+
+class CountingConnection(PreparedConnection):
+    """
+        Соединение, все курсоры которого считают выполненные запросы.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+
+
+class CountingSQLiteCursor(SQLiteCursor):
+    """
+        Курсор SQLite, считающий выполненные запросы текущего хода в своём потоке.
+    """
+
+    def execute(self, query, vars=None):
+        count_statement()
+        return super().execute(query, vars)
+
+
+class CountingSQLiteConnection(SQLiteConnection):
+    """
+        Соединение SQLite, все курсоры которого считают выполненные запросы.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingSQLiteCursor
+
+
+class StubBot:
+    """
+        Заглушка TeleBot: регистрирует обработчики так же, как TeleBot,
+        и записывает вызовы send_message и register_next_step_handler.
+
+        Attributes:
+            sent (list): Отправленные сообщения (chat_id, text, kwargs).
+            next_steps (dict): Следующий шаг по chat_id: (обработчик, аргументы).
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.sent = []
+        self.next_steps = {}
+        self._lock = threading.Lock()
+
+    def message_handler(self, commands=None, func=None, **kwargs):
+        def decorator(handler):
+            self.handlers.append((commands, func, handler))
+            return handler
+        return decorator
+
+    def callback_query_handler(self, func=None, **kwargs):
+        def decorator(handler):
+            return handler
+        return decorator
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self._lock:
+            self.sent.append((chat_id, text, kwargs))
+
+    def register_next_step_handler(self, message, callback, *args):
+        self.register_next_step_handler_by_chat_id(message.chat.id, callback, *args)
+
+    def register_next_step_handler_by_chat_id(self, chat_id, callback, *args):
+        with self._lock:
+            self.next_steps[chat_id] = (callback, args)
+
+    def pending_step(self, chat_id):
+        """
+        Ожидаемый следующий шаг чата без его удаления.
+
+        :param chat_id: Идентификатор чата.
+        :return: Кортеж (обработчик, аргументы) или None.
+        """
+        with self._lock:
+            return self.next_steps.get(chat_id)
+
+    def process_message(self, message):
+        """
+        Обрабатывает сообщение как TeleBot: сначала следующий шаг чата, затем первый подходящий обработчик.
+
+        :param message: Сообщение.
+        """
+        with self._lock:
+            step = self.next_steps.pop(message.chat.id, None)
+        if step is not None:
+            callback, args = step
+            callback(message, *args)
+            return
+        for commands, func, handler in self.handlers:
+            if commands is not None:
+                if not message.text.startswith('/') or message.text[1:].split()[0] not in commands:
+                    continue
+            if func is not None and not func(message):
+                continue
+            handler(message)
+            return
+
+
+def make_message(telegram_user_id, text):
+    """
+    Сообщение пользователя в личном чате с полями, которые читают обработчики.
+
+    :param telegram_user_id: Telegram ID пользователя (он же ID чата).
+    :param text: Текст сообщения.
+    :return: SimpleNamespace Сообщение.
+    """
+    return SimpleNamespace(chat=SimpleNamespace(id=telegram_user_id),
+                           from_user=SimpleNamespace(id=telegram_user_id),
+                           text=text)
+
+
+def percentile(values, percent):
+    """
+    Перцентиль по методу ближайшего ранга.
+
+    :param values: Отсортированный список значений.
+    :param percent: Перцентиль от 0 до 100.
+    :return: Значение перцентиля или 0.0 для пустого списка.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class LoadTest:
+    """
+        Нагрузочный тест: виртуальные пользователи отправляют сообщения в обработчики.
+
+        Attributes:
+            users (int): Количество одновременных пользователей.
+            turns (int): Количество ответов на вопросы на одного пользователя.
+            accuracy (float): Вероятность правильного ответа.
+            rating_rate (float): Вероятность запроса рейтинга вместо ответа.
+            id_base (int): Telegram ID первого виртуального пользователя.
+            backend (Backend): Хранилище базы данных: PostgreSQL или SQLite.
+    """
+
+    def __init__(self, users=10, turns=20, accuracy=0.7, rating_rate=0.05, id_base=9_000_000_000,
+                 sqlite_path=None):
+        self.users = users
+        self.turns = turns
+        self.accuracy = accuracy
+        self.rating_rate = rating_rate
+        self.id_base = id_base
+        if sqlite_path:
+            self.backend = SQLiteBackend(sqlite_path, timeout=DB_POOL['timeout'],
+                                         synchronous=DB_BACKEND['synchronous'], factory=CountingSQLiteConnection)
+        else:
+            self.backend = PostgresBackend(ConnectionPool(**{**DB_POOL, 'maxconn': max(DB_POOL['maxconn'], users)},
+                                                          connection_factory=CountingConnection, host='localhost',
+                                                          port=5432, **DB_PATH))
+        self.db = DatabaseUtils(write_behind=WRITE_BEHIND['enabled'], backend=self.backend)
+        self.bot = StubBot()
+        self.handlers = Handlers(self.bot, self.db)
+        log_fd, self._vocabulary_log = tempfile.mkstemp(suffix='.used')
+        os.close(log_fd)
+        # Отдельный журнал, чтобы тест не расходовал слова настоящего словаря
+        self.handlers.game_utils.vocabulary = VocabularyStore('russian_english_words.csv',
+                                                              log_path=self._vocabulary_log)
+        self._latencies = []
+        self._statements = []
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def _turn(self, telegram_user_id, text):
+        """
+        Один ход: обработка одного сообщения пользователя с замером времени и запросов.
+
+        :param telegram_user_id: Telegram ID пользователя.
+        :param text: Текст сообщения.
+        """
+        _turn.statements = 0
+        started = time.perf_counter()
+        error = False
+        try:
+            self.bot.process_message(make_message(telegram_user_id, text))
+        except Exception as e:
+            error = True
+            logger.error(f'Ошибка хода пользователя {telegram_user_id}: {e}', exc_info=True)
+        elapsed = time.perf_counter() - started
+        statements, _turn.statements = _turn.statements, None
+        with self._lock:
+            self._latencies.append(elapsed)
+            self._statements.append(statements)
+            self._errors += error
+
+    def _answer(self, telegram_user_id):
+        """
+        Текст ответа пользователя на текущий вопрос.
+
+        :param telegram_user_id: Telegram ID пользователя.
+        :return: str Правильный или неправильный перевод, кнопка рейтинга
+                 или кнопка начала игры, если вопрос не задан.
+        """
+        session = self.handlers.game_utils.sessions.get(telegram_user_id)
+        if session is None:
+            return btn_text.BTN_STAR_GEME
+        if random.random() < self.rating_rate:
+            return VIEW_RATING
+        correct_translation = session.answer
+        return correct_translation if random.random() < self.accuracy else f'{correct_translation}?'
+
+    def _user(self, number):
+        """
+        Сценарий одного пользователя: /start, регистрация и turns ответов.
+
+        :param number: Номер виртуального пользователя.
+        """
+        telegram_user_id = self.id_base + number
+        self._turn(telegram_user_id, '/start')
+        self._turn(telegram_user_id, btn_text.BTN_STAR_GEME)
+        if self.bot.pending_step(telegram_user_id) is not None:
+            self._turn(telegram_user_id, f'load-{number}')
+        for _ in range(self.turns):
+            self._turn(telegram_user_id, self._answer(telegram_user_id))
+
+    def cleanup(self):
+        """
+        Удаляет виртуальных пользователей и их показы слов из базы данных.
+        """
+        if self.db.write_behind:
+            self.db.write_behind.flush()
+        with self.db.cursor() as cur:
+            cur.execute('DELETE FROM users WHERE telegram_user_id BETWEEN %s AND %s',
+                        (self.id_base, self.id_base + self.users - 1))
+            cur.execute('DELETE FROM game_session WHERE chat_id BETWEEN %s AND %s',
+                        (self.id_base, self.id_base + self.users - 1))
+        os.remove(self._vocabulary_log)
+
+    def run(self):
+        """
+        Запускает пользователей параллельно и собирает отчёт.
+
+        :return: dict Отчёт нагрузочного теста.
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users) as executor:
+            list(executor.map(self._user, range(self.users)))
+        if self.db.write_behind:
+            self.db.write_behind.flush()
+        duration = time.perf_counter() - started
+        return self.report(duration)
+
+    def report(self, duration):
+        """
+        Сводка по завершённому тесту.
+
+        :param duration: Длительность теста в секундах.
+        :return: dict Отчёт.
+        """
+        latencies = sorted(self._latencies)
+        statements = sorted(self._statements)
+        turns = len(latencies)
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'config': {
+                'users': self.users,
+                'turns_per_user': self.turns,
+                'accuracy': self.accuracy,
+                'rating_rate': self.rating_rate,
+                'write_behind': bool(self.db.write_behind),
+                'backend': self.backend.name,
+                'pool_max': self.db.pool.maxconn if self.db.pool else None,
+            },
+            'turns': turns,
+            'errors': self._errors,
+            'duration_s': round(duration, 3),
+            'throughput_turns_per_s': round(turns / duration, 1) if duration else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 2),
+                'p95': round(percentile(latencies, 95) * 1000, 2),
+                'p99': round(percentile(latencies, 99) * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+            'sql_per_turn': {
+                'mean': round(sum(statements) / turns, 2) if turns else 0.0,
+                'p95': percentile(statements, 95),
+                'max': statements[-1] if statements else 0,
+                'total': sum(statements),
+            },
+            'messages_sent': len(self.bot.sent),
+            'pool': self.backend.stats(),
+            'prepared': self.db.prepared_stats(),
+        }
+
+
+def compare(report, baseline):
+    """
+    Сравнивает основные показатели отчёта с предыдущим запуском.
+
+    :param report: Текущий отчёт.
+    :param baseline: Отчёт предыдущего запуска.
+    :return: dict {показатель: [было, стало, изменение в %]}.
+    """
+    metrics = {
+        'throughput_turns_per_s': lambda r: r['throughput_turns_per_s'],
+        'latency_p50_ms': lambda r: r['latency_ms']['p50'],
+        'latency_p95_ms': lambda r: r['latency_ms']['p95'],
+        'latency_p99_ms': lambda r: r['latency_ms']['p99'],
+        'sql_per_turn': lambda r: r['sql_per_turn']['mean'],
+    }
+    result = {}
+    for name, value in metrics.items():
+        before, after = value(baseline), value(report)
+        change = round((after - before) / before * 100, 1) if before else None
+        result[name] = [before, after, change]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест обработчиков бота')
+    parser.add_argument('--users', type=int, default=10, help='одновременных пользователей')
+    parser.add_argument('--turns', type=int, default=20, help='ответов на одного пользователя')
+    parser.add_argument('--accuracy', type=float, default=0.7, help='доля правильных ответов')
+    parser.add_argument('--rating-rate', type=float, default=0.05, help='доля запросов рейтинга')
+    parser.add_argument('--id-base', type=int, default=9_000_000_000, help='Telegram ID первого пользователя')
+    parser.add_argument('--seed', type=int, default=None, help='зерно генератора случайных чисел')
+    parser.add_argument('--output', default='load_test.json', help='файл отчёта')
+    parser.add_argument('--baseline', default=None, help='отчёт предыдущего запуска для сравнения')
+    parser.add_argument('--keep', action='store_true', help='не удалять виртуальных пользователей')
+    parser.add_argument('--sqlite', default=None, help='файл базы данных SQLite вместо PostgreSQL')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    test = LoadTest(users=args.users, turns=args.turns, accuracy=args.accuracy,
+                    rating_rate=args.rating_rate, id_base=args.id_base, sqlite_path=args.sqlite)
+    migrate(test.db)
+    if args.sqlite:
+        test.db.seed_words()
+    try:
+        report = test.run()
+    finally:
+        if not args.keep:
+            test.cleanup()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            report['baseline'] = compare(report, json.load(file))
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    print(f"ходов: {report['turns']}, ошибок: {report['errors']}, "
+          f"{report['throughput_turns_per_s']} ходов/с")
+    print(f"задержка, мс: p50 {report['latency_ms']['p50']}, p95 {report['latency_ms']['p95']}, "
+          f"p99 {report['latency_ms']['p99']}")
+    print(f"SQL-запросов на ход: {report['sql_per_turn']['mean']}")
+    for name, (before, after, change) in report.get('baseline', {}).items():
+        print(f'{name}: {before} -> {after} ({change}%)')
+    print(f'Отчёт записан в {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,55 +2,215 @@
     Основной файл для запуска Telegram-бота.
     Запускает бот и инициализирует обработчики.
 """
+import asyncio
 import logging
 import telebot
 
 from handlers import Handlers
-from config import TELEBOT_TOKEN, config_logging
-from utils import DatabaseUtils
-from time import sleep
+from dispatcher import ChatDispatcher
+from config import (TELEBOT_TOKEN, BOT_MODE, BOT_THREADS, DISPATCHER, METRICS, OUTBOUND, POLLING_RETRY, WEBHOOK,
+                    config_logging)
+from metrics import REGISTRY, MetricsServer, install_telegram_timer
+from migrations import migrate
+from outbound import OutboundBot
+from pool import backoff_delay
+from webhook import WebhookServer
+from time import monotonic, sleep
 
 config_logging()
 logger = logging.getLogger('main')
 
 
+def polling_attempt(attempt, started):
+    """
+    Номер неудачной попытки подключения к Telegram подряд.
+    Если polling проработал дольше максимальной задержки, счёт начинается заново.
+
+    :param attempt: Номер предыдущей неудачной попытки.
+    :param started: Время запуска polling (time.monotonic).
+    :return: int Номер текущей неудачной попытки.
+    """
+    if monotonic() - started > POLLING_RETRY['cap']:
+        return 1
+    return attempt + 1
+
+
+def start_metrics(db, telegram_timer=True, outbound=None, sessions=None, dispatcher=None, serve=True):
+    """
+        Запускает HTTP-сервер метрик, если задан параметр metrics_port.
+
+        :param db: Объект базы данных, статистика которого публикуется в метриках.
+        :param telegram_timer: Замерять запросы к Telegram Bot API (только для синхронного TeleBot).
+        :param outbound: Очередь исходящих сообщений OutboundBot или None.
+        :param sessions: Хранилище игровых сессий SessionStore или None.
+        :param dispatcher: Диспетчер обновлений ChatDispatcher или None.
+        :param serve: Запустить HTTP-сервер. Рабочие процессы supervisor.py только регистрируют
+            метрики, а отдаёт их сервер процесса-супервизора.
+    """
+    if not METRICS['port']:
+        return
+    REGISTRY.stats_gauge('bot_db_pool', 'Состояние пула соединений с базой данных', db.pool_stats)
+    REGISTRY.stats_gauge('bot_user_cache', 'Состояние кэша пользователей', db.user_cache.stats)
+    if getattr(db, 'write_behind', None):
+        REGISTRY.stats_gauge('bot_write_behind', 'Состояние буфера отложенной записи', db.write_behind.stats)
+    if outbound is not None:
+        REGISTRY.stats_gauge('bot_outbound', 'Состояние очереди исходящих сообщений', outbound.stats)
+    if sessions is not None:
+        REGISTRY.stats_gauge('bot_sessions', 'Состояние хранилища игровых сессий', sessions.stats)
+    if dispatcher is not None:
+        REGISTRY.stats_gauge('bot_dispatcher', 'Состояние очередей шардов диспетчера обновлений', dispatcher.stats,
+                             label='shard')
+    if telegram_timer:
+        install_telegram_timer()
+    if serve:
+        MetricsServer(METRICS['host'], METRICS['port']).start()
+
+
 class Bot_star:
     """
         Класс для управления запуском и работой Telegram-бота.
 
         Attributes:
             bot (telebot.TeleBot): Объект бота для взаимодействия с Telegram API.
+            outbound (OutboundBot): Очередь исходящих сообщений или None, если сообщения отправляются сразу.
+            dispatcher (ChatDispatcher): Диспетчер обновлений по чатам или None.
             handlers (Handlers): Обработчик для работы с командами бота.
     """
 
-    def __init__(self, api_token):
+    def __init__(self, api_token, threaded=True, global_rate=None):
         """
             Инициализация бота и обработчиков.
 
             :param api_token (str): Токен API для подключения к Telegram.
+            :param threaded (bool): Обрабатывать обновления в пуле потоков TeleBot.
+                В режиме webhook обработку выполняют потоки WebhookServer.
+                При включённом диспетчере обработку выполняют потоки его шардов.
+            :param global_rate (float): Сообщений в секунду для очереди исходящих сообщений этого процесса,
+                по умолчанию outbound_global_rate. Рабочие процессы супервизора получают свою долю лимита.
         """
 
-        self.bot = telebot.TeleBot(api_token)
-        self.handlers = Handlers(self.bot)
+        threaded = threaded and not DISPATCHER['enabled']
+        self.bot = telebot.TeleBot(api_token, threaded=threaded, num_threads=BOT_THREADS)
+        self.dispatcher = None
+        if DISPATCHER['enabled']:
+            self.dispatcher = ChatDispatcher(self.bot, shards=DISPATCHER['shards'],
+                                             queue_size=DISPATCHER['queue_size'])
+            self.dispatcher.install()
+        self.outbound = None
+        if OUTBOUND['enabled']:
+            if global_rate is None:
+                global_rate = OUTBOUND['global_rate']
+            self.outbound = OutboundBot(self.bot, workers=OUTBOUND['workers'], global_rate=global_rate,
+                                        chat_rate=OUTBOUND['chat_rate'])
+        self.handlers = Handlers(self.outbound or self.bot)
 
     def run(self):
         """
             Запуск бота и обработка сообщений.
-            В случае ошибки повторяет попытку подключения.
+            Перед запуском применяет миграции схемы базы данных.
+            В случае ошибки повторяет попытку подключения с нарастающей задержкой.
         """
 
         logger.info('Запуск бота')
-        DatabaseUtils().add_tabl()
+        migrate()
+        start_metrics(self.handlers.game_utils.db, outbound=self.outbound, sessions=self.handlers.game_utils.sessions,
+                      dispatcher=self.dispatcher)
+        attempt = 0
         while True:
+            started = monotonic()
             try:
                 logger.info('Попытка подключения к Telegram...')
                 self.bot.polling(none_stop=True)
 
             except Exception as e:
                 logger.error(f'{e}', exc_info=True)
-                sleep(10)
+                attempt = polling_attempt(attempt, started)
+                sleep(backoff_delay(attempt, POLLING_RETRY['base'], POLLING_RETRY['cap']))
+
+    def run_webhook(self):
+        """
+            Запуск бота в режиме webhook.
+
+            Регистрирует адрес webhook в Telegram и принимает обновления
+            на локальном HTTP-сервере вместо long polling.
+        """
+
+        logger.info('Запуск бота в режиме webhook')
+        migrate()
+        start_metrics(self.handlers.game_utils.db, outbound=self.outbound, sessions=self.handlers.game_utils.sessions,
+                      dispatcher=self.dispatcher)
+        server = WebhookServer(self.bot, host=WEBHOOK['host'], port=WEBHOOK['port'], path=WEBHOOK['path'],
+                               queue_size=WEBHOOK['queue_size'], workers=WEBHOOK['workers'],
+                               secret_token=WEBHOOK['secret'], max_body=WEBHOOK['max_body'])
+        if WEBHOOK['url']:
+            self.bot.remove_webhook()
+            self.bot.set_webhook(url=WEBHOOK['url'], secret_token=WEBHOOK['secret'])
+        try:
+            server.serve_forever()
+        finally:
+            server.stop()
+
+
+class Bot_star_async:
+    """
+        Класс для запуска Telegram-бота в асинхронном режиме (AsyncTeleBot).
+
+        Все обработчики и запросы к базе данных выполняются в одном цикле событий,
+        поэтому один процесс обслуживает множество чатов одновременно.
+
+        Attributes:
+            bot (AsyncTeleBot): Асинхронный объект бота для взаимодействия с Telegram API.
+            handlers (AsyncHandlers): Асинхронный обработчик команд бота.
+    """
+
+    def __init__(self, api_token):
+        """
+            Инициализация асинхронного бота и обработчиков.
+
+            :param api_token (str): Токен API для подключения к Telegram.
+        """
+
+        # Асинхронный режим требует aiohttp и psycopg 3 (psycopg_pool), поэтому модули
+        # импортируются только при его запуске
+        from telebot.async_telebot import AsyncTeleBot
+        from async_handlers import AsyncHandlers
+
+        self.bot = AsyncTeleBot(api_token)
+        self.handlers = AsyncHandlers(self.bot)
+
+    async def run(self):
+        """
+            Запуск асинхронного бота и обработка сообщений.
+            В случае ошибки повторяет попытку подключения с нарастающей задержкой.
+        """
+
+        logger.info('Запуск бота в асинхронном режиме')
+        # Миграции выполняются синхронным пулом psycopg2: в отдельном потоке, чтобы не блокировать цикл событий
+        await asyncio.to_thread(migrate)
+        db = self.handlers.game_utils.db
+        await db.open()
+        start_metrics(db, telegram_timer=False, sessions=self.handlers.game_utils.sessions)
+        try:
+            attempt = 0
+            while True:
+                started = monotonic()
+                try:
+                    logger.info('Попытка подключения к Telegram...')
+                    await self.bot.polling(non_stop=True)
+
+                except Exception as e:
+                    logger.error(f'{e}', exc_info=True)
+                    attempt = polling_attempt(attempt, started)
+                    await asyncio.sleep(backoff_delay(attempt, POLLING_RETRY['base'], POLLING_RETRY['cap']))
+        finally:
+            await db.close()
 
 
 if __name__ == '__main__':
-    bot = Bot_star(TELEBOT_TOKEN)
-    bot.run()
+    if BOT_MODE == 'async':
+        asyncio.run(Bot_star_async(TELEBOT_TOKEN).run())
+    elif BOT_MODE == 'webhook':
+        Bot_star(TELEBOT_TOKEN, threaded=False).run_webhook()
+    else:
+        bot = Bot_star(TELEBOT_TOKEN)
+        bot.run()
@@ -0,0 +1,433 @@
+"""
+    Модуль со встроенными метриками: гистограммы задержек, счётчики ошибок
+    и HTTP-сервер, отдающий их в текстовом формате Prometheus.
+
+    Метрики:
+        bot_handler_seconds{handler}           - время обработчиков Handlers и GameUtils и их асинхронных вариантов;
+        bot_handler_errors_total{handler}      - исключения в обработчиках;
+        bot_db_operation_seconds{operation}    - время методов Database, AsyncDatabase и подготовленных запросов;
+        bot_db_errors_total{operation}         - ошибки базы данных по операциям;
+        bot_db_commit_seconds                  - время фиксации транзакций;
+        bot_db_recovery_seconds                - время от потери связи с базой данных до нового подключения;
+        bot_db_replays_total{operation}        - запросы, повторённые после обрыва соединения;
+        bot_telegram_request_seconds{method}   - время запросов к Telegram Bot API;
+        bot_telegram_errors_total{method}      - ошибки запросов к Telegram Bot API;
+        bot_dispatch_wait_seconds{shard}       - время ожидания обновления в очереди шарда ChatDispatcher.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('metrics')
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метки выполняющихся блоков timed: своя копия у каждого потока и каждой задачи asyncio
+_active = contextvars.ContextVar('timed_stack', default=())
+
+
+def _format_labels(labelnames, values, extra=None):
+    """
+    Формирует строку меток Prometheus.
+
+    :param labelnames: Имена меток.
+    :param values: Значения меток.
+    :param extra: Дополнительная пара (имя, значение), например le для корзины.
+    :return: str Строка вида {a="1",b="2"} или пустая строка.
+    """
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """
+        Счётчик с метками.
+
+        Attributes:
+            name (str): Имя метрики.
+            help (str): Описание метрики.
+            labelnames (tuple): Имена меток.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Увеличивает счётчик.
+
+        :param amount: Величина увеличения.
+        :param labels: Значения меток.
+        """
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """
+        Текущее значение счётчика.
+
+        :param labels: Значения меток.
+        :return: Значение счётчика.
+        """
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        """
+        Текстовое представление в формате Prometheus.
+
+        :return: list Строки метрики.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in values]
+        return lines
+
+
+class Histogram:
+    """
+        Гистограмма с метками.
+
+        Attributes:
+            name (str): Имя метрики.
+            help (str): Описание метрики.
+            labelnames (tuple): Имена меток.
+            buckets (tuple): Верхние границы корзин.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # метки -> [счётчики корзин, сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Учитывает наблюдение.
+
+        :param value: Значение, например время в секундах.
+        :param labels: Значения меток.
+        """
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        """
+        Количество наблюдений.
+
+        :param labels: Значения меток.
+        :return: int Количество наблюдений.
+        """
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def render(self):
+        """
+        Текстовое представление в формате Prometheus (накопительные корзины, _sum и _count).
+
+        :return: list Строки метрики.
+        """
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", bound))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", "+Inf"))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class StatsGauge:
+    """
+        Набор показателей, значения которых берутся из функции статистики
+        (например, Database.pool_stats) в момент запроса метрик.
+
+        Attributes:
+            name (str): Имя метрики.
+            help (str): Описание метрики.
+            callback (callable): Функция, возвращающая dict {показатель: число}.
+            label (str): Имя дополнительной метки или None. Если задано, функция возвращает
+                dict {значение метки: {показатель: число}}, например статистику по шардам.
+    """
+
+    def __init__(self, name, help, callback, label=None):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.label = label
+
+    def render(self):
+        """
+        Текстовое представление в формате Prometheus, по одной строке на числовой показатель.
+
+        :return: list Строки метрики.
+        """
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            stats = self.callback()
+        except Exception as e:
+            logger.error(f'Ошибка получения показателей {self.name}: {e}')
+            return lines
+        if self.label is None:
+            series = [((), (), stats)]
+        else:
+            series = [((self.label,), (key,), values) for key, values in sorted(stats.items())]
+        for labelnames, labels, values in series:
+            for stat, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{self.name}{_format_labels(labelnames + ("stat",), labels + (stat,))} {value}')
+        return lines
+
+
+class Registry:
+    """
+        Реестр метрик процесса.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        """
+        Регистрирует счётчик.
+
+        :return: Counter
+        """
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Регистрирует гистограмму.
+
+        :return: Histogram
+        """
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def stats_gauge(self, name, help, callback, label=None):
+        """
+        Регистрирует показатели из функции статистики. Повторная регистрация заменяет функцию.
+
+        :return: StatsGauge
+        """
+        with self._lock:
+            self._metrics.pop(name, None)
+        return self._register(StatsGauge(name, help, callback, label))
+
+    def render(self):
+        """
+        Все метрики в текстовом формате Prometheus.
+
+        :return: str Текст для ответа на /metrics.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram('bot_handler_seconds', 'Время работы обработчиков сообщений', ('handler',))
+HANDLER_ERRORS = REGISTRY.counter('bot_handler_errors_total', 'Исключения в обработчиках сообщений', ('handler',))
+DB_SECONDS = REGISTRY.histogram('bot_db_operation_seconds', 'Время операций с базой данных', ('operation',))
+DB_ERRORS = REGISTRY.counter('bot_db_errors_total', 'Ошибки операций с базой данных', ('operation',))
+DB_COMMIT_SECONDS = REGISTRY.histogram('bot_db_commit_seconds', 'Время фиксации транзакций')
+DB_RECOVERY_SECONDS = REGISTRY.histogram('bot_db_recovery_seconds',
+                                         'Время восстановления подключения к базе данных',
+                                         buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+DB_REPLAYS = REGISTRY.counter('bot_db_replays_total', 'Запросы, повторённые после обрыва соединения', ('operation',))
+TELEGRAM_SECONDS = REGISTRY.histogram('bot_telegram_request_seconds', 'Время запросов к Telegram Bot API',
+                                      ('method',))
+TELEGRAM_ERRORS = REGISTRY.counter('bot_telegram_errors_total', 'Ошибки запросов к Telegram Bot API', ('method',))
+DISPATCH_WAIT_SECONDS = REGISTRY.histogram('bot_dispatch_wait_seconds', 'Время ожидания обновления в очереди шарда',
+                                           ('shard',))
+
+
+class timed(ContextDecorator):
+    """
+        Контекстный менеджер и декоратор: записывает время выполнения в гистограмму
+        и считает исключения.
+
+        Пока блок выполняется, его метки доступны через current_label, например
+        чтобы Database.cursor отнёс ошибку к текущей операции.
+        Декорирует и корутины: время считается до завершения корутины, а не до её создания.
+
+        Пример:
+            @timed(DB_SECONDS, operation='select_data')
+            def select_data(...): ...
+    """
+
+    def __init__(self, histogram, errors=None, **labels):
+        """
+        :param histogram: Гистограмма для времени выполнения.
+        :param errors: Счётчик исключений или None.
+        :param labels: Значения меток.
+        """
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+
+    def __call__(self, func):
+        if not inspect.iscoroutinefunction(func):
+            return super().__call__(func)
+
+        @functools.wraps(func)
+        async def inner(*args, **kwargs):
+            with self._recreate_cm():
+                return await func(*args, **kwargs)
+        return inner
+
+    def __enter__(self):
+        _active.set(_active.get() + ((self.labels, time.perf_counter()),))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _active.get()
+        labels, started = stack[-1]
+        _active.set(stack[:-1])
+        self.histogram.observe(time.perf_counter() - started, **labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(**labels)
+        return False
+
+
+def current_label(name, default='unknown'):
+    """
+    Значение метки name ближайшего выполняющегося блока timed в текущем потоке или задаче asyncio.
+
+    :param name: Имя метки.
+    :param default: Значение, если такого блока нет.
+    :return: str Значение метки.
+    """
+    for labels, _ in reversed(_active.get()):
+        if name in labels:
+            return labels[name]
+    return default
+
+
+def install_telegram_timer():
+    """
+    Включает замер запросов к Telegram Bot API для синхронного TeleBot.
+
+    Запросы отправляются через apihelper.CUSTOM_REQUEST_SENDER на общей сессии requests,
+    время и ошибки записываются с меткой метода API (sendMessage, getUpdates, ...).
+    """
+    import requests
+    from telebot import apihelper
+
+    session = requests.Session()
+
+    def send(method, url, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        with timed(TELEGRAM_SECONDS, TELEGRAM_ERRORS, method=api_method):
+            return session.request(method, url, **kwargs)
+
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+
+class MetricsServer:
+    """
+        HTTP-сервер, отдающий метрики по GET /metrics в текстовом формате Prometheus.
+
+        Attributes:
+            registry (Registry): Реестр метрик.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=REGISTRY):
+        """
+        :param host: Адрес, на котором слушает сервер.
+        :param port: Порт сервера.
+        :param registry: Реестр метрик.
+        """
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _make_handler(self):
+        """
+        Создаёт класс обработчика HTTP-запросов, связанный с реестром.
+
+        :return: Подкласс BaseHTTPRequestHandler.
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def start(self):
+        """
+        Запускает сервер в фоновом потоке.
+        """
+        threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True).start()
+        host, port = self.httpd.server_address[:2]
+        logger.info(f'Метрики доступны по адресу http://{host}:{port}/metrics')
+
+    def stop(self):
+        """
+        Останавливает сервер.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,482 @@
+"""
+    Модуль с версионными миграциями схемы базы данных.
+
+    Миграции применяются только вперёд, по возрастанию версии. Применённые версии
+    записываются в таблицу schema_migrations, поэтому каждая миграция выполняется один раз.
+    Индексы создаются CONCURRENTLY, без блокировки записи в таблицы работающего бота.
+    Для хранилища SQLite у каждой миграции есть свой вариант запросов (sqlite):
+    время в нём хранится в Unix time, а все неприменённые миграции выполняются одной транзакцией.
+
+    Применить миграции вручную:
+        python migrations.py
+"""
+import logging
+import time
+
+import psycopg2
+
+from config import DB_POOL, MIGRATE, config_logging
+from database import Database
+from pool import backoff_delay
+
+config_logging()
+logger = logging.getLogger('migrations')
+
+# Ключ advisory-блокировки: миграции одновременно выполняет только один процесс
+MIGRATION_LOCK_ID = 4242001
+
+
+class Migration:
+    """
+        Одна миграция схемы.
+
+        Attributes:
+            version (int): Номер версии, определяет порядок применения.
+            description (str): Описание изменения.
+            statements (tuple): SQL-запросы, выполняемые в одной транзакции.
+            indexes (tuple): Кортежи (имя индекса, CREATE INDEX CONCURRENTLY ...),
+                выполняемые вне транзакции после statements.
+            sqlite (tuple): Запросы миграции для SQLite, включая создание индексов.
+    """
+
+    def __init__(self, version: int, description: str, statements=(), indexes=(), sqlite=()):
+        self.version = version
+        self.description = description
+        self.statements = tuple(statements)
+        self.indexes = tuple(indexes)
+        self.sqlite = tuple(sqlite)
+
+
+MIGRATIONS = [
+    Migration(1, 'Таблицы users, word и users_word', statements=(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            telegram_user_id BIGINT NOT NULL UNIQUE,
+            name VARCHAR(255),
+            points INTEGER DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS word (
+            id SERIAL PRIMARY KEY,
+            russian_words VARCHAR(255),
+            translation VARCHAR(255)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users_word (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            word_id INTEGER REFERENCES word(id) ON DELETE CASCADE,
+            times_shown INTEGER DEFAULT 0
+        )
+        """,
+    ), sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            telegram_user_id INTEGER NOT NULL UNIQUE,
+            name TEXT,
+            points INTEGER DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS word (
+            id INTEGER PRIMARY KEY,
+            russian_words TEXT,
+            translation TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users_word (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            word_id INTEGER REFERENCES word(id) ON DELETE CASCADE,
+            times_shown INTEGER DEFAULT 0
+        )
+        """,
+    )),
+    Migration(2, 'Случайный ключ слов для выборки случайных слов по индексу', statements=(
+        "ALTER TABLE word ADD COLUMN IF NOT EXISTS random_key DOUBLE PRECISION DEFAULT random()",
+        "UPDATE word SET random_key = random() WHERE random_key IS NULL",
+    ), indexes=(
+        ('word_random_key_idx', "CREATE INDEX CONCURRENTLY IF NOT EXISTS word_random_key_idx ON word (random_key)"),
+    ), sqlite=(
+        # ALTER TABLE в SQLite не принимает вычисляемое значение по умолчанию: ключ новых слов задаёт триггер
+        "ALTER TABLE word ADD COLUMN random_key REAL",
+        "UPDATE word SET random_key = random() WHERE random_key IS NULL",
+        """
+        CREATE TRIGGER IF NOT EXISTS word_random_key AFTER INSERT ON word
+        WHEN NEW.random_key IS NULL
+        BEGIN
+            UPDATE word SET random_key = random() WHERE id = NEW.id;
+        END
+        """,
+        "CREATE INDEX IF NOT EXISTS word_random_key_idx ON word (random_key)",
+    )),
+    Migration(3, 'Уникальный индекс word.russian_words для search_word', statements=(
+        # Ссылки на повторяющиеся слова переносятся на слово с наименьшим ID
+        """
+        UPDATE users_word uw
+        SET word_id = dup.keep_id
+        FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY russian_words) AS keep_id
+            FROM word
+        ) AS dup
+        WHERE uw.word_id = dup.id AND dup.id <> dup.keep_id
+        """,
+        """
+        DELETE FROM word w
+        USING word w2
+        WHERE w.russian_words = w2.russian_words AND w.id > w2.id
+        """,
+    ), indexes=(
+        ('word_russian_words_idx',
+         "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS word_russian_words_idx ON word (russian_words)"),
+    ), sqlite=(
+        """
+        UPDATE users_word
+        SET word_id = (
+            SELECT MIN(w2.id)
+            FROM word w
+            JOIN word w2 ON w2.russian_words = w.russian_words
+            WHERE w.id = users_word.word_id
+        )
+        WHERE word_id IN (
+            SELECT w.id
+            FROM word w
+            JOIN word w2 ON w2.russian_words = w.russian_words AND w2.id < w.id
+        )
+        """,
+        """
+        DELETE FROM word
+        WHERE russian_words IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM word WHERE russian_words IS NOT NULL GROUP BY russian_words)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS word_russian_words_idx ON word (russian_words)",
+    )),
+    Migration(4, 'Уникальный индекс users_word (user_id, word_id) для учёта показов', statements=(
+        # Повторы одной пары объединяются в строку с наименьшим ID с суммой показов
+        """
+        UPDATE users_word uw
+        SET times_shown = dup.total
+        FROM (
+            SELECT MIN(id) AS keep_id, SUM(times_shown) AS total
+            FROM users_word
+            GROUP BY user_id, word_id
+            HAVING COUNT(*) > 1
+        ) AS dup
+        WHERE uw.id = dup.keep_id
+        """,
+        """
+        DELETE FROM users_word uw
+        USING users_word uw2
+        WHERE uw.user_id = uw2.user_id AND uw.word_id = uw2.word_id AND uw.id > uw2.id
+        """,
+    ), indexes=(
+        ('users_word_user_id_word_id_idx',
+         "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_word_user_id_word_id_idx "
+         "ON users_word (user_id, word_id)"),
+    ), sqlite=(
+        """
+        UPDATE users_word
+        SET times_shown = (
+            SELECT SUM(dup.times_shown)
+            FROM users_word dup
+            WHERE dup.user_id = users_word.user_id AND dup.word_id = users_word.word_id
+        )
+        WHERE id IN (
+            SELECT MIN(id)
+            FROM users_word
+            WHERE user_id IS NOT NULL AND word_id IS NOT NULL
+            GROUP BY user_id, word_id
+            HAVING COUNT(*) > 1
+        )
+        """,
+        """
+        DELETE FROM users_word
+        WHERE user_id IS NOT NULL AND word_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id)
+              FROM users_word
+              WHERE user_id IS NOT NULL AND word_id IS NOT NULL
+              GROUP BY user_id, word_id
+          )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS users_word_user_id_word_id_idx ON users_word (user_id, word_id)",
+    )),
+    Migration(5, 'Расписание интервальных повторений слов', statements=(
+        """
+        CREATE TABLE IF NOT EXISTS word_schedule (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            word_id INTEGER NOT NULL REFERENCES word(id) ON DELETE CASCADE,
+            ease REAL NOT NULL,
+            interval_s INTEGER NOT NULL,
+            repetitions SMALLINT NOT NULL DEFAULT 0,
+            lapses SMALLINT NOT NULL DEFAULT 0,
+            due_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (user_id, word_id)
+        )
+        """,
+    ), sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS word_schedule (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            word_id INTEGER NOT NULL REFERENCES word(id) ON DELETE CASCADE,
+            ease REAL NOT NULL,
+            interval_s INTEGER NOT NULL,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            due_at REAL NOT NULL,
+            PRIMARY KEY (user_id, word_id)
+        )
+        """,
+    )),
+    Migration(6, 'Игровые сессии: ожидаемый ответ чата', statements=(
+        """
+        CREATE TABLE IF NOT EXISTS game_session (
+            chat_id BIGINT PRIMARY KEY,
+            word_id INTEGER REFERENCES word(id) ON DELETE CASCADE,
+            answer VARCHAR(255) NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+    ), indexes=(
+        ('game_session_expires_at_idx',
+         "CREATE INDEX CONCURRENTLY IF NOT EXISTS game_session_expires_at_idx ON game_session (expires_at)"),
+    ), sqlite=(
+        """
+        CREATE TABLE IF NOT EXISTS game_session (
+            chat_id INTEGER PRIMARY KEY,
+            word_id INTEGER REFERENCES word(id) ON DELETE CASCADE,
+            answer TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS game_session_expires_at_idx ON game_session (expires_at)",
+    )),
+    Migration(7, 'Индекс users по очкам для загрузки рейтинга', indexes=(
+        ('users_points_idx',
+         "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_points_idx ON users (points DESC, telegram_user_id)"),
+    ), sqlite=(
+        "CREATE INDEX IF NOT EXISTS users_points_idx ON users (points DESC, telegram_user_id)",
+    )),
+]
+
+
+class MigrationRunner:
+    """
+        Применяет миграции, которых ещё нет в таблице schema_migrations.
+
+        Работает на отдельном соединении: CREATE INDEX CONCURRENTLY нельзя выполнять
+        внутри транзакции, а соединения пула всегда работают в транзакциях.
+        Для SQLite миграции выполняются на соединении хранилища, см. _run_sqlite.
+
+        Attributes:
+            db (Database): База данных, параметры подключения берутся из её пула.
+            migrations (list): Список миграций.
+    """
+
+    def __init__(self, db=None, migrations=None):
+        """
+        :param db: Объект Database, по умолчанию новый Database().
+        :param migrations: Список миграций, по умолчанию MIGRATIONS.
+        """
+        self.db = db or Database()
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration.version)
+
+    def run(self):
+        """
+        Применяет все неприменённые миграции по порядку.
+
+        :return: list Версии применённых миграций.
+        """
+        if self.db.backend.name == 'sqlite':
+            return self._run_sqlite()
+
+        conn = psycopg2.connect(**self.db.pool.conn_params)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                        duration_ms INTEGER
+                    )
+                """)
+                cur.execute('SELECT version FROM schema_migrations')
+                applied = {row[0] for row in cur.fetchall()}
+
+            known = {migration.version for migration in self.migrations}
+            if applied - known:
+                logger.warning(f'В базе данных есть неизвестные версии схемы: {sorted(applied - known)}')
+
+            done = []
+            for migration in self.migrations:
+                if migration.version not in applied:
+                    self._apply(conn, migration)
+                    done.append(migration.version)
+            if not done:
+                logger.info('Схема базы данных актуальна')
+            return done
+        finally:
+            if not conn.closed:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+                conn.close()
+
+    def _run_sqlite(self):
+        """
+        Применяет неприменённые миграции к базе данных SQLite одной транзакцией.
+
+        Транзакция начинается с BEGIN IMMEDIATE: другие процессы не могут писать
+        в базу данных, пока миграции не применены, поэтому advisory-блокировка не нужна.
+        При ошибке все миграции этого запуска откатываются.
+
+        :return: list Версии применённых миграций.
+        """
+        with self.db.backend.connection() as conn:
+            # Явное управление транзакцией: иначе sqlite3 фиксирует её перед CREATE и ALTER
+            isolation_level, conn.isolation_level = conn.isolation_level, None
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('BEGIN IMMEDIATE')
+                    try:
+                        cur.execute("""
+                            CREATE TABLE IF NOT EXISTS schema_migrations (
+                                version INTEGER PRIMARY KEY,
+                                description TEXT NOT NULL,
+                                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                                duration_ms INTEGER
+                            )
+                        """)
+                        cur.execute('SELECT version FROM schema_migrations')
+                        applied = {row[0] for row in cur.fetchall()}
+
+                        done = []
+                        for migration in self.migrations:
+                            if migration.version in applied:
+                                continue
+                            logger.info(f'Применение миграции {migration.version}: {migration.description}')
+                            started = time.perf_counter()
+                            for statement in migration.sqlite:
+                                cur.execute(statement)
+                            duration_ms = round((time.perf_counter() - started) * 1000)
+                            cur.execute('INSERT INTO schema_migrations (version, description, duration_ms) '
+                                        'VALUES (%s, %s, %s)',
+                                        (migration.version, migration.description, duration_ms))
+                            done.append(migration.version)
+                        cur.execute('COMMIT')
+                    except BaseException:
+                        cur.execute('ROLLBACK')
+                        raise
+            finally:
+                conn.isolation_level = isolation_level
+
+        known = {migration.version for migration in self.migrations}
+        if applied - known:
+            logger.warning(f'В базе данных есть неизвестные версии схемы: {sorted(applied - known)}')
+        if done:
+            logger.info(f'Миграции {done} применены')
+        else:
+            logger.info('Схема базы данных актуальна')
+        return done
+
+    def _apply(self, conn, migration):
+        """
+        Применяет одну миграцию.
+
+        Запросы выполняются в транзакции, затем вне транзакции создаются индексы,
+        после чего версия записывается в schema_migrations. Если миграция прервалась,
+        при следующем запуске она выполняется заново, поэтому все её шаги идемпотентны.
+
+        :param conn: Соединение в режиме autocommit.
+        :param migration: Миграция.
+        """
+        logger.info(f'Применение миграции {migration.version}: {migration.description}')
+        started = time.perf_counter()
+
+        if migration.statements:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cur:
+                    for statement in migration.statements:
+                        cur.execute(statement)
+                conn.commit()
+            except psycopg2.DatabaseError:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+
+        for index_name, statement in migration.indexes:
+            self._create_index(conn, index_name, statement)
+
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        with conn.cursor() as cur:
+            cur.execute('INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s)',
+                        (migration.version, migration.description, duration_ms))
+        logger.info(f'Миграция {migration.version} применена за {duration_ms} мс')
+
+    @staticmethod
+    def _create_index(conn, index_name, statement):
+        """
+        Создаёт индекс CONCURRENTLY.
+
+        Прерванный CREATE INDEX CONCURRENTLY оставляет недействительный индекс,
+        который IF NOT EXISTS посчитал бы созданным, поэтому такой индекс сначала удаляется.
+
+        :param conn: Соединение в режиме autocommit.
+        :param index_name: Имя индекса.
+        :param statement: Запрос CREATE INDEX CONCURRENTLY.
+        """
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.indisvalid
+                FROM pg_class c
+                JOIN pg_index i ON i.indexrelid = c.oid
+                WHERE c.relname = %s
+            """, (index_name,))
+            row = cur.fetchone()
+            if row is not None and not row[0]:
+                logger.warning(f'Индекс {index_name} недействителен и будет создан заново')
+                cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index_name}')
+            cur.execute(statement)
+        logger.info(f'Индекс {index_name} создан')
+
+
+def migrate(db=None, attempts=None):
+    """
+    Применяет неприменённые миграции схемы.
+
+    Если база данных ещё недоступна (например, сервер запускается одновременно с ботом),
+    попытка повторяется с экспоненциальной задержкой со случайным разбросом.
+    Ошибки в самих миграциях не повторяются.
+
+    :param db: Объект Database, по умолчанию новый Database().
+    :param attempts: Количество попыток, по умолчанию параметр migrate_attempts.
+    :return: list Версии применённых миграций.
+    :raises psycopg2.OperationalError: Если база данных недоступна после всех попыток.
+    """
+    attempts = attempts or MIGRATE['attempts']
+    runner = None
+    for attempt in range(1, attempts + 1):
+        try:
+            # Пул соединений нового Database() тоже может не подключиться, поэтому он создаётся в попытке
+            runner = runner or MigrationRunner(db)
+            return runner.run()
+        except psycopg2.OperationalError as e:
+            if attempt == attempts:
+                raise
+            delay = backoff_delay(attempt, DB_POOL['reconnect_base'], MIGRATE['retry_max'])
+            logger.warning(f'Миграции не применены ({str(e).strip()}), попытка {attempt + 1} из {attempts} '
+                           f'через {delay:.2f} с')
+            time.sleep(delay)
+
+
+if __name__ == '__main__':
+    print(migrate())
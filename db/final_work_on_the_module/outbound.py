@@ -0,0 +1,417 @@
+"""
+    Модуль с очередью исходящих сообщений бота.
+
+    Обработчики не ждут HTTP-запросов к Telegram: send_message кладёт сообщение
+    в очередь чата и сразу возвращает Future, который получит отправленное сообщение. Небольшой пул потоков отправляет сообщения,
+    соблюдая ограничения Telegram (общее и на один чат) через token bucket, и объединяет
+    подряд идущие сообщения одному чату в одно, если это позволяет разметка.
+"""
+import atexit
+import html
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from telebot.apihelper import ApiTelegramException
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('outbound')
+
+# Максимальная длина текста сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Разделитель объединённых сообщений
+MERGE_SEPARATOR = '\n\n'
+
+
+class TokenBucket:
+    """
+        Token bucket: rate токенов в секунду, не больше capacity накопленных.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: Скорость пополнения, токенов в секунду.
+        :param capacity: Максимальное количество накопленных токенов (размер всплеска).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """
+        Через сколько секунд будет доступен токен.
+
+        :param now: Текущее время time.monotonic().
+        :return: float 0, если токен доступен сейчас.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now=None):
+        """
+        Забирает токен, если он доступен.
+
+        :param now: Текущее время time.monotonic().
+        :return: float 0, если токен взят, иначе время ожидания в секундах.
+        """
+        wait = self.wait_time(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+    def is_full(self, now=None):
+        """
+        Bucket полон: чат давно ничего не получал и его состояние можно забыть.
+        """
+        self._refill(time.monotonic() if now is None else now)
+        return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    """
+        Сообщение в очереди.
+
+        Attributes:
+            text (str): Текст сообщения.
+            reply_markup: Клавиатура или None.
+            parse_mode (str): Режим разметки текста или None.
+            kwargs (dict): Остальные параметры send_message.
+            attempts (int): Количество неудачных попыток отправки.
+            futures (list): Future вызовов send_message, вошедших в это сообщение.
+    """
+
+    __slots__ = ('text', 'reply_markup', 'parse_mode', 'kwargs', 'attempts', 'futures')
+
+    def __init__(self, text, reply_markup=None, parse_mode=None, kwargs=None, futures=None):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.parse_mode = parse_mode
+        self.kwargs = kwargs or {}
+        self.attempts = 0
+        self.futures = futures if futures is not None else []
+
+    def resolve(self, result=None, error=None):
+        """
+        Завершает Future всех вызовов send_message этого сообщения.
+
+        :param result: Отправленное сообщение telebot.types.Message.
+        :param error: Исключение, если сообщение не отправлено.
+        """
+        for future in self.futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def merge_messages(messages):
+    """
+    Объединяет подряд идущие сообщения в одно, пока это не меняет результат для пользователя.
+
+    Объединяются сообщения без дополнительных параметров, с одинаковым режимом разметки
+    или без разметки рядом с HTML (такой текст экранируется). Сообщение с клавиатурой
+    завершает группу: клавиатура остаётся у объединённого сообщения.
+
+    :param messages: deque сообщений чата, объединённые сообщения из неё удаляются.
+    :return: Кортеж (объединённое сообщение, количество исходных сообщений).
+    """
+    first = messages.popleft()
+    if first.kwargs or first.reply_markup is not None:
+        return first, 1
+
+    parts = [first]
+    parse_mode = first.parse_mode
+    length = len(first.text)
+    while messages:
+        candidate = messages[0]
+        if candidate.kwargs:
+            break
+        modes = {parse_mode, candidate.parse_mode} - {None}
+        if len(modes) > 1 or (modes and modes != {'HTML'}):
+            break
+        if length + len(MERGE_SEPARATOR) + len(candidate.text) > MAX_MESSAGE_LENGTH:
+            break
+        messages.popleft()
+        parts.append(candidate)
+        parse_mode = parse_mode or candidate.parse_mode
+        length += len(MERGE_SEPARATOR) + len(candidate.text)
+        if candidate.reply_markup is not None:
+            break
+
+    if len(parts) == 1:
+        return first, 1
+    text = MERGE_SEPARATOR.join(part.text if part.parse_mode == parse_mode else html.escape(part.text)
+                                for part in parts)
+    merged = OutboundMessage(text, parts[-1].reply_markup, parse_mode,
+                             futures=[future for part in parts for future in part.futures])
+    merged.attempts = max(part.attempts for part in parts)
+    return merged, len(parts)
+
+
+class OutboundBot:
+    """
+        Обёртка над TeleBot: send_message ставит сообщение в очередь, остальные
+        атрибуты (обработчики, register_next_step_handler и т. д.) берутся у исходного бота.
+
+        Сообщения одного чата отправляются по порядку и не параллельно.
+        В отличие от TeleBot.send_message, возвращается не Message, а Future: вызывающему,
+        которому нужно отправленное сообщение (например, его message_id), следует вызвать
+        future.result(). Сообщения, объединённые в одно, получают один и тот же Message.
+        При ответе 429 сообщения чата возвращаются в очередь и отправляются
+        через retry_after секунд, не блокируя остальные чаты.
+
+        Attributes:
+            bot (telebot.TeleBot): Исходный бот.
+            max_retries (int): Сколько раз повторять отправку при сетевых ошибках.
+            linger (float): Задержка отправки первого сообщения в чат для объединения.
+    """
+
+    def __init__(self, bot, workers=4, global_rate=30.0, chat_rate=1.0, chat_burst=3, max_retries=3,
+                 linger=0.05):
+        """
+        :param bot: Объект TeleBot.
+        :param workers: Количество потоков отправки.
+        :param global_rate: Сообщений в секунду для всех чатов вместе.
+        :param chat_rate: Сообщений в секунду в один чат.
+        :param chat_burst: Сколько сообщений можно отправить в чат подряд без ожидания.
+        :param max_retries: Количество повторов при сетевых ошибках.
+        :param linger: Сколько секунд ждать следующих сообщений в чат перед отправкой первого,
+            чтобы обработчик успел поставить в очередь всё, что отправляет за один ход.
+        """
+        self.bot = bot
+        self.max_retries = max_retries
+        self.linger = linger
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        # Не меньше одного токена, иначе при доле лимита меньше 1 сообщения в секунду токен не накопится
+        self._global = TokenBucket(global_rate, max(global_rate, 1))
+        self._buckets = {}
+        self._pending = {}
+        self._ready = deque()
+        self._not_before = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+        self._stats = {'queued': 0, 'sent': 0, 'api_calls': 0, 'merged': 0,
+                       'rate_limited': 0, 'retries': 0, 'dropped': 0}
+        self._threads = [threading.Thread(target=self._worker, name=f'outbound-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        if name == 'bot':
+            raise AttributeError(name)
+        return getattr(self.bot, name)
+
+    def send_message(self, chat_id, text, reply_markup=None, parse_mode=None, **kwargs):
+        """
+        Ставит сообщение в очередь чата.
+
+        :param chat_id: Идентификатор чата.
+        :param text: Текст сообщения.
+        :param reply_markup: Клавиатура.
+        :param parse_mode: Режим разметки текста.
+        :param kwargs: Остальные параметры TeleBot.send_message.
+        :return: concurrent.futures.Future с отправленным telebot.types.Message. Если сообщение
+            не удалось отправить, future.result() вызывает исключение отправки.
+        :raises RuntimeError: Если очередь закрыта.
+        """
+        future = Future()
+        message = OutboundMessage(text, reply_markup, parse_mode, kwargs, futures=[future])
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError('Очередь исходящих сообщений закрыта')
+            queue = self._pending.get(chat_id)
+            if queue is None:
+                queue = self._pending[chat_id] = deque()
+            queue.append(message)
+            self._stats['queued'] += 1
+            if chat_id not in self._active and len(queue) == 1:
+                if self.linger:
+                    self._not_before[chat_id] = time.monotonic() + self.linger
+                self._ready.append(chat_id)
+                self._wakeup.notify()
+        return future
+
+    def _next_chat(self):
+        """
+        Ожидает чат, сообщения которого можно отправлять сейчас.
+
+        :return: Идентификатор чата или None, если очередь закрыта и пуста.
+        """
+        with self._wakeup:
+            while True:
+                now = time.monotonic()
+                earliest = None
+                for _ in range(len(self._ready)):
+                    chat_id = self._ready.popleft()
+                    not_before = self._not_before.get(chat_id, 0.0)
+                    if not_before <= now:
+                        self._not_before.pop(chat_id, None)
+                        self._active.add(chat_id)
+                        return chat_id
+                    self._ready.append(chat_id)
+                    earliest = not_before if earliest is None else min(earliest, not_before)
+                if self._closed and not self._ready:
+                    return None
+                self._wakeup.wait(None if earliest is None else earliest - now)
+
+    def _release_chat(self, chat_id, delay=0.0, batch=None):
+        """
+        Возвращает чат в очередь готовых, если у него остались сообщения.
+
+        :param chat_id: Идентификатор чата.
+        :param delay: Через сколько секунд чат можно обслуживать снова.
+        :param batch: Неотправленное сообщение, которое нужно вернуть в начало очереди чата.
+        """
+        with self._wakeup:
+            self._active.discard(chat_id)
+            queue = self._pending.get(chat_id)
+            if batch is not None:
+                if queue is None:
+                    queue = self._pending[chat_id] = deque()
+                queue.appendleft(batch)
+            if queue:
+                if delay:
+                    self._not_before[chat_id] = time.monotonic() + delay
+                self._ready.append(chat_id)
+                self._wakeup.notify()
+            else:
+                self._pending.pop(chat_id, None)
+                if not self._pending and not self._active:
+                    self._idle.notify_all()
+
+    def _chat_bucket(self, chat_id):
+        """
+        Token bucket чата. Полные bucket'ы давно молчащих чатов периодически удаляются.
+        """
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                now = time.monotonic()
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.is_full(now)}
+            bucket = self._buckets[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    def _worker(self):
+        """
+        Поток отправки: берёт готовый чат, объединяет его сообщения и отправляет.
+        """
+        while True:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                return
+
+            with self._lock:
+                wait = self._chat_bucket(chat_id).take()
+            if wait:
+                self._release_chat(chat_id, delay=wait)
+                continue
+            with self._lock:
+                wait = self._global.take()
+                while wait:
+                    self._lock.release()
+                    time.sleep(wait)
+                    self._lock.acquire()
+                    wait = self._global.take()
+                message, count = merge_messages(self._pending[chat_id])
+
+            delay, retry = self._send(chat_id, message)
+            with self._lock:
+                if count > 1:
+                    self._stats['merged'] += count - 1
+                if retry is None:
+                    self._stats['sent'] += count
+            self._release_chat(chat_id, delay=delay, batch=retry)
+
+    def _send(self, chat_id, message):
+        """
+        Отправляет сообщение.
+
+        :param chat_id: Идентификатор чата.
+        :param message: Сообщение.
+        :return: Кортеж (задержка перед следующей отправкой в чат, сообщение для повтора или None).
+        """
+        with self._lock:
+            self._stats['api_calls'] += 1
+        try:
+            sent = self.bot.send_message(chat_id, message.text, reply_markup=message.reply_markup,
+                                         parse_mode=message.parse_mode, **message.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after', 1)
+                with self._lock:
+                    self._stats['rate_limited'] += 1
+                logger.warning(f'Telegram ограничил отправку в чат {chat_id}, повтор через {retry_after} с')
+                return float(retry_after), message
+            logger.error(f'Сообщение в чат {chat_id} не отправлено: {e}')
+            error = e
+        except Exception as e:
+            message.attempts += 1
+            if message.attempts <= self.max_retries:
+                with self._lock:
+                    self._stats['retries'] += 1
+                logger.warning(f'Ошибка отправки в чат {chat_id}, попытка {message.attempts}: {e}')
+                return float(2 ** (message.attempts - 1)), message
+            logger.error(f'Сообщение в чат {chat_id} не отправлено после {self.max_retries} повторов: {e}')
+            error = e
+        else:
+            message.resolve(sent)
+            return 0.0, None
+        with self._lock:
+            self._stats['dropped'] += 1
+        message.resolve(error=error)
+        return 0.0, None
+
+    def stats(self):
+        """
+        Статистика очереди.
+
+        :return: dict Счётчики отправки и количество сообщений в очереди.
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result['pending'] = sum(len(queue) for queue in self._pending.values())
+            result['chats'] = len(self._pending)
+        return result
+
+    def flush(self, timeout=None):
+        """
+        Ожидает отправки всех сообщений из очереди.
+
+        :param timeout: Максимальное время ожидания в секундах.
+        :return: True, если очередь опустела.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending and not self._active, timeout)
+
+    def close(self, timeout=10.0):
+        """
+        Отправляет оставшиеся сообщения и останавливает потоки отправки.
+
+        :param timeout: Максимальное время ожидания отправки в секундах.
+        """
+        with self._wakeup:
+            if self._closed:
+                return
+        self.flush(timeout)
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
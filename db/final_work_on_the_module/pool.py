@@ -0,0 +1,359 @@
+"""
+    Модуль с пулом соединений к базе данных.
+    Пул ограничен по размеру, выдаёт соединения с таймаутом ожидания,
+    проверяет их работоспособность и ведёт статистику использования.
+    Если база данных недоступна, новые подключения открываются с экспоненциальной
+    задержкой со случайным разбросом.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from config import config_logging
+from metrics import DB_RECOVERY_SECONDS
+
+config_logging()
+logger = logging.getLogger('pool')
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """
+    Исключение при превышении времени ожидания свободного соединения.
+    Наследуется от OperationalError, поэтому обрабатывается так же,
+    как и ошибка подключения к базе данных.
+    """
+
+
+def backoff_delay(attempt, base=0.05, cap=5.0):
+    """
+    Задержка перед повторной попыткой: экспоненциальный рост со случайным разбросом,
+    чтобы процессы и потоки не повторяли попытки одновременно.
+
+    :param attempt: Номер неудачной попытки подряд, начиная с 1.
+    :param base: Минимальная задержка в секундах.
+    :param cap: Максимальная задержка в секундах.
+    :return: float Задержка в секундах.
+    """
+    return random.uniform(base, min(cap, base * 2 ** attempt))
+
+
+def is_connection_broken(conn, error):
+    """
+    Проверяет, можно ли вернуть соединение в пул после ошибки.
+
+    :param conn: Соединение psycopg2, на котором возникла ошибка.
+    :param error: Исключение psycopg2.
+    :return: bool True, если соединение закрыто или ошибка относится к классу 08 (Connection Exception).
+    """
+    if conn.closed:
+        return True
+    pgcode = getattr(error, 'pgcode', None)
+    return pgcode is not None and pgcode.startswith('08')
+
+
+class ConnectionPool:
+    """
+        Потокобезопасный ограниченный пул соединений psycopg2.
+
+        Attributes:
+            minconn (int): Количество соединений, открываемых заранее.
+            maxconn (int): Максимальное количество одновременно открытых соединений.
+            timeout (float): Время ожидания свободного соединения в секундах.
+            health_check_interval (float): Через сколько секунд простоя соединение
+                проверяется запросом SELECT 1 перед выдачей.
+            reconnect_base (float): Начальная задержка повторного подключения, секунды.
+            reconnect_cap (float): Максимальная задержка повторного подключения, секунды.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, health_check_interval=30.0,
+                 reconnect_base=0.05, reconnect_cap=5.0, **conn_params):
+        """
+        Инициализация пула и открытие минимального количества соединений.
+
+        :param minconn: Количество соединений, открываемых заранее.
+        :param maxconn: Максимальное количество соединений в пуле.
+        :param timeout: Время ожидания свободного соединения в секундах.
+        :param health_check_interval: Интервал простоя, после которого соединение проверяется.
+        :param reconnect_base: Начальная задержка повторного подключения в секундах.
+        :param reconnect_cap: Максимальная задержка повторного подключения в секундах.
+        :param conn_params: Параметры подключения для psycopg2.connect.
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f'Некорректные размеры пула: min={minconn}, max={maxconn}')
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.conn_params = conn_params
+        self.reconnect_base = reconnect_base
+        self.reconnect_cap = reconnect_cap
+
+        self._idle = []  # список кортежей (соединение, время возврата в пул)
+        self._in_use = set()
+        self._reserved = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+        # Соединения, вернувшиеся в пул раньше этого момента, проверяются перед выдачей
+        self._suspect_before = 0.0
+        self._connect_failures = 0
+        self._retry_at = 0.0
+        self._down_since = None
+        self._stats = {
+            'acquired': 0,
+            'released': 0,
+            'created': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'health_checks': 0,
+            'waiting': 0,
+            'wait_time_total': 0.0,
+            'connect_errors': 0,
+            'reconnects': 0,
+            'recover_seconds_last': 0.0,
+        }
+
+        for _ in range(minconn):
+            try:
+                conn = self._connect(time.monotonic())
+            except psycopg2.OperationalError:
+                logger.error(f"Ошибка подключения к {conn_params.get('dbname')}")
+                break
+            self._idle.append((conn, time.monotonic()))
+
+    def _connect(self, deadline):
+        """
+        Открывает новое соединение с базой данных.
+
+        После неудачной попытки следующая выполняется не раньше, чем через backoff_delay.
+        Если до неё осталось меньше времени, чем до deadline, поток ждёт, иначе сразу
+        получает OperationalError, не нагружая недоступный сервер.
+
+        :param deadline: Момент (time.monotonic), до которого можно ждать подключения.
+        :return: Объект соединения psycopg2.
+        :raises psycopg2.OperationalError: Если подключиться не удалось до deadline.
+        """
+        while True:
+            with self._lock:
+                wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                if time.monotonic() + wait > deadline:
+                    raise psycopg2.OperationalError(
+                        f"База данных {self.conn_params.get('dbname')} недоступна, повтор через {wait:.2f} с")
+                time.sleep(wait)
+            try:
+                conn = psycopg2.connect(**self.conn_params)
+            except psycopg2.OperationalError:
+                with self._lock:
+                    self._connect_failures += 1
+                    self._stats['connect_errors'] += 1
+                    if self._down_since is None:
+                        self._down_since = time.monotonic()
+                    self._retry_at = time.monotonic() + backoff_delay(self._connect_failures, self.reconnect_base,
+                                                                      self.reconnect_cap)
+                    retry_at = self._retry_at
+                if retry_at > deadline:
+                    raise
+                continue
+
+            with self._lock:
+                self._stats['created'] += 1
+                down_since, self._down_since = self._down_since, None
+                self._connect_failures = 0
+                self._retry_at = 0.0
+                if down_since is not None:
+                    recovered = time.monotonic() - down_since
+                    self._stats['reconnects'] += 1
+                    self._stats['recover_seconds_last'] = round(recovered, 3)
+            if down_since is not None:
+                DB_RECOVERY_SECONDS.observe(recovered)
+                logger.info(f"Соединение с {self.conn_params.get('dbname')} восстановлено за {recovered:.3f} с")
+            else:
+                logger.info(f"Соединение с {self.conn_params.get('dbname')} успешно")
+            return conn
+
+    def _is_healthy(self, conn, idle_since):
+        """
+        Проверяет, можно ли выдавать соединение.
+
+        Закрытые соединения отбрасываются сразу. Соединения, простаивавшие
+        дольше health_check_interval, и соединения, вернувшиеся в пул до последнего
+        обрыва связи с сервером, проверяются запросом SELECT 1.
+
+        :param conn: Соединение из пула.
+        :param idle_since: Момент, когда соединение вернулось в пул.
+        :return: True, если соединение рабочее.
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval and idle_since >= self._suspect_before:
+            return True
+        with self._lock:
+            self._stats['health_checks'] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        """
+        Закрывает соединение, которое больше нельзя использовать.
+
+        :param conn: Соединение для закрытия.
+        """
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._stats['discarded'] += 1
+
+    def acquire(self, timeout=None):
+        """
+        Выдаёт соединение из пула.
+
+        Если свободных соединений нет и лимит не достигнут, открывается новое.
+        Иначе поток ждёт возврата соединения не дольше timeout секунд.
+
+        :param timeout: Время ожидания в секундах, по умолчанию self.timeout.
+        :return: Объект соединения psycopg2.
+        :raises PoolTimeout: Если свободное соединение не появилось за отведённое время.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            with self._available:
+                if self._closed:
+                    raise psycopg2.InterfaceError('Пул соединений закрыт')
+                while not self._idle and len(self._in_use) + self._reserved >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'Нет свободных соединений за {timeout} с')
+                    self._stats['waiting'] += 1
+                    self._available.wait(remaining)
+                    self._stats['waiting'] -= 1
+
+                conn, idle_since = self._idle.pop() if self._idle else (None, None)
+                # Резервируем место, чтобы другие потоки не превысили maxconn,
+                # пока соединение проверяется или открывается.
+                self._reserved += 1
+
+            try:
+                if conn is not None and not self._is_healthy(conn, idle_since):
+                    logger.warning('Соединение из пула не прошло проверку и будет закрыто')
+                    self._discard(conn)
+                    conn = None
+                elif conn is None:
+                    conn = self._connect(deadline)
+            finally:
+                with self._available:
+                    self._reserved -= 1
+                    if conn is not None:
+                        self._in_use.add(conn)
+                        self._stats['acquired'] += 1
+                        self._stats['wait_time_total'] += time.monotonic() - started
+                    else:
+                        self._available.notify()
+
+            if conn is not None:
+                return conn
+            # Отброшенное соединение: повторяем с другим свободным или открываем новое.
+
+    def release(self, conn, discard=False):
+        """
+        Возвращает соединение в пул.
+
+        Незавершённая транзакция откатывается. Сломанные соединения
+        и соединения, помеченные discard, закрываются.
+
+        :param conn: Соединение, полученное через acquire.
+        :param discard: Закрыть соединение вместо возврата в пул.
+        """
+        with self._lock:
+            if conn not in self._in_use:
+                return
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            discard = True
+
+        with self._available:
+            self._in_use.discard(conn)
+            self._stats['released'] += 1
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Контекстный менеджер: выдаёт соединение и возвращает его в пул по выходу.
+
+        :param timeout: Время ожидания свободного соединения.
+        """
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # Отменённый запрос (57014) или блокировка не ломают соединение: release() откатит
+            # транзакцию и вернёт его в пул. Отбрасываются только закрытые соединения и ошибки класса 08
+            broken = is_connection_broken(conn, e)
+            if conn.closed:
+                # Связь с сервером оборвалась: остальные свободные соединения, скорее всего, тоже сломаны
+                with self._lock:
+                    self._suspect_before = time.monotonic()
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    def stats(self):
+        """
+        Возвращает статистику использования пула.
+
+        :return: dict Размер пула, количество занятых и свободных соединений, счётчики.
+        """
+        with self._lock:
+            in_use = len(self._in_use)
+            result = dict(self._stats)
+            result.update({
+                'min': self.minconn,
+                'max': self.maxconn,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'size': in_use + len(self._idle),
+                'down': int(self._down_since is not None),
+            })
+        return result
+
+    def close(self):
+        """
+        Закрывает все свободные соединения и запрещает выдачу новых.
+        Занятые соединения закрываются при возврате.
+        """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
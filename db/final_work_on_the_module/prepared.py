@@ -0,0 +1,163 @@
+"""
+    Модуль с реестром подготовленных на сервере запросов (PREPARE / EXECUTE).
+    Частые запросы разбираются и планируются PostgreSQL один раз на соединение,
+    дальше выполняются по имени с новыми параметрами.
+"""
+import re
+import threading
+
+from psycopg2 import errorcodes, extensions
+
+
+class PreparedConnection(extensions.connection):
+    """
+        Соединение psycopg2, которое помнит имена подготовленных на нём запросов.
+
+        Подготовленные запросы живут в сессии PostgreSQL, поэтому у нового
+        соединения (в том числе после переподключения) набор пуст и запросы
+        подготавливаются заново при первом выполнении.
+
+        Attributes:
+            prepared (set): Имена запросов, подготовленных на этом соединении.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def numbered_placeholders(query: str):
+    """
+    Заменяет плейсхолдеры %s на $1, $2, ... для PREPARE.
+
+    :param query: Текст запроса с плейсхолдерами %s.
+    :return: Кортеж (текст запроса с $n, количество параметров).
+    """
+    count = 0
+
+    def replace(_):
+        nonlocal count
+        count += 1
+        return f'${count}'
+
+    return re.sub(r'%s', replace, query), count
+
+
+class StatementRegistry:
+    """
+        Реестр именованных подготовленных запросов со статистикой выполнения.
+
+        На соединениях, не являющихся PreparedConnection, запрос выполняется
+        обычным способом, без подготовки.
+
+        Attributes:
+            statements (dict): Исходный текст запроса, текст для PREPARE и количество параметров по имени.
+            idempotent (set): Имена запросов, которые можно повторить после обрыва соединения.
+    """
+
+    def __init__(self):
+        self.statements = {}
+        self.idempotent = set()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, query: str, idempotent: bool = None):
+        """
+        Регистрирует запрос.
+
+        :param name: Имя подготовленного запроса (идентификатор SQL).
+        :param query: Текст запроса с плейсхолдерами %s.
+        :param idempotent: Повторное выполнение запроса не меняет результат, по умолчанию
+            идемпотентными считаются только запросы SELECT.
+        """
+        if not name.isidentifier():
+            raise ValueError(f'Некорректное имя подготовленного запроса: {name}')
+        self.statements[name] = (query, *numbered_placeholders(query))
+        if idempotent is None:
+            idempotent = query.lstrip().upper().startswith('SELECT')
+        if idempotent:
+            self.idempotent.add(name)
+        else:
+            self.idempotent.discard(name)
+        with self._lock:
+            self._stats.setdefault(name, {'calls': 0, 'prepares': 0, 'errors': 0,
+                                          'total_time': 0.0, 'max_time': 0.0})
+
+    def prepare(self, cur, name: str):
+        """
+        Подготавливает запрос на соединении курсора, если он ещё не подготовлен.
+
+        :param cur: Курсор соединения.
+        :param name: Имя зарегистрированного запроса.
+        :return: str Текст EXECUTE (или исходный запрос) с плейсхолдерами %s для параметров.
+        """
+        plain, query, params = self.statements[name]
+        if not isinstance(cur.connection, PreparedConnection):
+            return plain
+        prepared = cur.connection.prepared
+        if name not in prepared:
+            cur.execute(f'PREPARE {name} AS {query}')
+            prepared.add(name)
+            with self._lock:
+                self._stats[name]['prepares'] += 1
+        if not params:
+            return f'EXECUTE {name}'
+        return f"EXECUTE {name} ({', '.join(['%s'] * params)})"
+
+    @staticmethod
+    def handle_error(cur, name: str, error):
+        """
+        Синхронизирует набор подготовленных запросов соединения с сервером после ошибки.
+
+        Если сервер не знает запрос (например, сессия была сброшена), он помечается
+        неподготовленным. Если запрос уже подготовлен на сервере, он помечается подготовленным.
+
+        :param cur: Курсор соединения.
+        :param name: Имя запроса.
+        :param error: Исключение psycopg2.
+        :return: True, если после ошибки запрос имеет смысл повторить.
+        """
+        if not isinstance(cur.connection, PreparedConnection):
+            return False
+        if error.pgcode == errorcodes.INVALID_SQL_STATEMENT_NAME:
+            cur.connection.prepared.discard(name)
+            return True
+        if error.pgcode == errorcodes.DUPLICATE_PREPARED_STATEMENT:
+            cur.connection.prepared.add(name)
+            return True
+        return False
+
+    def record(self, name: str, elapsed: float, error: bool = False):
+        """
+        Учитывает выполнение запроса в статистике.
+
+        :param name: Имя запроса.
+        :param elapsed: Время выполнения в секундах.
+        :param error: Выполнение завершилось ошибкой.
+        """
+        with self._lock:
+            stats = self._stats[name]
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            if error:
+                stats['errors'] += 1
+
+    def stats(self):
+        """
+        Статистика по запросам.
+
+        :return: dict {имя: {calls, prepares, errors, avg_ms, max_ms, total_ms}}.
+        """
+        with self._lock:
+            return {
+                name: {
+                    'calls': stats['calls'],
+                    'prepares': stats['prepares'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_time'] / stats['calls'] * 1000, 3) if stats['calls'] else 0.0,
+                    'max_ms': round(stats['max_time'] * 1000, 3),
+                    'total_ms': round(stats['total_time'] * 1000, 3),
+                }
+                for name, stats in self._stats.items()
+            }
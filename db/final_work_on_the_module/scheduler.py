@@ -0,0 +1,379 @@
+"""
+    Модуль с планировщиком интервальных повторений слов (в стиле SM-2).
+
+    Для каждого пользователя в памяти хранится куча карточек слов, упорядоченная
+    по времени следующего показа, поэтому слово, которое пора повторить,
+    находится за O(log n) без обращения к базе данных. Состояние карточек
+    записывается в таблицу word_schedule при каждом ответе (пачкой через буфер
+    отложенной записи, если он включён) и читается из неё один раз при первом
+    обращении к пользователю.
+"""
+import heapq
+import logging
+import threading
+import time
+
+import psycopg2
+
+from cache import TTLCache
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('scheduler')
+
+DAY = 86400
+
+# Оценки ответа по шкале SM-2 (0-5): у викторины есть только правильный и неправильный ответ
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 2
+
+# Через сколько секунд повторить слово после неправильного ответа
+RELEARN_DELAY = 60
+
+# Максимальный интервал повторения
+MAX_INTERVAL = 365 * DAY
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+
+# Запросы планировщика, общие для синхронного и асинхронного вариантов
+LOAD_SCHEDULE = """
+    SELECT ws.word_id, ws.ease, ws.interval_s, ws.repetitions, ws.lapses,
+           EXTRACT(EPOCH FROM ws.due_at), w.russian_words, w.translation
+    FROM word_schedule ws
+    JOIN users u ON u.id = ws.user_id
+    JOIN word w ON w.id = ws.word_id
+    WHERE u.telegram_user_id = %s
+"""
+LOAD_WORD = 'SELECT russian_words, translation FROM word WHERE id = %s'
+SAVE_CARD = """
+    INSERT INTO word_schedule (user_id, word_id, ease, interval_s, repetitions, lapses, due_at)
+    SELECT u.id, %s, %s, %s, %s, %s, to_timestamp(%s)
+    FROM users u
+    WHERE u.telegram_user_id = %s
+    ON CONFLICT (user_id, word_id) DO UPDATE SET
+        ease = EXCLUDED.ease,
+        interval_s = EXCLUDED.interval_s,
+        repetitions = EXCLUDED.repetitions,
+        lapses = EXCLUDED.lapses,
+        due_at = EXCLUDED.due_at
+"""
+
+
+class Card:
+    """
+        Состояние слова в расписании пользователя.
+
+        Attributes:
+            word_id (int): ID слова.
+            ease (float): Коэффициент лёгкости SM-2.
+            interval (float): Текущий интервал повторения в секундах.
+            repetitions (int): Правильных ответов подряд.
+            lapses (int): Всего неправильных ответов.
+            due (float): Время следующего показа (Unix time).
+            word (str): Слово на русском языке или None, если ещё не загружено.
+            translation (str): Перевод слова или None, если ещё не загружен.
+    """
+
+    __slots__ = ('word_id', 'ease', 'interval', 'repetitions', 'lapses', 'due', 'word', 'translation')
+
+    def __init__(self, word_id, ease=DEFAULT_EASE, interval=0.0, repetitions=0, lapses=0, due=0.0,
+                 word=None, translation=None):
+        self.word_id = word_id
+        self.ease = ease
+        self.interval = interval
+        self.repetitions = repetitions
+        self.lapses = lapses
+        self.due = due
+        self.word = word
+        self.translation = translation
+
+    def review(self, correct, now):
+        """
+        Пересчитывает интервал и коэффициент лёгкости после ответа по SM-2.
+
+        Правильный ответ: 1 день, 6 дней, затем интервал умножается на коэффициент лёгкости.
+        Неправильный ответ: серия сбрасывается, слово повторяется через RELEARN_DELAY секунд.
+
+        :param correct: Ответ правильный.
+        :param now: Текущее время (Unix time).
+        """
+        quality = CORRECT_QUALITY if correct else WRONG_QUALITY
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        if correct:
+            self.repetitions += 1
+            if self.repetitions == 1:
+                self.interval = DAY
+            elif self.repetitions == 2:
+                self.interval = 6 * DAY
+            else:
+                self.interval = min(self.interval * self.ease, MAX_INTERVAL)
+        else:
+            self.repetitions = 0
+            self.lapses += 1
+            self.interval = RELEARN_DELAY
+        self.due = now + self.interval
+
+
+class UserSchedule:
+    """
+        Расписание одного пользователя: карточки и куча (время показа, ID слова).
+
+        Устаревшие элементы кучи (после пересчёта времени показа) пропускаются
+        при чтении и удаляются перестройкой кучи, когда их становится слишком много.
+    """
+
+    def __init__(self, cards=()):
+        self.cards = {card.word_id: card for card in cards}
+        self.heap = [(card.due, card.word_id) for card in self.cards.values()]
+        heapq.heapify(self.heap)
+
+    def push(self, card):
+        """
+        Добавляет или обновляет карточку.
+
+        :param card: Карточка слова.
+        """
+        self.cards[card.word_id] = card
+        heapq.heappush(self.heap, (card.due, card.word_id))
+        if len(self.heap) > 2 * len(self.cards) + 16:
+            self.heap = [(card.due, card.word_id) for card in self.cards.values()]
+            heapq.heapify(self.heap)
+
+    def peek_due(self, now):
+        """
+        Карточка, которую пора показать, с самым ранним временем показа.
+
+        :param now: Текущее время (Unix time).
+        :return: Card или None, если повторять пока нечего.
+        """
+        while self.heap:
+            due, word_id = self.heap[0]
+            card = self.cards.get(word_id)
+            if card is None or card.due != due:
+                heapq.heappop(self.heap)
+                continue
+            return card if due <= now else None
+        return None
+
+
+class WordScheduler:
+    """
+        Планировщик повторений слов для всех пользователей.
+
+        Расписания пользователей хранятся в LRU-кэше и загружаются из таблицы
+        word_schedule при первом обращении. Каждый ответ записывается в базу данных сразу,
+        а если у db включён буфер отложенной записи (db.write_behind) - пачкой вместе с очками.
+        Если расписание не удалось загрузить, ответ не записывается, чтобы не заменить
+        сохранённую историю повторений карточкой по умолчанию.
+        Карточки хранят слово и перевод, поэтому слово из расписания задаётся
+        и проверяется без запросов к таблице word.
+
+        Attributes:
+            db (Database): База данных с таблицами word_schedule, users и word.
+    """
+
+    def __init__(self, db, maxsize=10000, ttl=3600.0):
+        """
+        :param db: Объект Database.
+        :param maxsize: Сколько расписаний пользователей держать в памяти.
+        :param ttl: Время жизни расписания в памяти, секунды.
+        """
+        self.db = db
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build(rows):
+        """
+        Собирает расписание из строк запроса LOAD_SCHEDULE.
+
+        :param rows: Строки (word_id, ease, interval, repetitions, lapses, due, word, translation).
+        :return: UserSchedule
+        """
+        return UserSchedule(Card(word_id, ease, interval, repetitions, lapses, float(due), word, translation)
+                            for word_id, ease, interval, repetitions, lapses, due, word, translation in rows)
+
+    def _load(self, telegram_user_id):
+        """
+        Загружает расписание пользователя из базы данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :return: UserSchedule или None при ошибке базы данных.
+        """
+        try:
+            with self.db.cursor() as cur:
+                cur.execute(LOAD_SCHEDULE, (telegram_user_id,))
+                rows = cur.fetchall()
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка загрузки расписания пользователя {telegram_user_id}: {e}')
+            return None
+        return self._build(rows)
+
+    def _remember(self, telegram_user_id, loaded):
+        """
+        Сохраняет загруженное расписание в кэше, если его не загрузил параллельный запрос.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param loaded: UserSchedule или None при ошибке загрузки.
+        :return: UserSchedule или None при ошибке загрузки.
+        """
+        if loaded is None:
+            # Не кэшируем пустое расписание, чтобы загрузить его при следующем обращении
+            return None
+        with self._lock:
+            schedule = self._users.get(telegram_user_id)
+            if schedule is None:
+                schedule = loaded
+                self._users.set(telegram_user_id, schedule)
+        return schedule
+
+    def _schedule(self, telegram_user_id):
+        """
+        Расписание пользователя из кэша или из базы данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :return: UserSchedule или None, если расписание не удалось загрузить.
+        """
+        schedule = self._users.get(telegram_user_id)
+        if schedule is None:
+            schedule = self._remember(telegram_user_id, self._load(telegram_user_id))
+        return schedule
+
+    def _peek(self, schedule, now):
+        """
+        Карточка, которую пора показать.
+
+        :param schedule: UserSchedule пользователя.
+        :param now: Текущее время (Unix time).
+        :return: Card или None.
+        """
+        with self._lock:
+            return schedule.peek_due(now)
+
+    def _word_loaded(self, schedule, card, row):
+        """
+        Запоминает в карточке слово и перевод, прочитанные запросом LOAD_WORD.
+
+        :param schedule: UserSchedule пользователя.
+        :param card: Карточка слова.
+        :param row: Строка (слово, перевод) или None, если слово удалено.
+        :return: Кортеж (ID слова, слово, перевод) или None.
+        """
+        with self._lock:
+            if row is None:
+                schedule.cards.pop(card.word_id, None)
+                return None
+            card.word, card.translation = row
+        return card.word_id, card.word, card.translation
+
+    def next_due(self, telegram_user_id, now=None):
+        """
+        Слово, которое пользователю пора повторить.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: Кортеж (ID слова, слово, перевод) или None, если повторять пока нечего.
+        """
+        now = time.time() if now is None else now
+        schedule = self._schedule(telegram_user_id)
+        if schedule is None:
+            return None
+        card = self._peek(schedule, now)
+        if card is None:
+            return None
+        if card.word is not None:
+            return card.word_id, card.word, card.translation
+
+        try:
+            with self.db.cursor() as cur:
+                cur.execute(LOAD_WORD, (card.word_id,))
+                row = cur.fetchone()
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка загрузки слова {card.word_id}: {e}')
+            return None
+        return self._word_loaded(schedule, card, row)
+
+    def translation(self, telegram_user_id, word_id):
+        """
+        Перевод слова из расписания пользователя в памяти, без обращения к базе данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        :return: str Перевод или None, если расписание не загружено или слова в нём нет.
+        """
+        schedule = self._users.get(telegram_user_id)
+        if schedule is None:
+            return None
+        with self._lock:
+            card = schedule.cards.get(word_id)
+            return card.translation if card is not None else None
+
+    def _review(self, schedule, telegram_user_id, word_id, correct, now):
+        """
+        Пересчитывает карточку слова после ответа.
+
+        :param schedule: UserSchedule пользователя.
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        :param correct: Ответ правильный.
+        :param now: Текущее время (Unix time).
+        :return: Кортеж (Card, значения для запроса SAVE_CARD).
+        """
+        with self._lock:
+            card = schedule.cards.get(word_id)
+            if card is None:
+                card = Card(word_id)
+            card.review(correct, now)
+            schedule.push(card)
+            values = (word_id, card.ease, round(card.interval), card.repetitions, card.lapses, card.due,
+                      telegram_user_id)
+        return card, values
+
+    def _buffer(self, telegram_user_id, card):
+        """
+        Передаёт карточку в буфер отложенной записи, если он включён.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param card: Обновлённая карточка.
+        :return: True, если карточка передана в буфер, False - её нужно записать запросом SAVE_CARD.
+        """
+        write_behind = getattr(self.db, 'write_behind', None)
+        if not write_behind:
+            return False
+        write_behind.add_card(telegram_user_id, card.word_id, card.ease, round(card.interval), card.repetitions,
+                              card.lapses, card.due)
+        return True
+
+    def record(self, telegram_user_id, word_id, correct, now=None):
+        """
+        Учитывает ответ пользователя: пересчитывает карточку слова и записывает её в базу данных.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        :param correct: Ответ правильный.
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: Card Обновлённая карточка или None, если расписание не удалось загрузить.
+        """
+        now = time.time() if now is None else now
+        schedule = self._schedule(telegram_user_id)
+        if schedule is None:
+            logger.warning(f'Ответ пользователя {telegram_user_id} не записан в расписание: оно не загружено')
+            return None
+        card, values = self._review(schedule, telegram_user_id, word_id, correct, now)
+        if self._buffer(telegram_user_id, card):
+            return card
+        try:
+            with self.db.cursor() as cur:
+                cur.execute(SAVE_CARD, values)
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка записи расписания пользователя {telegram_user_id}: {e}')
+        return card
+
+    def stats(self):
+        """
+        Статистика кэша расписаний.
+
+        :return: dict Показатели кэша.
+        """
+        return self._users.stats()
@@ -0,0 +1,282 @@
+"""
+    Модуль с хранилищем игровых сессий.
+
+    Сессия - это ожидаемый ответ чата: ID слова и правильный перевод. Сессии хранятся
+    в памяти (с ограничением количества) и в таблице game_session, поэтому переживают
+    перезапуск бота и доступны нескольким процессам с общей базой данных.
+    Просроченные сессии удаляет фоновый поток.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('sessions')
+
+# Запросы к таблице game_session, выполняемые как подготовленные на сервере
+SESSION_STATEMENTS = {
+    'session_save': """
+        INSERT INTO game_session (chat_id, word_id, answer, expires_at)
+        VALUES (%s, %s, %s, to_timestamp(%s))
+        ON CONFLICT (chat_id) DO UPDATE SET
+            word_id = EXCLUDED.word_id,
+            answer = EXCLUDED.answer,
+            expires_at = EXCLUDED.expires_at
+    """,
+    'session_get': """
+        SELECT word_id, answer, EXTRACT(EPOCH FROM expires_at)
+        FROM game_session
+        WHERE chat_id = %s AND expires_at > now()
+    """,
+    'session_take': """
+        DELETE FROM game_session
+        WHERE chat_id = %s
+        RETURNING word_id, answer, EXTRACT(EPOCH FROM expires_at)
+    """,
+    'session_sweep': 'DELETE FROM game_session WHERE expires_at <= now()',
+}
+
+
+class Session:
+    """
+        Ожидаемый ответ чата.
+
+        Attributes:
+            word_id (int): ID слова в базе данных или None.
+            answer (str): Правильный перевод.
+            expires (float): Время окончания сессии (Unix time).
+    """
+
+    __slots__ = ('word_id', 'answer', 'expires')
+
+    def __init__(self, word_id, answer, expires):
+        self.word_id = word_id
+        self.answer = answer
+        self.expires = expires
+
+
+class SessionStore:
+    """
+        Хранилище игровых сессий по chat_id.
+
+        Каждая сессия записывается в память и в базу данных. Если база данных доступна,
+        сессия читается из неё: другой процесс мог задать новый вопрос этому чату или уже
+        принять ответ. Сессия забирается запросом DELETE ... RETURNING, поэтому ответ
+        засчитывается только одним процессом. Если база данных недоступна (или не задана),
+        хранилище работает в памяти; при превышении maxsize вытесняются самые старые сессии.
+
+        Attributes:
+            db (Database): База данных с таблицей game_session или None, если хранить только в памяти.
+            ttl (float): Время жизни сессии, секунды.
+            maxsize (int): Сколько сессий держать в памяти.
+    """
+
+    def __init__(self, db=None, ttl=86400.0, maxsize=10000, sweep_interval=60.0):
+        """
+        Инициализация хранилища и запуск фонового потока очистки.
+
+        :param db: Объект Database или None.
+        :param ttl: Время жизни сессии в секундах.
+        :param maxsize: Максимальное количество сессий в памяти.
+        :param sweep_interval: Интервал удаления просроченных сессий в секундах.
+        """
+        self.db = db
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.sweep_interval = sweep_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'saved': 0, 'taken': 0, 'restored': 0, 'expired': 0, 'evicted': 0, 'errors': 0}
+        if db is not None:
+            for name, query in SESSION_STATEMENTS.items():
+                # Повторная запись той же сессии ничего не меняет, а DELETE ... RETURNING повторять нельзя
+                db.statements.register(name, query, idempotent=name in ('session_save', 'session_get'))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='session-sweeper', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _execute(self, name, values=(), fetch=None):
+        """
+        Выполняет запрос к таблице game_session, ошибки базы данных записываются в лог.
+
+        :param name: Имя подготовленного запроса.
+        :param values: Значения параметров.
+        :param fetch: Режим выборки, как в Database.execute_prepared.
+        :return: Результат запроса или None при ошибке или без базы данных.
+        """
+        if self.db is None:
+            return None
+        try:
+            return self.db.execute_prepared(name, values, fetch=fetch)
+        except psycopg2.DatabaseError as e:
+            self._failed(name, e)
+            return None
+
+    def _failed(self, name, error):
+        """
+        Учитывает ошибку запроса к таблице game_session.
+
+        :param name: Имя запроса.
+        :param error: Исключение базы данных.
+        """
+        with self._lock:
+            self._stats['errors'] += 1
+        logger.error(f'Ошибка запроса {name} к хранилищу сессий: {error}')
+
+    def _remember(self, chat_id, word_id, answer):
+        """
+        Сохраняет сессию в памяти.
+
+        :param chat_id: Идентификатор чата.
+        :param word_id: ID слова в базе данных или None.
+        :param answer: Правильный перевод.
+        :return: float Время окончания сессии (Unix time).
+        """
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._sessions[chat_id] = Session(word_id, answer, expires)
+            self._sessions.move_to_end(chat_id)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+                self._stats['evicted'] += 1
+            self._stats['saved'] += 1
+        return expires
+
+    def set(self, chat_id, word_id, answer):
+        """
+        Сохраняет ожидаемый ответ чата, заменяя предыдущий.
+
+        :param chat_id: Идентификатор чата.
+        :param word_id: ID слова в базе данных или None.
+        :param answer: Правильный перевод.
+        """
+        expires = self._remember(chat_id, word_id, answer)
+        self._execute('session_save', (chat_id, word_id, answer, expires))
+
+    def _found(self, chat_id, rows):
+        """
+        Сессия из строк запроса session_get, а без базы данных - из памяти.
+
+        :param chat_id: Идентификатор чата.
+        :param rows: Строки запроса или None, если база данных недоступна.
+        :return: Session или None.
+        """
+        if rows is not None:
+            return Session(rows[0][0], rows[0][1], float(rows[0][2])) if rows else None
+        with self._lock:
+            session = self._sessions.get(chat_id)
+        if session is not None and session.expires > time.time():
+            return session
+        return None
+
+    def get(self, chat_id):
+        """
+        Ожидаемый ответ чата без его удаления.
+
+        :param chat_id: Идентификатор чата.
+        :return: Session или None, если сессии нет или она просрочена.
+        """
+        return self._found(chat_id, self._execute('session_get', (chat_id,), fetch='all'))
+
+    def _pop(self, chat_id):
+        """
+        Удаляет сессию чата из памяти.
+
+        :param chat_id: Идентификатор чата.
+        :return: Session или None.
+        """
+        with self._lock:
+            return self._sessions.pop(chat_id, None)
+
+    def _taken(self, session, rows):
+        """
+        Итог забора сессии: строка DELETE ... RETURNING важнее сессии из памяти.
+
+        :param session: Сессия из памяти или None.
+        :param rows: Строки запроса session_take или None, если база данных недоступна.
+        :return: Session или None, если сессии нет или она просрочена.
+        """
+        if rows is not None:
+            if rows and session is None:
+                with self._lock:
+                    self._stats['restored'] += 1
+            session = Session(rows[0][0], rows[0][1], float(rows[0][2])) if rows else None
+
+        if session is None:
+            return None
+        if session.expires <= time.time():
+            with self._lock:
+                self._stats['expired'] += 1
+            return None
+        with self._lock:
+            self._stats['taken'] += 1
+        return session
+
+    def take(self, chat_id):
+        """
+        Забирает ожидаемый ответ чата: сессия удаляется из памяти и из базы данных.
+
+        :param chat_id: Идентификатор чата.
+        :return: Session или None, если сессии нет или она просрочена.
+        """
+        session = self._pop(chat_id)
+        return self._taken(session, self._execute('session_take', (chat_id,), fetch='all'))
+
+    def _sweep_memory(self, now):
+        """
+        Удаляет просроченные сессии из памяти.
+
+        :param now: Текущее время (Unix time).
+        :return: int Количество удалённых сессий.
+        """
+        with self._lock:
+            expired = [chat_id for chat_id, session in self._sessions.items() if session.expires <= now]
+            for chat_id in expired:
+                del self._sessions[chat_id]
+            self._stats['expired'] += len(expired)
+        return len(expired)
+
+    def sweep(self, now=None):
+        """
+        Удаляет просроченные сессии из памяти и из базы данных.
+
+        :param now: Текущее время (Unix time), по умолчанию time.time().
+        :return: int Количество сессий, удалённых из памяти.
+        """
+        expired = self._sweep_memory(time.time() if now is None else now)
+        self._execute('session_sweep')
+        return expired
+
+    def _run(self):
+        """
+        Фоновый поток: периодически удаляет просроченные сессии.
+        """
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f'Ошибка очистки сессий: {e}')
+
+    def close(self):
+        """
+        Останавливает фоновый поток очистки. Сессии остаются в базе данных.
+        """
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        """
+        Статистика хранилища сессий.
+
+        :return: dict Количество сессий в памяти и счётчики операций.
+        """
+        with self._lock:
+            return {'size': len(self._sessions), 'maxsize': self.maxsize, **self._stats}
@@ -0,0 +1,347 @@
+"""
+    Модуль для запуска бота в нескольких процессах.
+
+    Процесс-супервизор получает обновления Telegram (long polling или webhook)
+    и раскладывает их по рабочим процессам по chat_id через очереди multiprocessing,
+    поэтому все обновления одного чата обрабатывает один процесс и по порядку.
+    Рабочие процессы - обычные Bot_star с общим состоянием в PostgreSQL
+    (пользователи, расписание повторений, игровые сессии). Общий лимит исходящих сообщений
+    outbound_global_rate делится между рабочими процессами поровну. Упавший рабочий процесс
+    перезапускается, а метрики всех процессов отдаются одним сервером супервизора
+    с меткой worker.
+
+    Запуск:
+        python supervisor.py
+"""
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+import telebot
+
+from config import (TELEBOT_TOKEN, BOT_MODE, BOT_THREADS, DISPATCHER, METRICS, OUTBOUND, POLLING_RETRY, SUPERVISOR,
+                    WEBHOOK, config_logging)
+from database import close_pools
+from dispatcher import chat_key
+from metrics import REGISTRY, MetricsServer
+from migrations import migrate
+from pool import backoff_delay
+
+config_logging()
+logger = logging.getLogger('supervisor')
+
+# Если рабочий процесс падает быстрее, чем за столько секунд после запуска, перезапуск откладывается
+CRASH_LOOP_SECONDS = 10
+MAX_RESTART_DELAY = 60
+
+
+def worker_main(index, updates, metrics_queue, metrics_interval, global_rate=None):
+    """
+    Точка входа рабочего процесса: создаёт Bot_star и обрабатывает обновления из очереди.
+
+    Обновления обрабатывает ChatDispatcher, поэтому внутри процесса разные чаты
+    тоже обслуживаются параллельно, а обновления одного чата - по порядку.
+
+    :param index: Номер рабочего процесса.
+    :param updates: multiprocessing.Queue с обновлениями telebot.types.Update, None - завершение.
+    :param metrics_queue: multiprocessing.Queue для отправки метрик супервизору или None.
+    :param metrics_interval: Интервал отправки метрик, секунды.
+    :param global_rate: Доля общего лимита исходящих сообщений для этого процесса, сообщений в секунду.
+    """
+    from dispatcher import ChatDispatcher
+    from main import Bot_star, start_metrics
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    star = Bot_star(TELEBOT_TOKEN, threaded=False, global_rate=global_rate)
+    if star.dispatcher is None:
+        star.dispatcher = ChatDispatcher(star.bot, shards=BOT_THREADS, queue_size=DISPATCHER['queue_size'])
+        star.dispatcher.install()
+    game_utils = star.handlers.game_utils
+
+    if metrics_queue is not None:
+        start_metrics(game_utils.db, outbound=star.outbound, sessions=game_utils.sessions,
+                      dispatcher=star.dispatcher, serve=False)
+        threading.Thread(target=_send_metrics, args=(index, metrics_queue, metrics_interval),
+                         name='metrics-sender', daemon=True).start()
+
+    logger.info(f'Рабочий процесс {index} запущен')
+    while True:
+        update = updates.get()
+        if update is None:
+            break
+        star.bot.process_new_updates([update])
+    star.dispatcher.close()
+    logger.info(f'Рабочий процесс {index} остановлен')
+
+
+def _send_metrics(index, metrics_queue, interval):
+    """
+    Поток рабочего процесса: периодически отправляет метрики процесса супервизору.
+
+    :param index: Номер рабочего процесса.
+    :param metrics_queue: Очередь метрик супервизора.
+    :param interval: Интервал отправки, секунды.
+    """
+    while True:
+        try:
+            metrics_queue.put_nowait((index, REGISTRY.render()))
+        except queue.Full:
+            pass
+        time.sleep(interval)
+
+
+def merge_metrics(texts):
+    """
+    Объединяет метрики нескольких процессов в один текст Prometheus.
+
+    К каждой строке добавляется метка worker, строки одной метрики разных процессов
+    группируются под общими # HELP и # TYPE.
+
+    :param texts: dict {метка процесса: текст метрик в формате Prometheus}.
+    :return: str Объединённый текст.
+    """
+    families = {}
+    for worker, text in sorted(texts.items()):
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# '):
+                parts = line.split(' ', 3)
+                if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                    family = families.setdefault(parts[2], {'HELP': None, 'TYPE': None, 'series': []})
+                    family[parts[1]] = family[parts[1]] or line
+                continue
+            if not line.strip() or family is None:
+                continue
+            name, _, rest = line.partition('{')
+            if rest:
+                line = f'{name}{{worker="{worker}",{rest}'
+            else:
+                name, _, value = line.partition(' ')
+                line = f'{name}{{worker="{worker}"}} {value}'
+            family['series'].append(line)
+
+    lines = []
+    for family in families.values():
+        lines += [family[kind] for kind in ('HELP', 'TYPE') if family[kind]]
+        lines += family['series']
+    return '\n'.join(lines) + '\n'
+
+
+class Supervisor:
+    """
+        Супервизор рабочих процессов бота.
+
+        Сам супервизор не обрабатывает сообщения: он принимает обновления и передаёт их
+        рабочим процессам (process_new_updates), следит за процессами и собирает их метрики.
+
+        Attributes:
+            workers (int): Количество рабочих процессов.
+            queue_size (int): Максимальная длина очереди одного процесса.
+            metrics_interval (float): Интервал сбора метрик рабочих процессов, секунды.
+    """
+
+    def __init__(self, workers=2, queue_size=1000, metrics_interval=5.0):
+        """
+        :param workers: Количество рабочих процессов.
+        :param queue_size: Максимальная длина очереди обновлений одного процесса.
+        :param metrics_interval: Интервал отправки метрик рабочими процессами, секунды.
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.metrics_interval = metrics_interval
+        # spawn: рабочие процессы не наследуют соединения с базой данных и потоки супервизора
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._metrics_queue = self._context.Queue(maxsize=workers * 4) if METRICS['port'] else None
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+        self._restarts = [0] * workers
+        self._dispatched = [0] * workers
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _spawn(self, index):
+        """
+        Запускает рабочий процесс.
+
+        :param index: Номер рабочего процесса.
+        """
+        process = self._context.Process(target=worker_main, name=f'bot-worker-{index}',
+                                        args=(index, self._queues[index], self._metrics_queue,
+                                              self.metrics_interval, self.worker_rate()))
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def worker_rate(self):
+        """
+        Лимит исходящих сообщений одного рабочего процесса.
+
+        Ограничение Telegram действует на весь бот, а каждый процесс отправляет сообщения
+        своей очередью OutboundBot, поэтому outbound_global_rate делится между процессами.
+        Лимит на чат не делится: все обновления чата обрабатывает один процесс.
+
+        :return: float Сообщений в секунду.
+        """
+        return OUTBOUND['global_rate'] / self.workers
+
+    def process_new_updates(self, updates):
+        """
+        Передаёт обновления рабочим процессам по chat_id.
+        Если очередь процесса заполнена, вызывающий поток ждёт.
+
+        :param updates: list Обновления telebot.types.Update.
+        """
+        for update in updates:
+            index = chat_key(update) % self.workers
+            self._queues[index].put(update)
+            with self._lock:
+                self._dispatched[index] += 1
+
+    def _monitor(self):
+        """
+        Поток супервизора: перезапускает завершившиеся рабочие процессы.
+        Процесс, упавший вскоре после запуска, перезапускается с нарастающей задержкой.
+        """
+        delays = [0.0] * self.workers
+        next_start = [0.0] * self.workers
+        while not self._stopping.wait(1.0):
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                if next_start[index] == 0.0:
+                    logger.error(f'Рабочий процесс {index} завершился с кодом {process.exitcode}')
+                    if now - self._started_at[index] < CRASH_LOOP_SECONDS:
+                        delays[index] = min(max(delays[index] * 2, 1.0), MAX_RESTART_DELAY)
+                    else:
+                        delays[index] = 0.0
+                    next_start[index] = now + delays[index]
+                if now >= next_start[index]:
+                    next_start[index] = 0.0
+                    with self._lock:
+                        self._restarts[index] += 1
+                    logger.info(f'Перезапуск рабочего процесса {index}')
+                    self._spawn(index)
+
+    def _collect_metrics(self):
+        """
+        Поток супервизора: принимает метрики от рабочих процессов.
+        """
+        while not self._stopping.is_set():
+            try:
+                index, text = self._metrics_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._metrics[str(index)] = text
+
+    def render(self):
+        """
+        Метрики супервизора и последние полученные метрики рабочих процессов.
+
+        :return: str Текст в формате Prometheus.
+        """
+        with self._lock:
+            texts = dict(self._metrics)
+        texts['supervisor'] = REGISTRY.render()
+        return merge_metrics(texts)
+
+    def stats(self):
+        """
+        Статистика по рабочим процессам.
+
+        :return: dict {номер процесса: {показатель: число}}
+        """
+        result = {}
+        for index, process in enumerate(self._processes):
+            try:
+                depth = self._queues[index].qsize()
+            except NotImplementedError:
+                depth = -1
+            with self._lock:
+                result[str(index)] = {'alive': int(process is not None and process.is_alive()),
+                                      'restarts': self._restarts[index],
+                                      'dispatched': self._dispatched[index],
+                                      'depth': depth}
+        return result
+
+    def start(self):
+        """
+        Применяет миграции, запускает рабочие процессы, наблюдение за ними и сервер метрик.
+        """
+        migrate()
+        close_pools()
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._monitor, name='supervisor-monitor', daemon=True).start()
+        if self._metrics_queue is not None:
+            REGISTRY.stats_gauge('bot_supervisor_workers', 'Состояние рабочих процессов', self.stats, label='worker')
+            threading.Thread(target=self._collect_metrics, name='supervisor-metrics', daemon=True).start()
+            MetricsServer(METRICS['host'], METRICS['port'], registry=self).start()
+        logger.info(f'Запущено рабочих процессов: {self.workers}')
+
+    def stop(self, timeout=10.0):
+        """
+        Останавливает рабочие процессы после обработки уже переданных обновлений.
+
+        :param timeout: Максимальное время ожидания каждого процесса, секунды.
+        """
+        self._stopping.set()
+        for updates in self._queues:
+            updates.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=timeout)
+                if process.is_alive():
+                    process.terminate()
+
+    def run(self):
+        """
+        Запускает рабочие процессы и принимает обновления: через webhook, если bot_mode = webhook,
+        иначе через long polling.
+        """
+        self.start()
+        # Бот супервизора только получает обновления: обработчиков у него нет
+        receiver = telebot.TeleBot(TELEBOT_TOKEN, threaded=False)
+        receiver.process_new_updates = self.process_new_updates
+        try:
+            if BOT_MODE == 'webhook':
+                from webhook import WebhookServer
+
+                server = WebhookServer(receiver, host=WEBHOOK['host'], port=WEBHOOK['port'], path=WEBHOOK['path'],
+                                       queue_size=WEBHOOK['queue_size'], workers=WEBHOOK['workers'],
+                                       secret_token=WEBHOOK['secret'], max_body=WEBHOOK['max_body'])
+                if WEBHOOK['url']:
+                    receiver.remove_webhook()
+                    receiver.set_webhook(url=WEBHOOK['url'], secret_token=WEBHOOK['secret'])
+                try:
+                    server.serve_forever()
+                finally:
+                    server.stop()
+            else:
+                from main import polling_attempt
+
+                attempt = 0
+                while True:
+                    started = time.monotonic()
+                    try:
+                        logger.info('Попытка подключения к Telegram...')
+                        receiver.polling(none_stop=True)
+                    except Exception as e:
+                        logger.error(f'{e}', exc_info=True)
+                        attempt = polling_attempt(attempt, started)
+                        time.sleep(backoff_delay(attempt, POLLING_RETRY['base'], POLLING_RETRY['cap']))
+        except KeyboardInterrupt:
+            logger.info('Остановка супервизора')
+        finally:
+            self.stop()
+
+
+if __name__ == '__main__':
+    Supervisor(workers=SUPERVISOR['workers'], queue_size=SUPERVISOR['queue_size'],
+               metrics_interval=SUPERVISOR['metrics_interval']).run()
@@ -0,0 +1,93 @@
+"""
+    Заглушки соединений и курсоров psycopg2 для тестов без сервера PostgreSQL
+    и заготовка теста с временной базой данных SQLite.
+"""
+import os
+import tempfile
+import unittest
+
+from psycopg2 import extensions
+
+
+class FakeCursor:
+    """Курсор, который записывает выполненные запросы в соединение"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, values=None):
+        if self.conn.fail_with is not None:
+            raise self.conn.fail_with
+        self.conn.queries.append((query, values))
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера: хранит статус транзакции и выполненные запросы"""
+
+    def __init__(self, *args, **kwargs):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.rollbacks = 0
+        self.fail_with = None
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class SQLiteTestCase(unittest.TestCase):
+    """Тест с временной базой данных SQLite, к которой применены все миграции"""
+
+    def setUp(self):
+        from backends import SQLiteBackend
+        from migrations import MigrationRunner
+        from utils import DatabaseUtils
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.backend = SQLiteBackend(os.path.join(self.tmp.name, 'bot.sqlite3'))
+        self.addCleanup(self.backend.close)
+        self.db = DatabaseUtils(backend=self.backend)
+        MigrationRunner(self.db).run()
+
+    def write_csv(self, rows, name='words.csv'):
+        """
+        Записывает CSV-файл слов с заголовком во временную папку.
+
+        :param rows: Пары (русское слово, перевод).
+        :param name: Имя файла.
+        :return: str Путь к файлу.
+        """
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as csvfile:
+            csvfile.write('russian_word,english_word\n')
+            csvfile.writelines(f'{word},{translation}\n' for word, translation in rows)
+        return path
@@ -0,0 +1,240 @@
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HAS_PSYCOPG = importlib.util.find_spec('psycopg') is not None
+
+
+class FakeAsyncCursor:
+    """Асинхронный курсор psycopg 3, который возвращает заданные строки и записывает запросы"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def execute(self, query, values=None):
+        self.db.queries.append((query, values))
+
+    async def fetchall(self):
+        return self.db.rows
+
+    async def fetchone(self):
+        return self.db.rows[0] if self.db.rows else None
+
+
+class FakeAsyncDatabase:
+    """Асинхронная база данных без сервера"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+        self.fail_with = None
+
+    @asynccontextmanager
+    async def cursor(self):
+        if self.fail_with is not None:
+            raise self.fail_with
+        yield FakeAsyncCursor(self)
+
+
+class TestLazyImport(unittest.TestCase):
+    """Синхронный режим не требует зависимостей асинхронного режима"""
+
+    def test_main_without_async_modules(self):
+        """Импорт main не загружает async_handlers, psycopg 3 и aiohttp"""
+        code = ('import sys, main; '
+                "print(','.join(m for m in ('async_handlers', 'async_utils', 'psycopg', 'aiohttp') "
+                'if m in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code], cwd=MODULE_DIR, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=MODULE_DIR))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+@unittest.skipUnless(HAS_PSYCOPG, 'нужен psycopg 3')
+class TestAsyncGameUtils(unittest.TestCase):
+    """Тесты инициализации асинхронной игры"""
+
+    def test_init(self):
+        """Расписание и сессии асинхронные и используют ту же базу данных, режим игры 'reply'"""
+        from async_utils import AsyncGameUtils, AsyncSessionStore, AsyncWordScheduler
+        from vocabulary import VocabularyStore
+
+        db = FakeAsyncDatabase()
+        with tempfile.TemporaryDirectory() as tmp:
+            vocabulary = VocabularyStore(os.path.join(tmp, 'words.csv'))
+            with patch('async_utils.VocabularyStore', return_value=vocabulary):
+                game = AsyncGameUtils(Mock(), db=db)
+        self.assertIsInstance(game.scheduler, AsyncWordScheduler)
+        self.assertIs(game.scheduler.db, db)
+        self.assertIsInstance(game.sessions, AsyncSessionStore)
+        self.assertIs(game.sessions.db, db)
+        game.sessions.close()
+        self.assertEqual(game.mode, 'reply')
+        self.assertEqual(game.next_steps, {})
+
+    def test_no_words(self):
+        """Если слов нет ни в словаре, ни в базе данных, пользователь получает сообщение вместо вопроса"""
+        from async_utils import AsyncGameUtils
+        from bot_msg import MSG_NO_WORDS
+        from vocabulary import VocabularyStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            vocabulary = VocabularyStore(os.path.join(tmp, 'words.csv'))
+            with patch('async_utils.VocabularyStore', return_value=vocabulary):
+                game = AsyncGameUtils(Mock(send_message=AsyncMock()), db=FakeAsyncDatabase())
+        self.addCleanup(game.sessions.close)
+        message = SimpleNamespace(chat=SimpleNamespace(id=1), from_user=SimpleNamespace(id=1))
+        with patch.object(game.scheduler, 'next_due', AsyncMock(return_value=None)), \
+                patch.object(game, 'read_words_csv', AsyncMock(return_value={})), \
+                patch.object(game, 'read_words_bd', AsyncMock(return_value={})):
+            asyncio.run(game.start_game(message))
+        self.assertEqual(game.bot.send_message.await_args.args, (1, MSG_NO_WORDS))
+        self.assertEqual(game.sessions.stats()['size'], 0)
+
+
+@unittest.skipUnless(HAS_PSYCOPG, 'нужен psycopg 3')
+class TestAsyncWordScheduler(unittest.TestCase):
+    """Тесты асинхронного планировщика повторений"""
+
+    def test_record_and_next_due(self):
+        """Ответ записывается в базу данных, слово из расписания возвращается без запроса"""
+        from async_utils import AsyncWordScheduler
+        from scheduler import DAY, LOAD_SCHEDULE, SAVE_CARD
+
+        db = FakeAsyncDatabase([(7, 2.5, 0, 0, 0, 100.0, 'кот', 'cat')])
+        scheduler = AsyncWordScheduler(db)
+        self.assertEqual(asyncio.run(scheduler.next_due(1, now=200.0)), (7, 'кот', 'cat'))
+        self.assertEqual(db.queries, [(LOAD_SCHEDULE, (1,))])
+
+        card = asyncio.run(scheduler.record(1, 7, True, now=200.0))
+        self.assertEqual(card.due, 200.0 + DAY)
+        self.assertEqual(db.queries[-1][0], SAVE_CARD)
+        self.assertIsNone(asyncio.run(scheduler.next_due(1, now=300.0)))
+        self.assertEqual(scheduler.translation(1, 7), 'cat')
+        self.assertEqual(len(db.queries), 2)
+
+    def test_load_failed_not_written(self):
+        """Если расписание не загрузилось, карточка по умолчанию не записывается поверх истории"""
+        import psycopg
+        from async_utils import AsyncWordScheduler
+
+        db = FakeAsyncDatabase()
+        db.fail_with = psycopg.OperationalError('нет соединения')
+        scheduler = AsyncWordScheduler(db)
+        self.assertIsNone(asyncio.run(scheduler.record(1, 7, False, now=200.0)))
+        db.fail_with = None
+        self.assertEqual(db.queries, [])
+        self.assertEqual(scheduler.stats()['size'], 0)
+
+
+class FailingAsyncPool:
+    """Асинхронный пул, который не может выдать соединение"""
+
+    @asynccontextmanager
+    async def connection(self):
+        import psycopg
+        raise psycopg.OperationalError('нет соединения')
+        yield
+
+
+@unittest.skipUnless(HAS_PSYCOPG, 'нужен psycopg 3')
+class TestAsyncMetrics(unittest.TestCase):
+    """Асинхронные обработчики и запросы к базе данных записываются в те же метрики"""
+
+    def test_database_error_counted(self):
+        """Ошибки соединения считаются по операции, выборка после потери соединения повторяется один раз"""
+        from async_database import AsyncDatabase
+        from metrics import DB_ERRORS, DB_REPLAYS, DB_SECONDS
+
+        db = AsyncDatabase(pool=FailingAsyncPool())
+        errors = DB_ERRORS.value(operation='select_data')
+        replays = DB_REPLAYS.value(operation='select_data')
+        count = DB_SECONDS.count(operation='select_data')
+        self.assertEqual(asyncio.run(db.select_data('users')), [])
+        self.assertEqual(DB_ERRORS.value(operation='select_data'), errors + 2)
+        self.assertEqual(DB_REPLAYS.value(operation='select_data'), replays + 1)
+        self.assertEqual(DB_SECONDS.count(operation='select_data'), count + 1)
+
+    def test_not_idempotent_not_replayed(self):
+        """Вставка после потери соединения не повторяется"""
+        from async_database import AsyncDatabase
+        from metrics import DB_ERRORS
+
+        db = AsyncDatabase(pool=FailingAsyncPool())
+        errors = DB_ERRORS.value(operation='insert_data')
+        self.assertIsNone(asyncio.run(db.insert_data('users', {'name': 'Анна'})))
+        self.assertEqual(DB_ERRORS.value(operation='insert_data'), errors + 1)
+
+    def test_handler_timed(self):
+        from async_handlers import AsyncHandlers
+        from metrics import HANDLER_SECONDS
+
+        bot = Mock(send_message=AsyncMock())
+        count = HANDLER_SECONDS.count(handler='handle_help')
+        asyncio.run(AsyncHandlers.handle_help(SimpleNamespace(bot=bot), Mock()))
+        bot.send_message.assert_awaited_once()
+        self.assertEqual(HANDLER_SECONDS.count(handler='handle_help'), count + 1)
+
+
+class FakeSessionDatabase:
+    """Асинхронная база данных с таблицей game_session в словаре"""
+
+    def __init__(self):
+        from sessions import SESSION_STATEMENTS
+
+        self.names = {query: name for name, query in SESSION_STATEMENTS.items()}
+        self.rows = {}
+        self.calls = []
+
+    async def execute(self, query, values=None, fetch=None, idempotent=False):
+        name = self.names[query]
+        self.calls.append((name, idempotent))
+        if name == 'session_save':
+            chat_id, word_id, answer, expires = values
+            self.rows[chat_id] = (word_id, answer, expires)
+        elif name == 'session_get':
+            return [self.rows[values[0]]] if values[0] in self.rows else []
+        elif name == 'session_take':
+            row = self.rows.pop(values[0], None)
+            return [row] if row else []
+        return None
+
+
+@unittest.skipUnless(HAS_PSYCOPG, 'нужен psycopg 3')
+class TestAsyncSessionStore(unittest.TestCase):
+    """Асинхронное хранилище сессий пишет сессии в базу данных"""
+
+    def setUp(self):
+        from async_utils import AsyncSessionStore
+
+        self.db = FakeSessionDatabase()
+        self.store = AsyncSessionStore(self.db, ttl=60, sweep_interval=0)
+        self.addCleanup(self.store.close)
+
+    def test_restored_after_restart(self):
+        """Сессия, записанная другим экземпляром, забирается из базы данных один раз"""
+        from async_utils import AsyncSessionStore
+
+        asyncio.run(self.store.set(1, 7, 'cat'))
+        restarted = AsyncSessionStore(self.db, ttl=60)
+        self.addCleanup(restarted.close)
+        self.assertEqual(asyncio.run(restarted.get(1)).answer, 'cat')
+        self.assertEqual(asyncio.run(restarted.take(1)).word_id, 7)
+        self.assertIsNone(asyncio.run(self.store.take(1)))
+        self.assertEqual(restarted.stats()['restored'], 1)
+
+    def test_statements(self):
+        """Запись и чтение повторяются после потери соединения, забор сессии - нет; просроченные удаляются"""
+        asyncio.run(self.store.set(1, 7, 'cat'))
+        asyncio.run(self.store.get(1))
+        asyncio.run(self.store.take(1))
+        self.assertEqual(self.db.calls, [('session_save', True), ('session_sweep', False),
+                                         ('session_get', True), ('session_take', False)])
@@ -0,0 +1,151 @@
+import json
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from telebot import types
+
+import buttons
+from bot_msg import MSG_NO_WORDS
+from btn_text import BTN_STAR_GEME, VIEW_RATING
+from fakes import SQLiteTestCase
+from keyboard import ReplyKeyboard
+from utils import GameUtils
+
+
+def no_shuffle(items):
+    """Заглушка random.shuffle, сохраняющая порядок"""
+
+
+class TestReplyButtons(unittest.TestCase):
+    """Тесты закэшированных reply-клавиатур"""
+
+    def test_matches_reply_keyboard(self):
+        """Склеенная клавиатура совпадает с ReplyKeyboard(row_width=2)"""
+        words = ['cat', 'dog', 'house', 'кавычка "']
+        keyboard = ReplyKeyboard(row_width=2)
+        keyboard.add_button(*(types.KeyboardButton(text) for text in words + [VIEW_RATING]))
+        with patch('buttons.random.shuffle', no_shuffle):
+            result = buttons.translation_buttons(list(words))
+        self.assertEqual(json.loads(result), json.loads(keyboard.get_markup().to_json()))
+
+    def test_all_variants(self):
+        """Каждый вариант перевода попадает на кнопку, кнопка рейтинга последняя"""
+        markup = json.loads(buttons.translation_buttons(['a', 'b', 'c', 'd']))
+        texts = [button['text'] for row in markup['keyboard'] for button in row]
+        self.assertEqual(sorted(texts[:-1]), ['a', 'b', 'c', 'd'])
+        self.assertEqual(texts[-1], VIEW_RATING)
+        self.assertEqual([len(row) for row in markup['keyboard']], [2, 2, 1])
+
+    def test_start_button_cached(self):
+        """Стартовая клавиатура сериализуется один раз"""
+        first = buttons.start_button()
+        self.assertIs(buttons.start_button(), first)
+        self.assertEqual(json.loads(first)['keyboard'], [[{'text': BTN_STAR_GEME}]])
+
+
+class TestCallbackData(unittest.TestCase):
+    """Тесты callback_data инлайн-кнопок"""
+
+    def test_parse_callback(self):
+        self.assertEqual(buttons.parse_callback('a:15:1f2e'), ('a', 15, '1f2e'))
+        self.assertEqual(buttons.parse_callback('r'), ('r', None, None))
+        self.assertEqual(buttons.parse_callback('n'), ('n', None, None))
+        for data in ('a:x:1', 'a:1', 'b:1:2', '', None):
+            self.assertEqual(buttons.parse_callback(data), (None, None, None))
+
+    def test_answer_buttons(self):
+        """Кнопки вариантов несут ID слова и отпечаток варианта, данные укладываются в 64 байта"""
+        variants = ['cat', 'dog', 'очень длинный вариант перевода слова ' * 5]
+        markup = json.loads(buttons.answer_buttons(123456789, list(variants)))
+        pressed = [button for row in markup['inline_keyboard'] for button in row]
+        self.assertEqual(pressed[-1], {'text': VIEW_RATING, 'callback_data': 'r'})
+        for button in pressed[:-1]:
+            self.assertEqual(buttons.parse_callback(button['callback_data']),
+                             ('a', 123456789, buttons.answer_token(button['text'])))
+            self.assertLessEqual(len(button['callback_data'].encode('utf-8')), 64)
+        self.assertEqual(sorted(button['text'] for button in pressed[:-1]), sorted(variants))
+
+
+class TestInlineGame(SQLiteTestCase):
+    """Ответы нажатием инлайн-кнопок"""
+
+    def setUp(self):
+        super().setUp()
+        # Словарь и индекс вариантов ответа ищутся по относительному пути
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+        self.db.seed_words(self.write_csv([(f'слово{i}', f'word{i}') for i in range(10)],
+                                          'russian_english_words.csv'))
+        self.db.save_user('Анна', 1)
+        self.bot = Mock()
+        self.game = GameUtils(self.bot, db=self.db, mode='inline')
+        self.word_id = self.db.search_word('слово3')
+
+    def press(self, data):
+        message = SimpleNamespace(chat=SimpleNamespace(id=1), message_id=10)
+        self.game.handle_callback(SimpleNamespace(id='query', data=data, message=message,
+                                                  from_user=SimpleNamespace(id=1)))
+
+    def answer(self, text):
+        return f'a:{self.word_id}:{buttons.answer_token(text)}'
+
+    def points(self):
+        return self.db.search_user(1)['points']
+
+    def test_correct_answer(self):
+        """Правильный ответ засчитывается, сообщение заменяется следующим вопросом"""
+        self.press(self.answer('word3'))
+        self.assertEqual(self.points(), 1)
+        self.bot.answer_callback_query.assert_called_once_with('query')
+        text, chat_id, message_id = self.bot.edit_message_text.call_args.args
+        self.assertEqual((chat_id, message_id), (1, 10))
+        self.assertTrue(text.startswith('Превосходно!'))
+
+    def test_wrong_answer(self):
+        self.press(self.answer('word4'))
+        self.assertEqual(self.points(), -3)
+        self.assertIn('<b>word3</b>', self.bot.edit_message_text.call_args.args[0])
+
+    def test_repeated_press(self):
+        """Повторное нажатие кнопки того же вопроса не засчитывается"""
+        # Следующий вопрос - другое слово: вопрос с тем же словом снова принимает ответ
+        other = ('слово4', 'word4', ['word1', 'word2', 'word5'], self.db.search_word('слово4'))
+        self.game.word_generator = Mock(return_value=other)
+        self.press(self.answer('word3'))
+        self.bot.edit_message_text.reset_mock()
+        self.press(self.answer('word3'))
+        self.assertEqual(self.points(), 1)
+        self.bot.edit_message_text.assert_not_called()
+
+    def test_rating(self):
+        self.press('r')
+        self.assertIs(self.bot.edit_message_text.call_args.kwargs['reply_markup'], buttons.continue_button())
+
+    def test_unknown_data(self):
+        self.press('x:1')
+        self.bot.edit_message_text.assert_not_called()
+        self.assertEqual(self.points(), 0)
+
+    def test_no_words(self):
+        """Если слов нет ни в словаре, ни в базе данных, вопрос не задаётся"""
+        source = SimpleNamespace(chat=SimpleNamespace(id=1), from_user=SimpleNamespace(id=1))
+        with patch.object(self.game, 'read_words_csv', return_value={}), \
+                patch.object(self.game, 'read_words_bd', return_value={}):
+            self.game.ask_inline(1, source)
+            self.game.mode = 'reply'
+            self.game.start_game(source)
+        inline, reply = self.bot.send_message.call_args_list
+        self.assertEqual(inline.args, (1, MSG_NO_WORDS))
+        self.assertIs(inline.kwargs['reply_markup'], buttons.continue_button())
+        self.assertEqual(reply.args, (1, MSG_NO_WORDS))
+        self.assertEqual(self.game.sessions.stats()['size'], 0)
+
+    def test_other_source(self):
+        """Если выбранный источник пуст, слово берётся из другого"""
+        source = SimpleNamespace(chat=SimpleNamespace(id=1), from_user=SimpleNamespace(id=1))
+        with patch.object(self.game, 'read_words_csv', return_value={}), \
+                patch('utils.random.shuffle', no_shuffle):
+            word, translation, _, _ = self.game.word_generator(source)
+        self.assertEqual(translation, 'word' + word[len('слово'):])
@@ -0,0 +1,119 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from cache import TTLCache
+from config import ConfigError, env_choice, env_flag, env_float, env_int
+from fakes import SQLiteTestCase
+
+
+class TestTTLCache(unittest.TestCase):
+    """Тесты LRU-кэша со временем жизни записей"""
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется запись, к которой дольше всего не обращались"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+    def test_ttl(self):
+        """Устаревшая запись считается отсутствующей"""
+        cache = TTLCache(ttl=10)
+        with patch('cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with patch('cache.time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 1)
+        with patch('cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_patch_keeps_ttl(self):
+        """patch меняет поля словаря, не продлевая время жизни"""
+        cache = TTLCache(ttl=10)
+        with patch('cache.time.monotonic', return_value=100.0):
+            cache.set('a', {'name': 'Анна', 'points': 1})
+        with patch('cache.time.monotonic', return_value=105.0):
+            cache.patch('a', points=5)
+            cache.patch('missing', points=5)
+            self.assertEqual(cache.get('a'), {'name': 'Анна', 'points': 5})
+            self.assertIsNone(cache.get('missing'))
+        with patch('cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_stats(self):
+        cache = TTLCache(maxsize=5)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.stats(), {'size': 1, 'maxsize': 5, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class TestUserCache(SQLiteTestCase):
+    """Пользователи читаются из базы данных один раз и обновляются вместе с очками"""
+
+    def test_search_user_cached(self):
+        self.db.save_user('Анна', 1)
+        self.db.user_cache.pop(1)
+        with patch.object(self.db, 'execute_prepared', wraps=self.db.execute_prepared) as execute:
+            first = self.db.search_user(1)
+            self.assertEqual(self.db.search_user(1), first)
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(first['name'], 'Анна')
+
+    def test_unknown_user_not_cached(self):
+        self.assertIsNone(self.db.search_user(2))
+        self.db.save_user('Борис', 2)
+        self.assertEqual(self.db.search_user(2)['name'], 'Борис')
+
+    def test_points_patched(self):
+        """Изменение очков обновляет закэшированного пользователя"""
+        self.db.save_user('Анна', 1)
+        self.db.update_points(1, 3)
+        self.db.update_points(1, 1, add=False)
+        self.assertEqual(self.db.search_user(1)['points'], 2)
+        self.db.user_cache.pop(1)
+        self.assertEqual(self.db.search_user(1)['points'], 2)
+
+    def test_returned_copy(self):
+        """Изменение возвращённого словаря не меняет кэш"""
+        self.db.save_user('Анна', 1)
+        self.db.search_user(1)['points'] = 100
+        self.assertEqual(self.db.search_user(1)['points'], 0)
+
+
+class TestConfigParsing(unittest.TestCase):
+    """Тесты разбора параметров конфигурации"""
+
+    def env(self, **values):
+        patcher = patch.dict(os.environ, values)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_defaults(self):
+        """Пустое или отсутствующее значение заменяется значением по умолчанию"""
+        self.env(test_param=' ')
+        self.assertEqual(env_int('test_param', 5), 5)
+        self.assertEqual(env_float('test_missing', 2), 2.0)
+        self.assertIs(env_flag('test_param', True), True)
+        self.assertEqual(env_choice('test_param', 'a', ('a', 'b')), 'a')
+
+    def test_values(self):
+        self.env(test_int='7', test_float='0.5', test_flag='1', test_choice=' b ')
+        self.assertEqual(env_int('test_int', 1, minimum=0), 7)
+        self.assertEqual(env_float('test_float', 1), 0.5)
+        self.assertIs(env_flag('test_flag'), True)
+        self.assertEqual(env_choice('test_choice', 'a', ('a', 'b')), 'b')
+
+    def test_errors(self):
+        """Некорректное значение вызывает ConfigError с именем параметра"""
+        self.env(test_int='десять', test_negative='-1', test_flag='yes', test_choice='c')
+        cases = [lambda: env_int('test_int', 1), lambda: env_float('test_negative', 1, minimum=0),
+                 lambda: env_flag('test_flag'), lambda: env_choice('test_choice', 'a', ('a', 'b'))]
+        for case in cases:
+            with self.assertRaises(ConfigError) as error:
+                case()
+            self.assertIn('Параметр test_', str(error.exception))
@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from telebot import types
+
+from dispatcher import ChatDispatcher, chat_key
+
+
+def message_update(update_id, chat_id):
+    return types.Update.de_json({'update_id': update_id,
+                                 'message': {'message_id': update_id, 'date': 0, 'text': str(update_id),
+                                             'chat': {'id': chat_id, 'type': 'private'},
+                                             'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Анна'}}})
+
+
+class RecordingBot:
+    """Бот, который записывает порядок обработки обновлений по чатам"""
+
+    def __init__(self, fail_on=None):
+        self.threaded = False
+        self.order = {}
+        self.threads = {}
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            # Случайная задержка перемешала бы обновления чата без последовательной обработки
+            time.sleep(random.random() / 1000)
+            if update.update_id == self.fail_on:
+                raise RuntimeError('ошибка обработчика')
+            with self.lock:
+                self.order.setdefault(update.message.chat.id, []).append(update.update_id)
+                self.threads.setdefault(update.message.chat.id, set()).add(threading.current_thread().name)
+
+
+class TestChatKey(unittest.TestCase):
+    """Тесты выбора ключа шарда"""
+
+    def test_keys(self):
+        self.assertEqual(chat_key(message_update(1, 42)), 42)
+        user = SimpleNamespace(id=7)
+        call = SimpleNamespace(message=SimpleNamespace(chat=SimpleNamespace(id=9)), from_user=user)
+        self.assertEqual(chat_key(SimpleNamespace(update_id=1, callback_query=call)), 9)
+        call.message = None
+        self.assertEqual(chat_key(SimpleNamespace(update_id=1, callback_query=call)), 7)
+        self.assertEqual(chat_key(SimpleNamespace(update_id=1, inline_query=SimpleNamespace(from_user=user))), 7)
+        self.assertEqual(chat_key(SimpleNamespace(update_id=5)), 5)
+
+
+class TestChatDispatcher(unittest.TestCase):
+    """Тесты последовательной обработки обновлений чата"""
+
+    def dispatcher(self, bot, **kwargs):
+        dispatcher = ChatDispatcher(bot, **kwargs)
+        dispatcher.install()
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_order_within_chat(self):
+        """Обновления чата обрабатываются по порядку одним потоком"""
+        bot = RecordingBot()
+        dispatcher = self.dispatcher(bot, shards=4)
+        updates = [message_update(number, number % 10) for number in range(300)]
+        bot.process_new_updates(updates)
+        dispatcher.join()
+        for chat_id in range(10):
+            self.assertEqual(bot.order[chat_id], list(range(chat_id, 300, 10)))
+            self.assertEqual(bot.threads[chat_id], {f'dispatch-{chat_id % 4}'})
+
+    def test_error_does_not_stop_shard(self):
+        bot = RecordingBot(fail_on=1)
+        dispatcher = self.dispatcher(bot, shards=1)
+        bot.process_new_updates([message_update(number, 1) for number in range(3)])
+        dispatcher.join()
+        self.assertEqual(bot.order[1], [0, 2])
+        stats = dispatcher.stats()['0']
+        self.assertEqual((stats['dispatched'], stats['processed'], stats['errors'], stats['depth']), (3, 3, 1, 0))
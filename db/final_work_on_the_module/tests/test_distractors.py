@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from distractors import DistractorIndex, group_keys, length_band
+from vocabulary import VocabularyStore
+
+
+class TestDistractorIndex(unittest.TestCase):
+    """Тесты индекса неправильных вариантов перевода"""
+
+    def test_groups(self):
+        self.assertEqual([length_band(text) for text in ('cat', 'house', 'garden', 'computer', 'refrigerator')],
+                         [0, 1, 2, 3, 4])
+        self.assertEqual(group_keys('Cat'), ('0:c', '0'))
+
+    def test_similar_first(self):
+        """Варианты берутся из группы с той же длиной и первой буквой"""
+        index = DistractorIndex(['cat', 'car', 'cup', 'cow', 'dog', 'elephant', 'ant'])
+        for _ in range(50):
+            result = index.pick('cat')
+            self.assertEqual(len(result), 3)
+            self.assertEqual(set(result), {'car', 'cup', 'cow'})
+
+    def test_wider_groups(self):
+        """Недостающие варианты добираются из группы той же длины, затем из всего словаря"""
+        index = DistractorIndex(['cat', 'car', 'dog', 'elephant'])
+        for _ in range(50):
+            result = index.pick('cat')
+            self.assertEqual(len(result), 3)
+            self.assertEqual(result[0], 'car')
+            self.assertEqual(result[1], 'dog')
+            self.assertNotIn('cat', result)
+
+    def test_small_vocabulary(self):
+        index = DistractorIndex(['cat', 'dog', ' ', 'dog'])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.pick('cat'), ['dog'])
+        self.assertEqual(DistractorIndex().pick('cat'), [])
+
+
+class TestDistractorIndexFile(unittest.TestCase):
+    """Индекс сохраняется в файл и строится заново при изменении словаря"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'words.csv')
+        self.write_csv(['cat', 'car', 'dog'])
+
+    def write_csv(self, translations):
+        with open(self.path, 'w', encoding='utf-8') as csvfile:
+            csvfile.write('russian_word,english_word\n')
+            csvfile.writelines(f'слово{i},{text}\n' for i, text in enumerate(translations))
+
+    def test_saved_and_loaded(self):
+        index = DistractorIndex.build(VocabularyStore(self.path))
+        self.assertEqual(index.translations, ['car', 'cat', 'dog'])
+        with open(f'{self.path}.distractors.json', encoding='utf-8') as index_file:
+            self.assertEqual(json.load(index_file)['translations'], ['car', 'cat', 'dog'])
+        with patch.object(VocabularyStore, 'translations') as translations:
+            self.assertEqual(DistractorIndex.build(VocabularyStore(self.path)).groups, index.groups)
+        translations.assert_not_called()
+
+    def test_rebuilt_after_change(self):
+        DistractorIndex.build(VocabularyStore(self.path))
+        time.sleep(0.01)
+        self.write_csv(['cat', 'cow'])
+        self.assertEqual(DistractorIndex.build(VocabularyStore(self.path)).translations, ['cat', 'cow'])
+
+    def test_missing_vocabulary(self):
+        index = DistractorIndex.build(VocabularyStore(os.path.join(self.tmp.name, 'missing.csv')))
+        self.assertEqual(len(index), 0)
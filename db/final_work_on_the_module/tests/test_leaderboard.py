@@ -0,0 +1,195 @@
+import random
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import psycopg2
+
+from fakes import SQLiteTestCase
+from leaderboard import Leaderboard, RankedList
+
+
+def rows(points):
+    """Строки рейтинга {'telegram_user_id', 'name', 'points'} по словарю {telegram_user_id: очки}"""
+    return [{'telegram_user_id': tg_id, 'name': f'игрок{tg_id}', 'points': value} for tg_id, value in points.items()]
+
+
+class TestRankedList(unittest.TestCase):
+    """Тесты индексируемого списка с пропусками"""
+
+    def test_matches_sorted_list(self):
+        """Вставки и удаления в случайном порядке совпадают с отсортированным списком"""
+        rnd = random.Random(5)
+        ranked, expected = RankedList(), []
+        for _ in range(3000):
+            if expected and rnd.random() < 0.4:
+                key = rnd.choice(expected)
+                ranked.remove(key)
+                expected.remove(key)
+            else:
+                key = (rnd.randint(-50, 0), rnd.randint(0, 10 ** 6))
+                if key in expected:
+                    continue
+                ranked.insert(key)
+                expected.append(key)
+            expected.sort()
+        self.assertEqual(len(ranked), len(expected))
+        self.assertEqual(ranked.head(len(expected) + 1), expected)
+        for position, key in enumerate(expected):
+            self.assertEqual(ranked.index(key), position)
+            self.assertEqual(ranked[position], key)
+
+    def test_missing_key(self):
+        """Отсутствующий ключ и номер вне списка вызывают ошибку"""
+        ranked = RankedList([3, 1, 2])
+        self.assertRaises(KeyError, ranked.index, 5)
+        self.assertRaises(KeyError, ranked.remove, 5)
+        self.assertRaises(IndexError, ranked.__getitem__, 3)
+        self.assertEqual(ranked.head(2), [1, 2])
+
+
+class TestLeaderboard(unittest.TestCase):
+    """Тесты рейтинга игроков в памяти"""
+
+    def setUp(self):
+        self.points = {1: 10, 2: 30, 3: 20}
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return rows(self.points)
+
+    def test_rank_top_at(self):
+        """Место, первые игроки и игрок на месте"""
+        board = Leaderboard(self.loader)
+        self.assertEqual([user['telegram_user_id'] for user in board.top(3)], [2, 3, 1])
+        self.assertEqual(board.rank(1), 3)
+        self.assertEqual(board.at(1)['points'], 30)
+        self.assertIsNone(board.at(4))
+        self.assertIsNone(board.rank(99))
+        self.assertEqual(self.loads, 1)
+
+    def test_equal_points_ordered_by_id(self):
+        """При равных очках порядок определяется telegram_user_id, как в ORDER BY базы данных"""
+        self.points = {5: 10, 4: 10, 6: 10}
+        board = Leaderboard(self.loader)
+        self.assertEqual([board.at(position)['telegram_user_id'] for position in (1, 2, 3)], [4, 5, 6])
+
+    def test_updates_without_reload(self):
+        """Изменение очков и новые игроки меняют места без перезагрузки"""
+        board = Leaderboard(self.loader)
+        board.rank(1)
+        board.set_points(1, 35)
+        board.add_user(4, 'игрок4')
+        self.assertEqual(board.rank(1), 1)
+        self.assertEqual(board.rank(4), 4)
+        self.assertEqual(board.at(1)['points'], 35)
+        self.assertEqual(self.loads, 1)
+
+    def test_changes_before_load_ignored(self):
+        """До первой загрузки изменения не применяются: они уже будут в загруженных строках"""
+        board = Leaderboard(self.loader)
+        board.set_points(1, 100)
+        self.assertEqual(board.at(3)['points'], 10)
+
+    def test_stale_reload_in_background(self):
+        """Устаревший рейтинг перечитывается в фоне, запрос получает старые данные"""
+        release = threading.Event()
+        reloaded = threading.Event()
+        board = Leaderboard(self.loader, ttl=0.001)
+        board.rank(1)
+
+        def slow_loader():
+            release.wait(5)
+            result = self.loader()
+            reloaded.set()
+            return result
+
+        board.loader = slow_loader
+        self.points[1] = 100
+        time.sleep(0.01)
+        self.assertEqual(board.rank(1), 3)
+        release.set()
+        self.assertTrue(reloaded.wait(5))
+        board.ttl = 0
+        for _ in range(100):
+            if board.rank(1) == 1:
+                break
+            time.sleep(0.01)
+        self.assertEqual(board.rank(1), 1)
+
+    def test_journal_replayed(self):
+        """Изменения во время загрузки применяются поверх загруженных строк"""
+        board = Leaderboard(None)
+        board.load(rows(self.points))
+        board.track_changes()
+        board.set_points(1, 60)
+        board.add_user(4, 'игрок4', 5)
+        board.load(rows(self.points))
+        self.assertEqual(board.at(1)['telegram_user_id'], 1)
+        self.assertEqual(board.at(1)['points'], 60)
+        self.assertEqual(board.rank(4), 4)
+
+    def test_journal_change_already_loaded(self):
+        """Изменение, попавшее и в загруженные строки, и в журнал, учитывается один раз"""
+        board = Leaderboard(None)
+        board.load(rows(self.points))
+        board.track_changes()
+        board.set_points(1, 60)
+        board.add_user(4, 'игрок4')
+        self.points.update({1: 60, 4: 7})
+        board.load(rows(self.points))
+        self.assertEqual(board.at(1)['points'], 60)
+        self.assertEqual(board.at(4)['points'], 7)
+
+    def test_failed_reload_keeps_ranking(self):
+        """Ошибка загрузки сохраняет старый рейтинг"""
+        board = Leaderboard(self.loader, ttl=0)
+        board.rank(1)
+        board.loader = lambda: 1 / 0
+        self.assertTrue(board.begin_refresh())
+        board._refresh()
+        self.assertEqual(board.rank(2), 1)
+        self.assertTrue(board.begin_refresh())
+
+    def test_failed_first_load_retried(self):
+        """Ошибка первой загрузки не устанавливает пустой рейтинг: следующий запрос загружает его снова"""
+        board = Leaderboard(lambda: 1 / 0)
+        self.assertIsNone(board.rank(1))
+        self.assertFalse(board.is_loaded())
+        board.loader = self.loader
+        self.assertEqual(board.rank(1), 3)
+
+
+class TestLeaderboardSQLite(SQLiteTestCase):
+    """Рейтинг совпадает с сортировкой в базе данных"""
+
+    def test_matches_database(self):
+        rnd = random.Random(3)
+        for tg_id in range(1, 31):
+            self.db.save_user(f'игрок{tg_id}', tg_id)
+        self.db.leaderboard.rank(1)
+        for _ in range(100):
+            self.db.update_points(rnd.randint(1, 30), rnd.randint(1, 5), add=rnd.random() < 0.8)
+        expected = [row['telegram_user_id'] for row in self.db.get_player_ratings()]
+        self.assertEqual([user['telegram_user_id'] for user in self.db.leaderboard.top(30)], expected)
+        for position, tg_id in enumerate(expected, 1):
+            self.assertEqual(self.db.leaderboard.rank(tg_id), position)
+
+    def test_reload_does_not_double_count(self):
+        """Очки, записанные между началом журнала и чтением рейтинга, не учитываются дважды"""
+        self.db.save_user('игрок', 1)
+        self.db.leaderboard.rank(1)
+        self.db.leaderboard.track_changes()
+        self.db.update_points(1, 5)
+        self.db.leaderboard.load(self.db.get_player_ratings())
+        self.assertEqual(self.db.leaderboard.at(1)['points'], 5)
+
+    def test_database_error_raised(self):
+        """get_player_ratings передаёт ошибку базы данных, а не возвращает пустой рейтинг"""
+        self.db.save_user('игрок', 1)
+        with patch.object(self.db, '_execute', side_effect=psycopg2.OperationalError('нет соединения')):
+            self.assertRaises(psycopg2.OperationalError, self.db.get_player_ratings)
+            self.assertIsNone(self.db.leaderboard.rank(1))
+        self.assertEqual(self.db.leaderboard.rank(1), 1)
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from load_test import LoadTest, _turn, compare, count_statement, percentile
+from migrations import MigrationRunner
+
+
+class TestReport(unittest.TestCase):
+    """Тесты расчёта показателей отчёта"""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare(self):
+        def report(throughput, p50, sql):
+            return {'throughput_turns_per_s': throughput, 'latency_ms': {'p50': p50, 'p95': 0, 'p99': 0},
+                    'sql_per_turn': {'mean': sql}}
+
+        result = compare(report(150, 5, 4), report(100, 10, 4))
+        self.assertEqual(result['throughput_turns_per_s'], [100, 150, 50.0])
+        self.assertEqual(result['latency_p50_ms'], [10, 5, -50.0])
+        self.assertEqual(result['sql_per_turn'], [4, 4, 0.0])
+        self.assertIsNone(result['latency_p95_ms'][2])
+
+    def test_count_statement(self):
+        """Запросы считаются только внутри хода"""
+        _turn.statements = None
+        count_statement()
+        self.assertIsNone(_turn.statements)
+        _turn.statements = 0
+        count_statement()
+        count_statement()
+        self.assertEqual(_turn.statements, 2)
+        _turn.statements = None
+
+
+class TestLoadTestSQLite(unittest.TestCase):
+    """Короткий прогон нагрузочного теста на SQLite"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Словарь и индекс вариантов ответа ищутся по относительному пути
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+        with open('russian_english_words.csv', 'w', encoding='utf-8') as csvfile:
+            csvfile.write('russian_word,english_word\n')
+            csvfile.writelines(f'слово{i},word{i}\n' for i in range(100))
+
+    def test_run(self):
+        test = LoadTest(users=3, turns=5, sqlite_path=os.path.join(self.tmp.name, 'load.sqlite3'))
+        self.addCleanup(test.backend.close)
+        MigrationRunner(test.db).run()
+        test.db.seed_words()
+        report = test.run()
+        test.cleanup()
+
+        self.assertEqual(report['errors'], 0)
+        self.assertGreaterEqual(report['turns'], 3 * 7)
+        self.assertGreater(report['sql_per_turn']['total'], 0)
+        self.assertEqual(report['config']['backend'], 'sqlite')
+        self.assertEqual(test.db.select_data('users', 'id'), [])
@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from config import JsonFormatter, LazyQueueHandler, LOG_DATEFMT, LOG_FORMAT, RateLimitFilter, TextFormatter
+
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def record(message='запрос выполнен', level=logging.INFO, lineno=10, args=()):
+    return logging.LogRecord('database', level, 'database.py', lineno, message, args, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    """Тесты ограничения частоты записей лога"""
+
+    def test_rate_per_call_site(self):
+        """Из одного места вызова пропускается не больше rate записей в секунду"""
+        limit = RateLimitFilter(rate=2)
+        with patch('config.time.monotonic', return_value=100.0):
+            self.assertEqual([limit.filter(record()) for _ in range(5)], [True, True, False, False, False])
+            self.assertTrue(limit.filter(record(lineno=11)))
+        with patch('config.time.monotonic', return_value=101.0):
+            passed = record()
+            self.assertTrue(limit.filter(passed))
+        self.assertEqual(passed.suppressed, 3)
+        self.assertEqual(passed.getMessage(), 'запрос выполнен')
+
+    def test_warnings_not_limited(self):
+        limit = RateLimitFilter(rate=1)
+        with patch('config.time.monotonic', return_value=100.0):
+            self.assertTrue(all(limit.filter(record(level=logging.WARNING)) for _ in range(10)))
+
+
+class TestFormatters(unittest.TestCase):
+    """Тесты форматирования записей"""
+
+    def test_text(self):
+        formatter = TextFormatter(LOG_FORMAT, LOG_DATEFMT)
+        item = record('очков: %s', args=(5,))
+        self.assertTrue(formatter.format(item).endswith('INFO - очков: 5'))
+        item.suppressed = 4
+        self.assertTrue(formatter.format(item).endswith('очков: 5 (пропущено похожих записей: 4)'))
+
+    def test_json(self):
+        item = record('очков: %s', args=(5,))
+        entry = json.loads(JsonFormatter().format(item))
+        self.assertEqual((entry['message'], entry['level'], entry['logger']), ('очков: 5', 'INFO', 'database'))
+        self.assertNotIn('suppressed', entry)
+        item.suppressed = 2
+        self.assertEqual(json.loads(JsonFormatter().format(item))['suppressed'], 2)
+
+    def test_lazy_queue_handler(self):
+        """Запись кладётся в очередь без форматирования"""
+        item = record('очков: %s', args=(5,))
+        self.assertIs(LazyQueueHandler(None).prepare(item), item)
+        self.assertEqual(item.args, (5,))
+
+
+class TestConfigLogging(unittest.TestCase):
+    """Ограничение частоты подключается только к логгерам частых операций"""
+
+    def test_rate_loggers(self):
+        code = ('import logging, config; config.config_logging(); '
+                "print(','.join(name for name in ('database', 'webhook', 'handlers', 'main') "
+                'if logging.getLogger(name).filters))')
+        env = dict(os.environ, PYTHONPATH=MODULE_DIR, log_info_rate='5', log_rate_loggers='database, webhook')
+        result = subprocess.run([sys.executable, '-c', code], cwd=MODULE_DIR, capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'database,webhook')
+
+    def test_settings_argument(self):
+        """Переданные настройки заменяют LOGGING"""
+        code = ('import logging, config; '
+                "config.config_logging(settings=dict(config.LOGGING, format='json')); "
+                'print(type(logging.getLogger().handlers[0].formatter).__name__)')
+        env = dict(os.environ, PYTHONPATH=MODULE_DIR, log_format='text')
+        result = subprocess.run([sys.executable, '-c', code], cwd=MODULE_DIR, capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'JsonFormatter')
@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+import urllib.request
+
+from metrics import Histogram, MetricsServer, Registry, current_label, timed
+
+
+class TestMetrics(unittest.TestCase):
+    """Тесты метрик в формате Prometheus"""
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('test_errors_total', 'Ошибки', ('operation',))
+        counter.inc(operation='select')
+        counter.inc(2, operation='select')
+        counter.inc(operation='insert')
+        self.assertEqual(counter.value(operation='select'), 3)
+        self.assertEqual(counter.render()[2:], ['test_errors_total{operation="insert"} 1',
+                                                'test_errors_total{operation="select"} 3'])
+
+    def test_histogram(self):
+        """Корзины выводятся накопительно, с _sum и _count"""
+        histogram = Histogram('test_seconds', 'Время', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(histogram.render()[2:], ['test_seconds_bucket{le="0.1"} 1',
+                                                  'test_seconds_bucket{le="1.0"} 3',
+                                                  'test_seconds_bucket{le="+Inf"} 4',
+                                                  'test_seconds_sum 4.25',
+                                                  'test_seconds_count 4'])
+
+    def test_label_escaping(self):
+        counter = self.registry.counter('test_total', 'Счётчик', ('method',))
+        counter.inc(method='a"b\\c\nd')
+        self.assertEqual(counter.render()[2], 'test_total{method="a\\"b\\\\c\\nd"} 1')
+
+    def test_duplicate_name(self):
+        self.registry.counter('test_total', 'Счётчик')
+        with self.assertRaises(ValueError):
+            self.registry.histogram('test_total', 'Гистограмма')
+
+    def test_stats_gauge(self):
+        """Выводятся только числовые показатели, повторная регистрация заменяет функцию"""
+        self.registry.stats_gauge('test_pool', 'Пул', lambda: {'size': 1})
+        self.registry.stats_gauge('test_pool', 'Пул', lambda: {'size': 2, 'closed': False, 'name': 'pg'})
+        self.registry.stats_gauge('test_shards', 'Шарды', lambda: {0: {'depth': 3}}, label='shard')
+        self.registry.stats_gauge('test_broken', 'Ошибка', lambda: 1 / 0)
+        lines = self.registry.render().splitlines()
+        self.assertIn('test_pool{stat="size"} 2', lines)
+        self.assertIn('test_shards{shard="0",stat="depth"} 3', lines)
+        self.assertFalse([line for line in lines if 'closed' in line or 'name' in line])
+        self.assertIn('# TYPE test_broken gauge', lines)
+
+    def test_timed(self):
+        """timed записывает время и ошибки, метки доступны внутри блока"""
+        histogram = self.registry.histogram('test_seconds', 'Время', ('operation',))
+        errors = self.registry.counter('test_errors_total', 'Ошибки', ('operation',))
+
+        @timed(histogram, errors, operation='outer')
+        def work(fail):
+            with timed(histogram, operation='inner'):
+                self.assertEqual(current_label('operation'), 'inner')
+            self.assertEqual(current_label('operation'), 'outer')
+            if fail:
+                raise RuntimeError('ошибка')
+
+        work(False)
+        with self.assertRaises(RuntimeError):
+            work(True)
+        self.assertEqual(histogram.count(operation='outer'), 2)
+        self.assertEqual(histogram.count(operation='inner'), 2)
+        self.assertEqual(errors.value(operation='outer'), 1)
+        self.assertEqual(current_label('operation'), 'unknown')
+
+    def test_timed_coroutine(self):
+        """Корутина замеряется до завершения, метки задач asyncio не смешиваются"""
+        histogram = self.registry.histogram('test_seconds', 'Время', ('operation',))
+        errors = self.registry.counter('test_errors_total', 'Ошибки', ('operation',))
+        seen = []
+
+        async def work(name, delay, fail=False):
+            @timed(histogram, errors, operation=name)
+            async def step():
+                await asyncio.sleep(delay)
+                seen.append((name, current_label('operation')))
+                if fail:
+                    raise RuntimeError('ошибка')
+            await step()
+
+        async def main():
+            await asyncio.gather(work('slow', 0.05), work('fast', 0.01), work('broken', 0.02, fail=True),
+                                 return_exceptions=True)
+
+        asyncio.run(main())
+        self.assertEqual(sorted(seen), [('broken', 'broken'), ('fast', 'fast'), ('slow', 'slow')])
+        self.assertEqual(histogram.count(operation='slow'), 1)
+        slow_sum = [line for line in histogram.render() if line.startswith('test_seconds_sum{operation="slow"}')]
+        self.assertGreaterEqual(float(slow_sum[0].split()[-1]), 0.05)
+        self.assertEqual(errors.value(operation='broken'), 1)
+        self.assertEqual(errors.value(operation='slow'), 0)
+
+    def test_server(self):
+        self.registry.counter('test_total', 'Счётчик').inc()
+        server = MetricsServer(port=0, registry=self.registry)
+        server.start()
+        self.addCleanup(server.stop)
+        host, port = server.httpd.server_address[:2]
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics') as response:
+            self.assertIn('test_total 1', response.read().decode('utf-8').splitlines())
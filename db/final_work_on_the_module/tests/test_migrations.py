@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import psycopg2
+
+import migrations
+from backends import SQLiteBackend
+from database import Database
+from migrations import MIGRATIONS, MigrationRunner, migrate
+
+
+class TestSQLiteMigrations(unittest.TestCase):
+    """Тесты применения миграций к базе данных SQLite"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'bot.sqlite3')
+        self.backend = SQLiteBackend(self.path)
+        self.db = Database(backend=self.backend)
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmp.cleanup()
+
+    def test_apply_twice(self):
+        """Повторный запуск не применяет миграции заново и не меняет схему"""
+        versions = [migration.version for migration in MIGRATIONS]
+        self.assertEqual(MigrationRunner(self.db).run(), versions)
+        schema = self._schema()
+        self.assertEqual(MigrationRunner(self.db).run(), [])
+        self.assertEqual(self._schema(), schema)
+        self.assertEqual(self._versions(), versions)
+
+    def test_schema(self):
+        """После миграций есть все таблицы и индексы"""
+        MigrationRunner(self.db).run()
+        names = {name for _, name in self._schema()}
+        for name in ('users', 'word', 'users_word', 'word_schedule', 'game_session', 'schema_migrations',
+                     'word_random_key_idx', 'users_word_user_id_word_id_idx', 'users_points_idx'):
+            self.assertIn(name, names)
+
+    def test_new_migration_only(self):
+        """Добавленная миграция применяется отдельно от уже применённых"""
+        MigrationRunner(self.db, MIGRATIONS[:3]).run()
+        self.assertEqual(MigrationRunner(self.db).run(), [migration.version for migration in MIGRATIONS[3:]])
+
+    def test_failed_migration_rolls_back(self):
+        """Ошибка в миграции откатывает все миграции этого запуска"""
+        broken = migrations.Migration(99, 'Ошибка', sqlite=('CREATE TABLE broken (id INTEGER)', 'SELECT * FROM nope'))
+        with self.assertRaises(psycopg2.Error):
+            MigrationRunner(self.db, MIGRATIONS + [broken]).run()
+        self.assertEqual(self._schema(), [])
+
+    def _schema(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+        finally:
+            conn.close()
+
+    def _versions(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return [row[0] for row in conn.execute('SELECT version FROM schema_migrations ORDER BY version')]
+        finally:
+            conn.close()
+
+
+class TestMigrateRetry(unittest.TestCase):
+    """Тесты повтора миграций при недоступной базе данных"""
+
+    def test_retry_until_success(self):
+        """Ошибка подключения повторяется с задержкой"""
+        run = Mock(side_effect=[psycopg2.OperationalError('down'), [1, 2]])
+        with patch.object(MigrationRunner, 'run', run), patch.object(migrations.time, 'sleep') as sleep:
+            self.assertEqual(migrate(db=object(), attempts=3), [1, 2])
+        self.assertEqual(run.call_count, 2)
+        sleep.assert_called_once()
+
+    def test_give_up(self):
+        """После последней попытки ошибка передаётся вызывающему"""
+        run = Mock(side_effect=psycopg2.OperationalError('down'))
+        with patch.object(MigrationRunner, 'run', run), patch.object(migrations.time, 'sleep'):
+            with self.assertRaises(psycopg2.OperationalError):
+                migrate(db=object(), attempts=3)
+        self.assertEqual(run.call_count, 3)
+
+    def test_migration_error_not_retried(self):
+        """Ошибка в самой миграции не повторяется"""
+        run = Mock(side_effect=psycopg2.ProgrammingError('syntax'))
+        with patch.object(MigrationRunner, 'run', run), patch.object(migrations.time, 'sleep') as sleep:
+            with self.assertRaises(psycopg2.ProgrammingError):
+                migrate(db=object(), attempts=3)
+        self.assertEqual(run.call_count, 1)
+        sleep.assert_not_called()
@@ -0,0 +1,153 @@
+import threading
+import unittest
+from collections import deque
+
+from telebot.apihelper import ApiTelegramException
+
+from outbound import MAX_MESSAGE_LENGTH, MERGE_SEPARATOR, OutboundBot, OutboundMessage, TokenBucket, merge_messages
+
+
+def api_error(error_code, retry_after=None):
+    result_json = {'error_code': error_code, 'description': 'ошибка'}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class RecordingBot:
+    """Бот, который записывает отправленные сообщения; ошибки из fail отдаются по очереди"""
+
+    def __init__(self):
+        self.sent = []
+        self.fail = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.lock:
+            if self.fail:
+                raise self.fail.pop(0)
+            self.sent.append((chat_id, text, kwargs))
+            return f'message-{len(self.sent)}'
+
+    def register_next_step_handler(self, *args):
+        return 'next-step'
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты ограничения скорости token bucket"""
+
+    def test_burst_and_refill(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        bucket.updated = 100.0
+        self.assertEqual([bucket.take(now=100.0) for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.take(now=100.0), 0.5)
+        self.assertEqual(bucket.take(now=100.5), 0.0)
+        self.assertFalse(bucket.is_full(now=101.0))
+        self.assertTrue(bucket.is_full(now=102.0))
+        self.assertEqual(bucket.tokens, 3)
+
+
+class TestMergeMessages(unittest.TestCase):
+    """Тесты объединения сообщений одного чата"""
+
+    def test_plain_merged(self):
+        messages = deque([OutboundMessage('a'), OutboundMessage('b'), OutboundMessage('c', reply_markup='kb'),
+                          OutboundMessage('d')])
+        merged, count = merge_messages(messages)
+        self.assertEqual((merged.text, merged.reply_markup, count), (MERGE_SEPARATOR.join('abc'), 'kb', 3))
+        self.assertEqual([message.text for message in messages], ['d'])
+
+    def test_not_merged(self):
+        """Сообщения с параметрами и с разной разметкой не объединяются"""
+        messages = deque([OutboundMessage('a', kwargs={'disable_notification': True}), OutboundMessage('b')])
+        self.assertEqual(merge_messages(messages)[1], 1)
+        messages = deque([OutboundMessage('a', parse_mode='HTML'), OutboundMessage('b', parse_mode='MarkdownV2')])
+        self.assertEqual(merge_messages(messages)[1], 1)
+        messages = deque([OutboundMessage('a', reply_markup='kb'), OutboundMessage('b')])
+        self.assertEqual(merge_messages(messages)[1], 1)
+
+    def test_html_escaped(self):
+        """Текст без разметки экранируется рядом с HTML"""
+        messages = deque([OutboundMessage('<b>Счёт</b>', parse_mode='HTML'), OutboundMessage('1 < 2')])
+        merged, _ = merge_messages(messages)
+        self.assertEqual((merged.text, merged.parse_mode), ('<b>Счёт</b>' + MERGE_SEPARATOR + '1 &lt; 2', 'HTML'))
+
+    def test_length_limit(self):
+        messages = deque([OutboundMessage('a' * (MAX_MESSAGE_LENGTH - 1)), OutboundMessage('b')])
+        self.assertEqual(merge_messages(messages)[1], 1)
+
+    def test_futures_combined(self):
+        first, second = OutboundMessage('a', futures=['f1']), OutboundMessage('b', futures=['f2'])
+        merged, _ = merge_messages(deque([first, second]))
+        self.assertEqual(merged.futures, ['f1', 'f2'])
+
+
+class TestOutboundBot(unittest.TestCase):
+    """Тесты очереди исходящих сообщений"""
+
+    def setUp(self):
+        self.bot = RecordingBot()
+
+    def outbound(self, **kwargs):
+        params = {'workers': 2, 'global_rate': 1000.0, 'chat_rate': 1000.0, 'linger': 0.05}
+        params.update(kwargs)
+        outbound = OutboundBot(self.bot, **params)
+        self.addCleanup(outbound.close)
+        return outbound
+
+    def test_merged_future(self):
+        """Сообщения одного хода объединяются, их Future получают одно отправленное сообщение"""
+        outbound = self.outbound()
+        futures = [outbound.send_message(1, text) for text in ('a', 'b')]
+        other = outbound.send_message(2, 'c')
+        results = [future.result(5) for future in futures]
+        self.assertEqual(results[0], results[1])
+        self.assertNotEqual(other.result(5), results[0])
+        self.assertEqual(sorted(text for _, text, _ in self.bot.sent), [MERGE_SEPARATOR.join('ab'), 'c'])
+        self.assertEqual(outbound.stats()['merged'], 1)
+
+    def test_order_within_chat(self):
+        """Сообщения чата отправляются по порядку"""
+        outbound = self.outbound(linger=0)
+        for number in range(20):
+            # Сообщения с дополнительными параметрами не объединяются
+            outbound.send_message(1, str(number), disable_notification=True)
+        self.assertTrue(outbound.flush(5))
+        self.assertEqual([text for _, text, _ in self.bot.sent], [str(number) for number in range(20)])
+
+    def test_fractional_global_rate(self):
+        """Доля лимита меньше одного сообщения в секунду не блокирует отправку"""
+        outbound = self.outbound(global_rate=0.5)
+        self.assertEqual(outbound.send_message(1, 'a').result(5), 'message-1')
+
+    def test_rate_limited(self):
+        """После ответа 429 сообщение отправляется повторно"""
+        self.bot.fail = [api_error(429, retry_after=0.01)]
+        outbound = self.outbound()
+        self.assertEqual(outbound.send_message(1, 'a').result(5), 'message-1')
+        self.assertEqual(outbound.stats()['rate_limited'], 1)
+
+    def test_error_in_future(self):
+        """Ошибка отправки передаётся через Future"""
+        error = api_error(400)
+        self.bot.fail = [error]
+        outbound = self.outbound()
+        future = outbound.send_message(1, 'a')
+        self.assertIs(future.exception(5), error)
+        self.assertEqual(outbound.stats()['dropped'], 1)
+
+    def test_network_retries(self):
+        self.bot.fail = [ConnectionError('нет сети')]
+        outbound = self.outbound()
+        self.assertEqual(outbound.send_message(1, 'a').result(5), 'message-1')
+        self.assertEqual(outbound.stats()['retries'], 1)
+
+    def test_closed(self):
+        outbound = self.outbound()
+        outbound.close()
+        with self.assertRaises(RuntimeError):
+            outbound.send_message(1, 'a')
+
+    def test_other_attributes(self):
+        """Остальные методы берутся у исходного бота"""
+        self.assertEqual(self.outbound().register_next_step_handler(), 'next-step')
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import psycopg2
+from psycopg2 import extensions
+
+import pool
+from pool import ConnectionPool, PoolTimeout, is_connection_broken
+from fakes import FakeConnection
+
+TEST_DSN = os.getenv('test_dsn')
+
+
+def pg_error(cls, pgcode):
+    """Исключение psycopg2 с заданным SQLSTATE (pgcode у psycopg2 доступен только для чтения)"""
+    return type(cls.__name__, (cls,), {'pgcode': pgcode})('ошибка')
+
+
+class TestIsConnectionBroken(unittest.TestCase):
+    """Тесты решения, возвращать ли соединение в пул после ошибки"""
+
+    def test_closed(self):
+        """Закрытое соединение отбрасывается"""
+        conn = FakeConnection()
+        conn.closed = 2
+        self.assertTrue(is_connection_broken(conn, psycopg2.OperationalError()))
+
+    def test_connection_exception(self):
+        """Ошибки класса 08 означают потерю соединения"""
+        self.assertTrue(is_connection_broken(FakeConnection(), pg_error(psycopg2.OperationalError, '08006')))
+
+    def test_query_canceled(self):
+        """Отменённый запрос не ломает соединение"""
+        self.assertFalse(is_connection_broken(FakeConnection(), pg_error(psycopg2.OperationalError, '57014')))
+
+    def test_no_pgcode(self):
+        """Ошибка без SQLSTATE на открытом соединении не ломает его"""
+        self.assertFalse(is_connection_broken(FakeConnection(), psycopg2.InterfaceError()))
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Тесты пула соединений на заглушке psycopg2.connect"""
+
+    def setUp(self):
+        patcher = patch.object(pool.psycopg2, 'connect', side_effect=FakeConnection)
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_pool(self, **kwargs):
+        params = dict(minconn=0, maxconn=2, timeout=0.2, dbname='test')
+        params.update(kwargs)
+        result = ConnectionPool(**params)
+        self.addCleanup(result.close)
+        return result
+
+    def test_reuse(self):
+        """Возвращённое соединение выдаётся повторно без нового подключения"""
+        p = self.make_pool()
+        with p.connection() as first:
+            pass
+        with p.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual(p.stats()['idle'], 1)
+
+    def test_maxconn_timeout(self):
+        """Без свободных соединений acquire ждёт timeout и выбрасывает PoolTimeout"""
+        p = self.make_pool(maxconn=1, timeout=0.05)
+        conn = p.acquire()
+        with self.assertRaises(PoolTimeout):
+            p.acquire()
+        p.release(conn)
+        self.assertEqual(p.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        """Ожидающий поток получает соединение, как только его вернули"""
+        p = self.make_pool(maxconn=1, timeout=2)
+        conn = p.acquire()
+        result = []
+        thread = threading.Thread(target=lambda: result.append(p.acquire()))
+        thread.start()
+        time.sleep(0.05)
+        p.release(conn)
+        thread.join(2)
+        self.assertEqual(result, [conn])
+
+    def test_open_transaction_rolled_back(self):
+        """Незавершённая транзакция откатывается при возврате соединения"""
+        p = self.make_pool()
+        with p.connection() as conn:
+            conn.status = extensions.TRANSACTION_STATUS_INTRANS
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(p.stats()['idle'], 1)
+
+    def test_query_error_keeps_connection(self):
+        """Отменённый запрос не отбрасывает соединение и не считается переподключением"""
+        p = self.make_pool()
+        with self.assertRaises(psycopg2.OperationalError):
+            with p.connection() as conn:
+                conn.status = extensions.TRANSACTION_STATUS_INERROR
+                raise pg_error(psycopg2.OperationalError, '57014')
+        stats = p.stats()
+        self.assertEqual(stats['discarded'], 0)
+        self.assertEqual(stats['idle'], 1)
+        self.assertFalse(conn.closed)
+
+    def test_lost_connection_discarded(self):
+        """Соединение с ошибкой класса 08 закрывается и не возвращается в пул"""
+        p = self.make_pool()
+        with self.assertRaises(psycopg2.OperationalError):
+            with p.connection() as conn:
+                raise pg_error(psycopg2.OperationalError, '08006')
+        stats = p.stats()
+        self.assertEqual(stats['discarded'], 1)
+        self.assertEqual(stats['idle'], 0)
+        self.assertTrue(conn.closed)
+
+    def test_closed_idle_connection_replaced(self):
+        """Закрытое сервером свободное соединение заменяется новым"""
+        p = self.make_pool()
+        with p.connection() as conn:
+            pass
+        conn.closed = 2
+        with p.connection() as fresh:
+            pass
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(p.stats()['discarded'], 1)
+
+    def test_concurrent_use(self):
+        """Потоки не получают одно соединение одновременно и не превышают maxconn"""
+        p = self.make_pool(maxconn=3, timeout=5)
+        in_use, peak, lock = set(), [0], threading.Lock()
+
+        def work():
+            for _ in range(50):
+                with p.connection() as conn:
+                    with lock:
+                        self.assertNotIn(id(conn), in_use)
+                        in_use.add(id(conn))
+                        peak[0] = max(peak[0], len(in_use))
+                    with lock:
+                        in_use.discard(id(conn))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = p.stats()
+        self.assertLessEqual(peak[0], 3)
+        self.assertLessEqual(stats['created'], 3)
+        self.assertEqual(stats['acquired'], stats['released'])
+        self.assertEqual(stats['in_use'], 0)
+
+
+@unittest.skipUnless(TEST_DSN, 'нужен PostgreSQL: переменная окружения test_dsn')
+class TestConnectionPoolPostgres(unittest.TestCase):
+    """Тесты пула на настоящем сервере PostgreSQL"""
+
+    def setUp(self):
+        self.pool = ConnectionPool(minconn=1, maxconn=2, **extensions.parse_dsn(TEST_DSN))
+        self.addCleanup(self.pool.close)
+
+    def test_statement_timeout_keeps_connection(self):
+        """Отмена запроса по statement_timeout не закрывает соединение"""
+        with self.assertRaises(psycopg2.errors.QueryCanceled):
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute('SET LOCAL statement_timeout = 10')
+                    cur.execute('SELECT pg_sleep(1)')
+        with self.pool.connection() as again:
+            with again.cursor() as cur:
+                cur.execute('SELECT 1')
+                self.assertEqual(cur.fetchone(), (1,))
+        self.assertIs(again, conn)
+        self.assertEqual(self.pool.stats()['discarded'], 0)
+
+    def test_terminated_backend_discarded(self):
+        """Соединение, закрытое сервером, отбрасывается, следующее открывается заново"""
+        with self.pool.connection() as conn:
+            pid = conn.get_backend_pid()
+        with psycopg2.connect(TEST_DSN) as admin:
+            admin.autocommit = True
+            with admin.cursor() as cur:
+                cur.execute('SELECT pg_terminate_backend(%s)', (pid,))
+        time.sleep(0.1)
+        with self.assertRaises(psycopg2.OperationalError):
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+        with self.pool.connection() as fresh:
+            self.assertNotEqual(fresh.get_backend_pid(), pid)
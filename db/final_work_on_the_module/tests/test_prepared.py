@@ -0,0 +1,104 @@
+import os
+import unittest
+from unittest.mock import Mock
+
+import psycopg2
+from psycopg2 import errorcodes, extensions
+
+from database import Database
+from pool import ConnectionPool
+from prepared import PreparedConnection, StatementRegistry, numbered_placeholders
+
+TEST_DSN = os.getenv('test_dsn')
+
+
+def prepared_cursor(*prepared):
+    """Курсор соединения PreparedConnection с заданными подготовленными запросами"""
+    cur = Mock()
+    cur.connection = Mock(spec=PreparedConnection)
+    cur.connection.prepared = set(prepared)
+    return cur
+
+
+def pg_error(pgcode):
+    return type('ProgrammingError', (psycopg2.ProgrammingError,), {'pgcode': pgcode})('ошибка')
+
+
+class TestStatementRegistry(unittest.TestCase):
+    """Тесты реестра подготовленных запросов"""
+
+    def setUp(self):
+        self.registry = StatementRegistry()
+        self.registry.register('find', 'SELECT id FROM users WHERE telegram_user_id = %s AND name = %s')
+        self.registry.register('bump', 'UPDATE users SET points = points + %s')
+
+    def test_numbered_placeholders(self):
+        self.assertEqual(numbered_placeholders('SELECT %s, %s'), ('SELECT $1, $2', 2))
+        self.assertEqual(numbered_placeholders('SELECT 1'), ('SELECT 1', 0))
+
+    def test_idempotent(self):
+        """По умолчанию повторять после обрыва соединения можно только SELECT"""
+        self.assertEqual(self.registry.idempotent, {'find'})
+        self.registry.register('bump', 'UPDATE users SET points = 0', idempotent=True)
+        self.registry.register('find', '  select 1', idempotent=False)
+        self.assertEqual(self.registry.idempotent, {'bump'})
+
+    def test_invalid_name(self):
+        with self.assertRaises(ValueError):
+            self.registry.register('find users', 'SELECT 1')
+
+    def test_prepare_once(self):
+        """Запрос подготавливается на соединении один раз"""
+        cur = prepared_cursor()
+        self.assertEqual(self.registry.prepare(cur, 'find'), 'EXECUTE find (%s, %s)')
+        self.assertEqual(self.registry.prepare(cur, 'find'), 'EXECUTE find (%s, %s)')
+        cur.execute.assert_called_once_with('PREPARE find AS SELECT id FROM users WHERE telegram_user_id = $1'
+                                            ' AND name = $2')
+        self.assertEqual(self.registry.stats()['find']['prepares'], 1)
+
+    def test_plain_connection(self):
+        """На обычном соединении запрос выполняется без подготовки"""
+        cur = Mock()
+        self.assertEqual(self.registry.prepare(cur, 'bump'), 'UPDATE users SET points = points + %s')
+        cur.execute.assert_not_called()
+        self.assertFalse(self.registry.handle_error(cur, 'bump', pg_error(errorcodes.INVALID_SQL_STATEMENT_NAME)))
+
+    def test_handle_error(self):
+        """Набор подготовленных запросов соединения синхронизируется с сервером"""
+        cur = prepared_cursor('find')
+        self.assertTrue(self.registry.handle_error(cur, 'find', pg_error(errorcodes.INVALID_SQL_STATEMENT_NAME)))
+        self.assertEqual(cur.connection.prepared, set())
+        self.assertTrue(self.registry.handle_error(cur, 'bump', pg_error(errorcodes.DUPLICATE_PREPARED_STATEMENT)))
+        self.assertEqual(cur.connection.prepared, {'bump'})
+        self.assertFalse(self.registry.handle_error(cur, 'bump', pg_error(errorcodes.UNDEFINED_TABLE)))
+
+    def test_stats(self):
+        self.registry.record('find', 0.002)
+        self.registry.record('find', 0.004, error=True)
+        stats = self.registry.stats()['find']
+        self.assertEqual((stats['calls'], stats['errors'], stats['avg_ms'], stats['max_ms']), (2, 1, 3.0, 4.0))
+
+
+@unittest.skipUnless(TEST_DSN, 'нужен PostgreSQL: переменная окружения test_dsn')
+class TestPreparedPostgres(unittest.TestCase):
+    """Подготовленные запросы на сервере PostgreSQL"""
+
+    def setUp(self):
+        pool = ConnectionPool(minconn=1, maxconn=1, connection_factory=PreparedConnection,
+                              **extensions.parse_dsn(TEST_DSN))
+        self.addCleanup(pool.close)
+        self.db = Database(pool=pool)
+        self.db.statements.register('add_one', 'SELECT %s::int + 1')
+
+    def test_execute(self):
+        self.assertEqual(self.db.execute_prepared('add_one', (1,), fetch='one'), (2,))
+        self.assertEqual(self.db.execute_prepared('add_one', (5,), fetch='one'), (6,))
+        self.assertEqual(self.db.prepared_stats()['add_one']['prepares'], 1)
+
+    def test_session_reset(self):
+        """После сброса подготовленных запросов на сервере запрос подготавливается заново"""
+        self.db.execute_prepared('add_one', (1,), fetch='one')
+        with self.db.cursor() as cur:
+            cur.execute('DEALLOCATE ALL')
+        self.assertEqual(self.db.execute_prepared('add_one', (2,), fetch='one'), (3,))
+        self.assertEqual(self.db.prepared_stats()['add_one']['prepares'], 2)
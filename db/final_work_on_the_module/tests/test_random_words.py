@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from fakes import SQLiteTestCase
+
+
+class TestRandomWords(SQLiteTestCase):
+    """Тесты выбора случайных слов по индексированному случайному ключу"""
+
+    def setUp(self):
+        super().setUp()
+        self.words = {f'слово{i}': f'word{i}' for i in range(40)}
+        self.db.seed_words(self.write_csv(self.words.items()))
+        self.db.save_user('Анна', 1)
+
+    def test_quantity(self):
+        """Выбирается нужное количество разных слов из таблицы"""
+        for _ in range(20):
+            result = self.db.get_random_words_for_user(1, 4)
+            self.assertEqual(len(result), 4)
+            for word, translation in result.items():
+                self.assertEqual(self.words[word], translation)
+
+    def test_wrap_around(self):
+        """Если после случайной точки слов мало, окно продолжается с начала диапазона"""
+        with patch('utils.random.random', return_value=0.999999):
+            self.assertEqual(len(self.db.get_random_words_for_user(1, 4)), 4)
+
+    def test_small_table(self):
+        """Слов меньше, чем нужно, - возвращаются все"""
+        with self.db.cursor() as cur:
+            cur.execute("DELETE FROM word WHERE russian_words NOT IN ('слово1', 'слово2')")
+        self.assertEqual(self.db.get_random_words_for_user(1, 4), {'слово1': 'word1', 'слово2': 'word2'})
+
+    def test_shown_words_excluded(self):
+        """Слова, показанные пользователю 4 и более раз, не выбираются"""
+        shown = self.db.search_word('слово7')
+        for _ in range(4):
+            self.db.update_times_shown(1, shown)
+        for _ in range(50):
+            self.assertNotIn('слово7', self.db.get_random_words_for_user(1, 8))
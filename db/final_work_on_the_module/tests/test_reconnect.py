@@ -0,0 +1,106 @@
+import os
+import unittest
+from contextlib import contextmanager
+from unittest.mock import Mock, patch
+
+import psycopg2
+from psycopg2 import errorcodes, extensions
+
+from backends import PostgresBackend, SQLiteBackend
+from database import Database
+from pool import ConnectionPool, PoolTimeout, backoff_delay
+
+TEST_DSN = os.getenv('test_dsn')
+
+
+def pg_error(cls, pgcode=None):
+    return type(cls.__name__, (cls,), {'pgcode': pgcode})('ошибка')
+
+
+class TestBackoffDelay(unittest.TestCase):
+    """Тесты задержки повторного подключения"""
+
+    def test_bounds(self):
+        """Задержка растёт экспоненциально, не выходит за base и cap и различается между попытками"""
+        for attempt in range(1, 12):
+            delays = [backoff_delay(attempt, base=0.05, cap=5.0) for _ in range(50)]
+            self.assertGreaterEqual(min(delays), 0.05)
+            self.assertLessEqual(max(delays), min(5.0, 0.05 * 2 ** attempt))
+        self.assertGreater(len({backoff_delay(5) for _ in range(10)}), 1)
+
+
+class TestIsDisconnect(unittest.TestCase):
+    """Повторять можно только запросы, прерванные потерей соединения"""
+
+    def setUp(self):
+        self.backend = PostgresBackend(Mock(conn_params={'dbname': 'bot'}))
+
+    def test_disconnect(self):
+        self.assertTrue(self.backend.is_disconnect(pg_error(psycopg2.OperationalError)))
+        self.assertTrue(self.backend.is_disconnect(pg_error(psycopg2.InterfaceError)))
+        self.assertTrue(self.backend.is_disconnect(pg_error(psycopg2.OperationalError, errorcodes.ADMIN_SHUTDOWN)))
+
+    def test_not_disconnect(self):
+        self.assertFalse(self.backend.is_disconnect(PoolTimeout('нет свободных соединений')))
+        self.assertFalse(self.backend.is_disconnect(pg_error(psycopg2.OperationalError,
+                                                             errorcodes.QUERY_CANCELED)))
+        self.assertFalse(self.backend.is_disconnect(pg_error(psycopg2.IntegrityError)))
+
+
+class TestReplay(unittest.TestCase):
+    """Идемпотентный запрос повторяется один раз после потери соединения"""
+
+    def setUp(self):
+        self.backend = SQLiteBackend(':memory:')
+        self.addCleanup(self.backend.close)
+        self.db = Database(backend=self.backend)
+        self.failures = []
+        self.cur = Mock()
+        self.cur.fetchall.return_value = [(1,)]
+
+    @contextmanager
+    def cursor(self):
+        if self.failures:
+            raise self.failures.pop(0)
+        yield self.cur
+
+    def execute(self, idempotent):
+        with patch.object(self.db, 'cursor', self.cursor), \
+                patch.object(self.backend, 'is_disconnect', return_value=True):
+            return self.db._execute('SELECT 1', fetch='all', idempotent=idempotent)
+
+    def test_idempotent_replayed(self):
+        self.failures = [psycopg2.OperationalError('соединение потеряно')]
+        self.assertEqual(self.execute(idempotent=True), [(1,)])
+
+    def test_replayed_once(self):
+        self.failures = [psycopg2.OperationalError('соединение потеряно')] * 2
+        with self.assertRaises(psycopg2.OperationalError):
+            self.execute(idempotent=True)
+
+    def test_not_idempotent(self):
+        self.failures = [psycopg2.OperationalError('соединение потеряно')]
+        with self.assertRaises(psycopg2.OperationalError):
+            self.execute(idempotent=False)
+
+
+@unittest.skipUnless(TEST_DSN, 'нужен PostgreSQL: переменная окружения test_dsn')
+class TestReplayPostgres(unittest.TestCase):
+    """Повтор SELECT после завершения серверного процесса соединения"""
+
+    def setUp(self):
+        pool = ConnectionPool(minconn=1, maxconn=1, health_check_interval=3600, **extensions.parse_dsn(TEST_DSN))
+        self.addCleanup(pool.close)
+        self.db = Database(pool=pool)
+
+    def test_terminated_backend(self):
+        pid = self.db.select_data('(SELECT pg_backend_pid()) AS backend', 'pg_backend_pid')[0][0]
+        admin = psycopg2.connect(TEST_DSN)
+        try:
+            with admin, admin.cursor() as cur:
+                cur.execute('SELECT pg_terminate_backend(%s)', (pid,))
+        finally:
+            admin.close()
+        rows = self.db.select_data('(SELECT pg_backend_pid()) AS backend', 'pg_backend_pid')
+        self.assertEqual(len(rows), 1)
+        self.assertNotEqual(rows[0][0], pid)
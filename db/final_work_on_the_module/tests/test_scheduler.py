@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from fakes import SQLiteTestCase
+from scheduler import DAY, MIN_EASE, RELEARN_DELAY, Card, UserSchedule, WordScheduler
+
+
+class TestCard(unittest.TestCase):
+    """Тесты пересчёта интервалов по SM-2"""
+
+    def test_correct_answers(self):
+        """1 день, 6 дней, затем интервал растёт в ease раз"""
+        card = Card(1)
+        card.review(True, now=0)
+        self.assertEqual((card.interval, card.due, card.repetitions), (DAY, DAY, 1))
+        card.review(True, now=DAY)
+        self.assertEqual(card.interval, 6 * DAY)
+        card.review(True, now=7 * DAY)
+        self.assertAlmostEqual(card.interval, 6 * DAY * card.ease)
+        self.assertAlmostEqual(card.ease, 2.5)
+
+    def test_wrong_answer(self):
+        """Неправильный ответ сбрасывает серию и уменьшает ease"""
+        card = Card(1)
+        card.review(True, now=0)
+        card.review(False, now=100)
+        self.assertEqual((card.repetitions, card.lapses, card.interval), (0, 1, RELEARN_DELAY))
+        self.assertEqual(card.due, 100 + RELEARN_DELAY)
+        self.assertAlmostEqual(card.ease, 2.18)
+        for _ in range(10):
+            card.review(False, now=100)
+        self.assertEqual(card.ease, MIN_EASE)
+
+
+class TestUserSchedule(unittest.TestCase):
+    """Тесты кучи карточек пользователя"""
+
+    def test_peek_due(self):
+        schedule = UserSchedule([Card(1, due=50), Card(2, due=10), Card(3, due=500)])
+        self.assertIsNone(schedule.peek_due(now=5))
+        self.assertEqual(schedule.peek_due(now=60).word_id, 2)
+
+    def test_rescheduled_card(self):
+        """Устаревшая запись кучи после пересчёта карточки пропускается"""
+        schedule = UserSchedule([Card(1, due=10), Card(2, due=20)])
+        schedule.push(Card(1, due=1000))
+        self.assertEqual(schedule.peek_due(now=30).word_id, 2)
+        schedule.push(Card(2, due=2000))
+        self.assertIsNone(schedule.peek_due(now=30))
+        self.assertEqual(len(schedule.heap), 2)
+
+    def test_heap_rebuilt(self):
+        """Куча перестраивается, когда устаревших записей слишком много"""
+        schedule = UserSchedule([Card(1)])
+        for due in range(100):
+            schedule.push(Card(1, due=due))
+        self.assertLessEqual(len(schedule.heap), 2 * len(schedule.cards) + 16)
+        self.assertEqual(schedule.peek_due(now=99).due, 99)
+
+
+class TestWordScheduler(SQLiteTestCase):
+    """Планировщик повторений с записью в базу данных SQLite"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.save_user('Анна', 1)
+        self.db.save_word('кот', 'cat')
+        self.db.save_word('пёс', 'dog')
+        self.cat = self.db.search_word('кот')
+        self.dog = self.db.search_word('пёс')
+        self.scheduler = WordScheduler(self.db)
+
+    def test_empty(self):
+        self.assertIsNone(self.scheduler.next_due(1, now=0))
+
+    def test_due_after_interval(self):
+        """Слово возвращается, когда подошло время повторения"""
+        self.scheduler.record(1, self.cat, True, now=0)
+        self.scheduler.record(1, self.dog, False, now=0)
+        self.assertEqual(self.scheduler.next_due(1, now=RELEARN_DELAY), (self.dog, 'пёс', 'dog'))
+        self.scheduler.record(1, self.dog, True, now=RELEARN_DELAY)
+        self.assertIsNone(self.scheduler.next_due(1, now=DAY - 1))
+        self.assertEqual(self.scheduler.next_due(1, now=DAY)[0], self.cat)
+
+    def test_loaded_from_database(self):
+        """Новый планировщик читает расписание из базы данных вместе со словами"""
+        self.scheduler.record(1, self.cat, True, now=0)
+        self.scheduler.record(1, self.cat, True, now=DAY)
+        restarted = WordScheduler(self.db)
+        self.assertIsNone(restarted.next_due(1, now=DAY))
+        self.assertEqual(restarted.next_due(1, now=7 * DAY), (self.cat, 'кот', 'cat'))
+        self.assertEqual(restarted.translation(1, self.cat), 'cat')
+        card = restarted.record(1, self.cat, True, now=7 * DAY)
+        self.assertEqual(card.repetitions, 3)
+
+    def test_translation(self):
+        """Перевод берётся из расписания в памяти, без него - None"""
+        self.assertIsNone(self.scheduler.translation(1, self.cat))
+        self.scheduler.record(1, self.cat, False, now=0)
+        self.assertIsNone(self.scheduler.translation(1, self.cat))
+        self.scheduler.next_due(1, now=RELEARN_DELAY)
+        self.assertEqual(self.scheduler.translation(1, self.cat), 'cat')
+        self.assertIsNone(self.scheduler.translation(1, self.dog))
+
+    def test_load_failed_not_written(self):
+        """Если расписание не загрузилось, ответ не записывается и история в базе данных не заменяется"""
+        self.scheduler.record(1, self.cat, True, now=0)
+        self.scheduler.record(1, self.cat, True, now=DAY)
+        restarted = WordScheduler(self.db)
+        with patch.object(restarted, '_load', return_value=None):
+            self.assertIsNone(restarted.record(1, self.cat, False, now=7 * DAY))
+            self.assertIsNone(restarted.next_due(1, now=7 * DAY))
+        self.assertEqual(restarted.stats()['size'], 0)
+        card = restarted.record(1, self.cat, True, now=7 * DAY)
+        self.assertEqual(card.repetitions, 3)
+
+    def test_write_behind(self):
+        """С буфером отложенной записи карточка передаётся в буфер, а не записывается отдельной транзакцией"""
+        self.db.write_behind = Mock()
+        self.addCleanup(setattr, self.db, 'write_behind', None)
+        card = self.scheduler.record(1, self.cat, True, now=0)
+        self.db.write_behind.add_card.assert_called_once_with(1, self.cat, card.ease, DAY, 1, 0, DAY)
+        self.assertIsNone(WordScheduler(self.db).next_due(1, now=DAY))
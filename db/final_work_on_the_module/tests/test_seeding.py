@@ -0,0 +1,35 @@
+from fakes import SQLiteTestCase
+
+
+class TestSeedWords(SQLiteTestCase):
+    """Тесты массовой загрузки слов из CSV-файла"""
+
+    def words(self):
+        return self.db.select_data('word', 'russian_words, translation')
+
+    def test_seed(self):
+        """Все строки файла загружаются одной командой"""
+        path = self.write_csv([(f'слово{i}', f'word{i}') for i in range(500)])
+        report = self.db.seed_words(path)
+        self.assertEqual((report['read'], report['inserted']), (500, 500))
+        self.assertEqual(len(self.words()), 500)
+
+    def test_duplicates_skipped(self):
+        """Дубликаты в файле и уже загруженные слова пропускаются"""
+        self.db.seed_words(self.write_csv([('кот', 'cat'), ('пёс', 'dog')], 'first.csv'))
+        path = self.write_csv([('кот', 'cat'), ('дом', 'house'), ('дом', 'home')], 'second.csv')
+        report = self.db.seed_words(path)
+        self.assertEqual((report['read'], report['inserted']), (3, 1))
+        self.assertEqual(sorted(self.words()), [('дом', 'house'), ('кот', 'cat'), ('пёс', 'dog')])
+
+    def test_seed_twice(self):
+        """Повторная загрузка того же файла ничего не добавляет"""
+        path = self.write_csv([(f'слово{i}', f'word{i}') for i in range(50)])
+        self.db.seed_words(path)
+        report = self.db.seed_words(path)
+        self.assertEqual((report['read'], report['inserted']), (50, 0))
+
+    def test_missing_file(self):
+        """Без файла загрузка возвращает None и не меняет таблицу"""
+        self.assertIsNone(self.db.seed_words(self.tmp.name + '/missing.csv'))
+        self.assertEqual(self.words(), [])
@@ -0,0 +1,99 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from fakes import SQLiteTestCase
+from sessions import SessionStore
+
+
+class TestMemorySessionStore(unittest.TestCase):
+    """Хранилище сессий только в памяти"""
+
+    def store(self, **kwargs):
+        store = SessionStore(sweep_interval=3600, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_take_once(self):
+        """Ответ забирается один раз"""
+        store = self.store()
+        store.set(1, 5, 'cat')
+        self.assertEqual(store.get(1).answer, 'cat')
+        session = store.take(1)
+        self.assertEqual((session.word_id, session.answer), (5, 'cat'))
+        self.assertIsNone(store.take(1))
+        self.assertIsNone(store.get(1))
+
+    def test_replaced(self):
+        store = self.store()
+        store.set(1, 5, 'cat')
+        store.set(1, 6, 'dog')
+        self.assertEqual(store.take(1).word_id, 6)
+
+    def test_expired(self):
+        store = self.store(ttl=10)
+        store.set(1, 5, 'cat')
+        store.set(2, 6, 'dog')
+        with patch('sessions.time.time', return_value=time.time() + 11):
+            self.assertIsNone(store.get(1))
+            self.assertIsNone(store.take(1))
+            self.assertEqual(store.sweep(), 1)
+        self.assertEqual(store.stats()['expired'], 2)
+
+    def test_maxsize(self):
+        """При переполнении вытесняются самые старые сессии"""
+        store = self.store(maxsize=2)
+        for chat_id in range(3):
+            store.set(chat_id, chat_id, 'word')
+        self.assertIsNone(store.take(0))
+        self.assertIsNotNone(store.take(2))
+        self.assertEqual(store.stats()['evicted'], 1)
+
+
+class TestDatabaseSessionStore(SQLiteTestCase):
+    """Сессии в таблице game_session переживают перезапуск и забираются одним процессом"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.save_word('кот', 'cat')
+        self.db.save_word('пёс', 'dog')
+        self.cat = self.db.search_word('кот')
+        self.dog = self.db.search_word('пёс')
+
+    def store(self, **kwargs):
+        store = SessionStore(self.db, sweep_interval=3600, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_restored_after_restart(self):
+        self.store().set(1, self.cat, 'cat')
+        restarted = self.store()
+        self.assertEqual(restarted.get(1).answer, 'cat')
+        session = restarted.take(1)
+        self.assertEqual((session.word_id, session.answer), (self.cat, 'cat'))
+        self.assertEqual(restarted.stats()['restored'], 1)
+
+    def test_taken_by_one_process(self):
+        """Ответ, уже принятый другим процессом, не засчитывается второй раз"""
+        first, second = self.store(), self.store()
+        first.set(1, self.cat, 'cat')
+        self.assertIsNotNone(second.take(1))
+        self.assertIsNone(first.take(1))
+
+    def test_new_question_from_other_process(self):
+        first, second = self.store(), self.store()
+        first.set(1, self.cat, 'cat')
+        second.set(1, self.dog, 'dog')
+        self.assertEqual(first.take(1).answer, 'dog')
+
+    def test_sweep(self):
+        store = self.store(ttl=10)
+        store.set(1, self.cat, 'cat')
+        with patch('sessions.time.time', return_value=time.time() + 11):
+            store.sweep()
+        store.sweep()
+        self.assertEqual(self.db.select_data('game_session', 'chat_id'), [(1,)])
+        store.ttl = -1
+        store.set(2, self.dog, 'dog')
+        store.sweep()
+        self.assertEqual(self.db.select_data('game_session', 'chat_id'), [(1,)])
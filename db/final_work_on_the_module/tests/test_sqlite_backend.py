@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import psycopg2
+from psycopg2 import sql
+
+from backends import SQLiteBackend, translate_error, translate_query
+from database import Database
+from migrations import MigrationRunner
+
+
+class TestTranslateQuery(unittest.TestCase):
+    """Тесты перевода запросов PostgreSQL в синтаксис SQLite"""
+
+    def test_placeholders(self):
+        self.assertEqual(translate_query("SELECT * FROM word WHERE id = %s AND name LIKE '10%%'"),
+                         "SELECT * FROM word WHERE id = ? AND name LIKE '10%'")
+
+    def test_extract_epoch(self):
+        self.assertEqual(translate_query('SELECT extract( epoch FROM ws.due_at ) FROM word_schedule ws'),
+                         'SELECT ws.due_at FROM word_schedule ws')
+
+    def test_composable(self):
+        query = sql.SQL('SELECT {} FROM users WHERE id = %s').format(sql.SQL('name'))
+        self.assertEqual(translate_query(query), 'SELECT name FROM users WHERE id = ?')
+
+
+class TestTranslateError(unittest.TestCase):
+    """Ошибки sqlite3 преобразуются в исключения psycopg2 того же вида"""
+
+    def test_errors(self):
+        cases = [(sqlite3.IntegrityError, psycopg2.IntegrityError),
+                 (sqlite3.OperationalError, psycopg2.OperationalError),
+                 (sqlite3.ProgrammingError, psycopg2.ProgrammingError),
+                 (sqlite3.DatabaseError, psycopg2.DatabaseError)]
+        for sqlite_error, pg_error in cases:
+            error = translate_error(sqlite_error('текст'))
+            self.assertIs(type(error), pg_error)
+            self.assertEqual(str(error), 'текст')
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """Тесты встроенной базы данных SQLite"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'bot.sqlite3')
+        self.backend = SQLiteBackend(self.path)
+        self.addCleanup(self.backend.close)
+        self.db = Database(backend=self.backend)
+        MigrationRunner(self.db).run()
+
+    def test_wal(self):
+        with self.db.cursor() as cur:
+            cur.execute('PRAGMA journal_mode')
+            self.assertEqual(cur.fetchone()[0].lower(), 'wal')
+
+    def test_functions(self):
+        """now(), to_timestamp() и random() ведут себя как в PostgreSQL"""
+        with self.db.cursor() as cur:
+            cur.execute('SELECT now(), to_timestamp(%s), random()', (123.5,))
+            now, timestamp, value = cur.fetchone()
+        self.assertAlmostEqual(now, time.time(), delta=5)
+        self.assertEqual(timestamp, 123.5)
+        self.assertTrue(0 <= value < 1)
+
+    def test_integrity_error(self):
+        """Нарушение уникальности вызывает psycopg2.IntegrityError, транзакция откатывается"""
+        self.db.insert_data('word', {'russian_words': 'кот', 'translation': 'cat'})
+        with self.assertRaises(psycopg2.IntegrityError):
+            with self.db.cursor() as cur:
+                cur.execute('INSERT INTO word (russian_words, translation) VALUES (%s, %s)', ('пёс', 'dog'))
+                cur.execute('INSERT INTO word (russian_words, translation) VALUES (%s, %s)', ('кот', 'cat'))
+        self.assertEqual(self.db.select_data('word', 'russian_words'), [('кот',)])
+
+    def test_threads(self):
+        """Потоки пишут в одну базу через собственные соединения"""
+        def work(number):
+            for index in range(20):
+                self.db.insert_data('word', {'russian_words': f'слово{number}-{index}', 'translation': 'word'})
+
+        threads = [threading.Thread(target=work, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.db.select_data('word', 'id')), 80)
+        self.assertGreaterEqual(self.backend.stats()['created'], 4)
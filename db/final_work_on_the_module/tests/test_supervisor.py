@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+
+from telebot import types
+
+from supervisor import Supervisor, merge_metrics
+
+
+def message_update(update_id, chat_id):
+    return types.Update.de_json({'update_id': update_id,
+                                 'message': {'message_id': update_id, 'date': 0, 'text': str(update_id),
+                                             'chat': {'id': chat_id, 'type': 'private'},
+                                             'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Анна'}}})
+
+
+class TestMergeMetrics(unittest.TestCase):
+    """Тесты объединения метрик рабочих процессов"""
+
+    def test_worker_label(self):
+        """Строки процессов получают метку worker и группируются под общими HELP и TYPE"""
+        text = ('# HELP bot_total Счётчик\n# TYPE bot_total counter\nbot_total 3\n'
+                '# HELP bot_seconds Время\n# TYPE bot_seconds histogram\nbot_seconds_bucket{le="0.1"} 1\n')
+        merged = merge_metrics({'0': text, '1': text.replace(' 3', ' 5')}).splitlines()
+        self.assertEqual(merged, ['# HELP bot_total Счётчик', '# TYPE bot_total counter',
+                                  'bot_total{worker="0"} 3', 'bot_total{worker="1"} 5',
+                                  '# HELP bot_seconds Время', '# TYPE bot_seconds histogram',
+                                  'bot_seconds_bucket{worker="0",le="0.1"} 1',
+                                  'bot_seconds_bucket{worker="1",le="0.1"} 1'])
+
+    def test_empty_family(self):
+        self.assertEqual(merge_metrics({'0': '# HELP bot_pool Пул\n# TYPE bot_pool gauge\n'}),
+                         '# HELP bot_pool Пул\n# TYPE bot_pool gauge\n')
+
+
+class TestSupervisorRouting(unittest.TestCase):
+    """Обновления одного чата попадают в один рабочий процесс по порядку"""
+
+    def test_routing(self):
+        supervisor = Supervisor(workers=3, queue_size=100)
+        supervisor.process_new_updates([message_update(number, number % 5) for number in range(30)])
+        received = {}
+        for index, updates in enumerate(supervisor._queues):
+            for _ in range(supervisor._dispatched[index]):
+                update = updates.get(timeout=5)
+                received.setdefault(update.message.chat.id, []).append((index, update.update_id))
+        self.assertEqual(sum(supervisor._dispatched), 30)
+        for chat_id, items in received.items():
+            self.assertEqual({index for index, _ in items}, {chat_id % 3})
+            self.assertEqual([update_id for _, update_id in items], list(range(chat_id, 30, 5)))
+        stats = supervisor.stats()
+        self.assertEqual(stats['0']['alive'], 0)
+        self.assertEqual(sum(item['dispatched'] for item in stats.values()), 30)
+
+    def test_worker_rate(self):
+        """Общий лимит исходящих сообщений делится между рабочими процессами"""
+        with patch.dict('supervisor.OUTBOUND', global_rate=30):
+            self.assertEqual(Supervisor(workers=4, queue_size=1).worker_rate(), 7.5)
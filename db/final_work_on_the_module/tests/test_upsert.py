@@ -0,0 +1,62 @@
+import unittest
+
+from database import Subquery, build_upsert
+from fakes import SQLiteTestCase
+from utils import user_word_data
+
+
+class TestBuildUpsert(unittest.TestCase):
+    """Тесты формирования запроса INSERT ... ON CONFLICT"""
+
+    def test_do_update(self):
+        query, values = build_upsert('users_word', {'user_id': 1, 'word_id': 2, 'times_shown': 1},
+                                     ('user_id', 'word_id'), {'times_shown': 'users_word.times_shown + 1'})
+        self.assertEqual(query, 'INSERT INTO users_word (user_id, word_id, times_shown) VALUES (%s, %s, %s)'
+                                ' ON CONFLICT (user_id, word_id)'
+                                ' DO UPDATE SET times_shown = users_word.times_shown + 1 RETURNING id')
+        self.assertEqual(values, [1, 2, 1])
+
+    def test_do_nothing(self):
+        query, _ = build_upsert('word', {'russian_words': 'кот'}, ('russian_words',))
+        self.assertTrue(query.endswith(' ON CONFLICT (russian_words) DO NOTHING RETURNING id'))
+
+    def test_subquery(self):
+        """Значения подзапроса подставляются на его место среди значений запроса"""
+        query, values = build_upsert('users_word', user_word_data(5, 2), ('user_id', 'word_id'))
+        self.assertIn('VALUES ((SELECT id FROM users WHERE telegram_user_id = %s), %s, %s)', query)
+        self.assertEqual(values, [5, 2, 1])
+        _, values = build_upsert('t', {'a': Subquery('SELECT %s + %s', (1, 2)), 'b': 3}, ('a',))
+        self.assertEqual(values, [1, 2, 3])
+
+
+class TestTimesShownUpsert(SQLiteTestCase):
+    """Показы слова считаются одним запросом без предварительного SELECT"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.save_user('Анна', 1)
+        self.db.save_word('кот', 'cat')
+        self.word_id = self.db.search_word('кот')
+
+    def times_shown(self):
+        return self.db.select_data('users_word', 'times_shown, word_id')
+
+    def test_first_and_repeated_show(self):
+        """Первый показ создаёт строку, следующие увеличивают счётчик"""
+        self.db.update_times_shown(1, self.word_id)
+        self.assertEqual(self.times_shown(), [(1, self.word_id)])
+        self.db.update_times_shown(1, self.word_id)
+        self.db.update_times_shown(1, self.word_id)
+        self.assertEqual(self.times_shown(), [(3, self.word_id)])
+
+    def test_unknown_user_id(self):
+        """Без пользователя в кэше ID вычисляется подзапросом"""
+        self.db.user_cache.pop(1)
+        self.db.update_times_shown(1, self.word_id)
+        self.db.update_times_shown(1, self.word_id)
+        self.assertEqual(self.times_shown(), [(2, self.word_id)])
+
+    def test_do_nothing(self):
+        """Конфликт без обновления оставляет строку и возвращает None"""
+        self.assertIsNone(self.db.upsert('word', {'russian_words': 'кот', 'translation': 'dog'}, ('russian_words',)))
+        self.assertEqual(self.db.get_translation(self.word_id), 'cat')
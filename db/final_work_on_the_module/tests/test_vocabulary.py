@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from vocabulary import VocabularyStore
+
+
+class TestVocabularyStore(unittest.TestCase):
+    """Тесты словаря слов из CSV-файла в памяти"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'words.csv')
+        self.write_csv([(f'слово{i}', f'word{i}') for i in range(20)])
+
+    def write_csv(self, rows):
+        with open(self.path, 'w', encoding='utf-8') as csvfile:
+            csvfile.write('russian_word,english_word\n')
+            csvfile.writelines(f'{word},{translation}\n' for word, translation in rows)
+
+    def test_take_unique(self):
+        """Каждое слово выдаётся один раз"""
+        store = VocabularyStore(self.path)
+        taken = store.take(15) + store.take(15)
+        self.assertEqual(len(taken), 20)
+        self.assertEqual(len(set(taken)), 20)
+        self.assertEqual(store.take(1), [])
+        self.assertEqual(len(store), 0)
+
+    def test_csv_not_rewritten(self):
+        """Выдача слов не изменяет CSV-файл"""
+        with open(self.path, 'rb') as csvfile:
+            before = csvfile.read()
+        VocabularyStore(self.path).take(5)
+        with open(self.path, 'rb') as csvfile:
+            self.assertEqual(csvfile.read(), before)
+
+    def test_used_words_survive_restart(self):
+        """После перезапуска уже выданные слова не выдаются"""
+        first = set(VocabularyStore(self.path).take(12))
+        restarted = VocabularyStore(self.path)
+        self.assertEqual(len(restarted), 8)
+        self.assertFalse(first & set(restarted.take(20)))
+
+    def test_replaced_csv_resets_log(self):
+        """Если CSV-файл заменили, журнал использованных слов начинается заново"""
+        VocabularyStore(self.path).take(20)
+        time.sleep(0.01)
+        self.write_csv([('кот', 'cat'), ('пёс', 'dog')])
+        store = VocabularyStore(self.path)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(sorted(store.take(5)), [('кот', 'cat'), ('пёс', 'dog')])
+
+    def test_missing_file(self):
+        """Без CSV-файла словарь пуст"""
+        store = VocabularyStore(os.path.join(self.tmp.name, 'missing.csv'))
+        self.assertEqual(store.take(3), [])
+        self.assertEqual(store.translations(), [])
+
+    def test_translations_include_taken(self):
+        """translations возвращает переводы всех слов, включая выданные"""
+        store = VocabularyStore(self.path)
+        store.take(5)
+        self.assertEqual(sorted(store.translations()), sorted(f'word{i}' for i in range(20)))
+
+    def test_concurrent_take(self):
+        """Параллельные потоки не получают одно слово дважды"""
+        self.write_csv([(f'слово{i}', f'word{i}') for i in range(1000)])
+        store = VocabularyStore(self.path)
+        results, lock = [], threading.Lock()
+
+        def work():
+            for _ in range(50):
+                taken = store.take(3)
+                with lock:
+                    results.extend(taken)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 1000)
+        self.assertEqual(len(set(results)), 1000)
@@ -0,0 +1,109 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+from webhook import WebhookServer, replay_updates
+
+
+def update(update_id, chat_id=1):
+    """Обновление Telegram с текстовым сообщением"""
+    return {'update_id': update_id,
+            'message': {'message_id': update_id, 'date': 0, 'text': 'привет',
+                        'chat': {'id': chat_id, 'type': 'private'},
+                        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Анна'}}}
+
+
+class RecordingBot:
+    """Бот, который записывает полученные обновления"""
+
+    def __init__(self):
+        self.update_ids = []
+        self.lock = threading.Lock()
+
+    def process_new_updates(self, updates):
+        with self.lock:
+            self.update_ids.extend(item.update_id for item in updates)
+
+
+class TestWebhookServer(unittest.TestCase):
+    """Тесты приёма обновлений webhook-сервером"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.bot = RecordingBot()
+
+    def start(self, **kwargs):
+        server = WebhookServer(self.bot, port=0, **kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        host, port = server.httpd.server_address[:2]
+        return server, f'http://{host}:{port}'
+
+    def replay(self, updates, url, secret_token=None):
+        path = os.path.join(self.tmp.name, 'updates.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(updates, file)
+        return replay_updates(path, url, secret_token)
+
+    def test_updates_processed(self):
+        """Принятые обновления передаются обработчикам бота"""
+        server, base = self.start(workers=2)
+        self.assertEqual(self.replay([update(i) for i in range(10)], base + '/webhook'), [200] * 10)
+        server.updates.join()
+        self.assertEqual(sorted(self.bot.update_ids), list(range(10)))
+        self.assertEqual(server.stats()['processed'], 10)
+
+    def test_secret_token(self):
+        """Запрос без правильного секрета отклоняется"""
+        _, base = self.start(secret_token='secret')
+        self.assertEqual(self.replay(update(1), base + '/webhook'), [403])
+        self.assertEqual(self.replay(update(1), base + '/webhook', 'secret'), [200])
+
+    def test_bad_requests(self):
+        """Неизвестный путь - 404, некорректное тело - 400"""
+        _, base = self.start()
+        self.assertEqual(self.replay(update(1), base + '/other'), [404])
+        self.assertEqual(self.replay({'message': 'нет update_id'}, base + '/webhook'), [400])
+
+    def post(self, base, length, body=b''):
+        """POST с заданным заголовком Content-Length, None - без заголовка"""
+        host, port = base[len('http://'):].split(':')
+        connection = http.client.HTTPConnection(host, int(port), timeout=5)
+        self.addCleanup(connection.close)
+        connection.putrequest('POST', '/webhook', skip_accept_encoding=True)
+        if length is not None:
+            connection.putheader('Content-Length', length)
+        connection.endheaders(body)
+        return connection.getresponse().status
+
+    def test_content_length(self):
+        """Без корректного Content-Length - 400, тело больше max_body - 413"""
+        server, base = self.start(max_body=64)
+        self.assertEqual(self.post(base, None), 400)
+        self.assertEqual(self.post(base, 'abc'), 400)
+        self.assertEqual(self.post(base, '-1'), 400)
+        self.assertEqual(self.post(base, '65', b'x' * 65), 413)
+        body = json.dumps({'update_id': 1}).encode('utf-8')
+        self.assertEqual(self.post(base, str(len(body)), body), 200)
+        self.assertEqual(server.stats()['received'], 1)
+
+    def test_full_queue(self):
+        """Переполненная очередь отвечает 503, чтобы Telegram повторил доставку"""
+        server = WebhookServer(self.bot, port=0, queue_size=1, workers=0)
+        self.addCleanup(server.httpd.server_close)
+        self.assertTrue(server.enqueue(json.dumps(update(1))))
+        self.assertFalse(server.enqueue(json.dumps(update(2))))
+        self.assertEqual(server.stats()['rejected'], 1)
+
+    def test_status(self):
+        """GET /status возвращает статистику сервера"""
+        _, base = self.start(queue_size=7)
+        with urllib.request.urlopen(base + '/status') as response:
+            stats = json.load(response)
+        self.assertEqual(stats['queue_size'], 7)
+        self.assertEqual(stats['queue_depth'], 0)
@@ -0,0 +1,202 @@
+import os
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import psycopg2
+from psycopg2 import extensions
+
+from database import Database
+from migrations import MigrationRunner
+from pool import ConnectionPool
+from write_behind import WriteBehindBuffer
+
+TEST_DSN = os.getenv('test_dsn')
+TEST_SCHEMA = 'write_behind_test'
+
+
+class RecordingDatabase:
+    """База данных, курсор которой записывает запросы или завершается ошибкой"""
+
+    def __init__(self):
+        self.fail_with = None
+        self.cursor = Mock(side_effect=self._cursor)
+
+    def _cursor(self):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return Mock(__enter__=Mock(return_value=Mock()), __exit__=Mock(return_value=False))
+
+
+class TestWriteBehindBuffer(unittest.TestCase):
+    """Тесты суммирования и записи изменений буфером"""
+
+    def setUp(self):
+        self.db = RecordingDatabase()
+        patcher = patch('write_behind.execute_values')
+        self.execute_values = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def buffer(self, **kwargs):
+        params = {'max_batch': 1000, 'max_delay': 60.0}
+        params.update(kwargs)
+        buffer = WriteBehindBuffer(self.db, **params)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def written(self):
+        """Строки каждого запроса execute_values"""
+        return [sorted(call.args[2]) for call in self.execute_values.call_args_list]
+
+    def test_coalesced(self):
+        """Изменения одного пользователя и слова суммируются и пишутся одним запросом на таблицу"""
+        buffer = self.buffer()
+        for delta in (3, 3, -1):
+            buffer.add_points(1, delta)
+        buffer.add_points(2, 5)
+        buffer.add_times_shown(1, 10)
+        buffer.add_times_shown(1, 10)
+        buffer.add_times_shown(1, 11)
+        self.assertEqual(buffer.stats()['pending'], 7)
+        self.assertEqual(buffer.flush(), 7)
+        self.assertEqual(self.written(), [[(1, 5), (2, 5)], [(1, 10, 2), (1, 11, 1)]])
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(self.db.cursor.call_count, 1)
+
+    def test_failed_flush_rebuffered(self):
+        """При ошибке записи изменения возвращаются в буфер и записываются следующей попыткой"""
+        buffer = self.buffer()
+        buffer.add_points(1, 2)
+        self.db.fail_with = psycopg2.OperationalError('нет соединения')
+        self.assertEqual(buffer.flush(), 0)
+        buffer.add_points(1, 3)
+        self.assertEqual(buffer.stats()['errors'], 1)
+        self.db.fail_with = None
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.written(), [[(1, 5)]])
+
+    def test_raise_errors(self):
+        """raise_errors передаёт ошибку вызывающему, изменения остаются в буфере"""
+        buffer = self.buffer()
+        buffer.add_points(1, 2)
+        self.db.fail_with = psycopg2.OperationalError('нет соединения')
+        with self.assertRaises(psycopg2.OperationalError):
+            buffer.flush(raise_errors=True)
+        self.assertEqual(buffer.stats()['pending'], 1)
+
+    def test_flush_by_batch_size(self):
+        """Буфер записывается в фоне, когда накопилось max_batch изменений"""
+        buffer = self.buffer(max_batch=3)
+        for _ in range(3):
+            buffer.add_points(1, 1)
+        for _ in range(100):
+            if buffer.stats()['flushed']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.written(), [[(1, 3)]])
+
+    def test_flush_by_delay(self):
+        """Буфер записывается в фоне не позже max_delay после первого изменения"""
+        buffer = self.buffer(max_delay=0.05)
+        buffer.add_times_shown(1, 10)
+        for _ in range(100):
+            if buffer.stats()['flushed']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.written(), [[(1, 10, 1)]])
+
+    def test_cards_replaced(self):
+        """Карточка слова не суммируется: записывается последнее состояние, неудачная запись его не заменяет"""
+        buffer = self.buffer()
+        buffer.add_card(1, 10, 2.5, 60, 0, 1, 100.0)
+        self.db.fail_with = psycopg2.OperationalError('нет соединения')
+        buffer.flush()
+        buffer.add_card(1, 10, 2.6, 86400, 1, 1, 200.0)
+        self.db.fail_with = None
+        buffer.flush()
+        self.assertEqual(self.written(), [[(1, 10, 2.6, 86400, 1, 1, 200.0)]])
+
+    def test_on_points(self):
+        """После записи пачки on_points получает очки пользователей из RETURNING"""
+        saved = []
+        buffer = self.buffer(on_points=saved.extend)
+        self.execute_values.return_value = [(1, 7)]
+        buffer.add_points(1, 2)
+        buffer.flush()
+        self.assertEqual(saved, [(1, 7)])
+        self.assertTrue(self.execute_values.call_args.kwargs['fetch'])
+
+    def test_retry_delay_after_error(self):
+        """После ошибки записи полный буфер не записывается повторно без задержки"""
+        self.db.fail_with = psycopg2.OperationalError('нет соединения')
+        buffer = self.buffer(max_batch=1, max_delay=0.05, retry_cap=0.2)
+        buffer.add_points(1, 1)
+        time.sleep(0.3)
+        self.assertLessEqual(self.db.cursor.call_count, 4)
+        self.assertGreaterEqual(buffer.stats()['errors'], 1)
+        self.db.fail_with = None
+        for _ in range(100):
+            if buffer.stats()['flushed']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.written(), [[(1, 1)]])
+
+    def test_close_flushes(self):
+        """Закрытие буфера записывает оставшиеся изменения"""
+        buffer = self.buffer()
+        buffer.add_points(1, 4)
+        buffer.close()
+        self.assertEqual(self.written(), [[(1, 4)]])
+
+
+@unittest.skipUnless(TEST_DSN, 'нужен PostgreSQL: переменная окружения test_dsn')
+class TestWriteBehindPostgres(unittest.TestCase):
+    """Запись буфера в PostgreSQL во временной схеме"""
+
+    def setUp(self):
+        self._admin(f'DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE; CREATE SCHEMA {TEST_SCHEMA}')
+        self.addCleanup(self._admin, f'DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE')
+        pool = ConnectionPool(minconn=1, maxconn=2, options=f'-c search_path={TEST_SCHEMA}',
+                              **extensions.parse_dsn(TEST_DSN))
+        self.addCleanup(pool.close)
+        self.db = Database(pool=pool)
+        MigrationRunner(self.db).run()
+
+    @staticmethod
+    def _admin(query):
+        conn = psycopg2.connect(TEST_DSN)
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(query)
+        finally:
+            conn.close()
+
+    def test_flush(self):
+        """Очки и показы слов записываются суммами, строки users_word создаются при первом показе"""
+        user_id = self.db.insert_data('users', {'telegram_user_id': 1, 'name': 'Анна'})
+        word_id = self.db.insert_data('word', {'russian_words': 'кот', 'translation': 'cat'})
+        buffer = WriteBehindBuffer(self.db, max_batch=1000, max_delay=60.0)
+        self.addCleanup(buffer.close)
+        for _ in range(3):
+            buffer.add_points(1, 2)
+            buffer.add_times_shown(1, word_id)
+        saved = []
+        buffer.on_points = saved.extend
+        self.assertEqual(buffer.flush(), 6)
+        self.assertEqual(saved, [(1, 6)])
+        buffer.add_times_shown(1, word_id)
+        buffer.flush()
+        self.assertEqual(self.db.select_data('users', 'points', 'id = %s', (user_id,)), [(6,)])
+        self.assertEqual(self.db.select_data('users_word', 'times_shown', 'user_id = %s', (user_id,)), [(4,)])
+
+    def test_flush_cards(self):
+        """Из нескольких состояний карточки записывается последнее"""
+        user_id = self.db.insert_data('users', {'telegram_user_id': 1, 'name': 'Анна'})
+        word_id = self.db.insert_data('word', {'russian_words': 'кот', 'translation': 'cat'})
+        buffer = WriteBehindBuffer(self.db, max_batch=1000, max_delay=60.0)
+        self.addCleanup(buffer.close)
+        buffer.add_card(1, word_id, 2.5, 86400, 1, 0, 86400.0)
+        buffer.add_card(1, word_id, 2.6, 518400, 2, 0, 604800.0)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.db.select_data('word_schedule', 'interval_s, repetitions, EXTRACT(EPOCH FROM due_at)',
+                                             'user_id = %s', (user_id,)), [(518400, 2, 604800)])
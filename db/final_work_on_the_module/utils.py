@@ -3,18 +3,89 @@
     Включает классы для управления игровым процессом и базой данных, а также функции
     для работы с пользователями и словами.
 """
-import csv
 import logging
 import random
-
-from database import Database
-from config import config_logging
-from buttons import translation_buttons, start_button
+import sys
+import threading
+import time
+
+import psycopg2
+
+from database import Database, Subquery
+from migrations import migrate
+from vocabulary import VocabularyStore
+from distractors import DistractorIndex
+from config import (CALLBACK_DEDUP, GAME_MODE, LEADERBOARD_TTL, SCHEDULE_CACHE, SESSIONS, USER_CACHE, WRITE_BEHIND,
+                    config_logging)
+from cache import TTLCache
+from leaderboard import Leaderboard
+from scheduler import WordScheduler
+from sessions import SessionStore
+from metrics import DB_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS, timed
+from write_behind import WriteBehindBuffer
+from buttons import (CALLBACK_ANSWER, CALLBACK_NEXT, CALLBACK_RATING, answer_buttons, answer_token,
+                     continue_button, parse_callback, translation_buttons, start_button)
 from btn_text import VIEW_RATING
+from bot_msg import MSG_NO_WORDS
 
 logger = logging.getLogger('utils')
 config_logging()
 
+# Режим игры, в котором вопрос задаётся одним сообщением с инлайн-кнопками
+GAME_MODE_INLINE = 'inline'
+
+# Во сколько раз окно слов, читаемое по случайному ключу, больше запрошенного количества
+SAMPLE_WINDOW = 4
+
+
+def user_word_data(telegram_user_id, word_id, user_id=None):
+    """
+        Данные строки users_word для первого показа слова пользователю.
+        Если ID пользователя в базе данных неизвестен, он вычисляется подзапросом по его Telegram ID.
+
+        :param telegram_user_id: ID пользователя в Telegram.
+        :param word_id: ID слова.
+        :param user_id: ID пользователя в таблице users, если уже известен.
+
+        :return: dict Данные для Database.upsert.
+    """
+    if user_id is None:
+        user_id = Subquery('SELECT id FROM users WHERE telegram_user_id = %s', (telegram_user_id,))
+    return {
+        'user_id': user_id,
+        'word_id': word_id,
+        'times_shown': 1
+    }
+
+
+# Условие выборки окна слов по случайному ключу без слов, показанных пользователю 4 и более раз.
+# {op} - '>=' для чтения от случайной точки и '<' для перехода в начало диапазона.
+RANDOM_WORDS_CONDITION = """
+    w.random_key {op} %s
+    AND NOT EXISTS (
+        SELECT 1
+        FROM users_word uw
+        JOIN users u ON u.id = uw.user_id
+        WHERE u.telegram_user_id = %s AND uw.word_id = w.id
+        GROUP BY uw.word_id
+        HAVING SUM(uw.times_shown) >= 4
+    )
+    ORDER BY w.random_key
+    LIMIT %s
+"""
+
+# Частые запросы, выполняемые как подготовленные на сервере (PREPARE / EXECUTE)
+PREPARED_STATEMENTS = {
+    'search_user': 'SELECT id, name, points FROM users WHERE telegram_user_id = %s',
+    'search_word': 'SELECT id FROM word WHERE russian_words = %s',
+    'word_translation': 'SELECT translation FROM word WHERE id = %s',
+    'random_words_from': ('SELECT w.russian_words, w.translation FROM word w WHERE'
+                          + RANDOM_WORDS_CONDITION.format(op='>=')),
+    'random_words_wrap': ('SELECT w.russian_words, w.translation FROM word w WHERE'
+                          + RANDOM_WORDS_CONDITION.format(op='<')),
+    'update_points': 'UPDATE users SET points = points + %s WHERE telegram_user_id = %s RETURNING points',
+}
+
 
 class GameUtils:
     """
@@ -23,12 +94,28 @@ class GameUtils:
         Attributes:
             bot (telebot.TeleBot): Объект Telegram-бота для взаимодействия с Telegram API.
             db (DatabaseUtils): Объект для взаимодействия с базой данных.
+            vocabulary (VocabularyStore): Словарь слов из CSV-файла в памяти.
+            distractors (DistractorIndex): Неправильные варианты перевода по группам похожих слов.
+            scheduler (WordScheduler): Расписание повторений слов пользователей.
+            sessions (SessionStore): Ожидаемые ответы чатов в режиме reply.
+            mode (str): Режим игры: 'reply' - новое сообщение с обычной клавиатурой на каждый вопрос,
+                'inline' - одно сообщение с инлайн-кнопками, которое редактируется после ответа.
     """
 
-    def __init__(self, bot):
+    def __init__(self, bot, db=None, mode=None, sessions=None):
         self.bot = bot
-        self.db = DatabaseUtils()
-
+        self.db = db or DatabaseUtils(write_behind=WRITE_BEHIND['enabled'])
+        self.vocabulary = VocabularyStore('russian_english_words.csv')
+        self.distractors = DistractorIndex.build(self.vocabulary)
+        self.scheduler = WordScheduler(self.db, maxsize=SCHEDULE_CACHE['maxsize'], ttl=SCHEDULE_CACHE['ttl'])
+        self.sessions = sessions or SessionStore(self.db, ttl=SESSIONS['ttl'], maxsize=SESSIONS['maxsize'],
+                                                 sweep_interval=SESSIONS['sweep_interval'])
+        self.mode = mode or GAME_MODE
+        # Последний засчитанный ответ по (chat_id, message_id): повторное нажатие кнопки не засчитывается
+        self._answered = TTLCache(maxsize=CALLBACK_DEDUP['maxsize'], ttl=CALLBACK_DEDUP['ttl'])
+        self._answered_lock = threading.Lock()
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='get_user_name')
     def get_user_name(self, message):
         """
             Запрашивает имя пользователя и сохраняет его в базе данных, если оно ещё не сохранено.
@@ -48,6 +135,7 @@ class GameUtils:
             self.bot.send_message(chat_id, 'Игра продолжается!!')
             self.start_game(message)
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='save_user_name')
     def save_user_name(self, message):
         """
             Сохраняет имя пользователя в базе данных и начинает игру.
@@ -66,29 +154,56 @@ class GameUtils:
         self.bot.send_message(chat_id, f"Приятно познакомиться, {user_name}!\n Да начнется игра!!")
         self.start_game(message)
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='start_game')
     def start_game(self, message):
         """
             Начинает игру, предлагая пользователю слово для перевода и варианты перевода.
 
             Эта функция выбирает случайное слово, его правильный перевод и несколько
             неправильных вариантов перевода. После этого отправляет пользователю сообщение
-            с предложением выбрать правильный перевод.
+            с предложением выбрать правильный перевод. В режиме inline вопрос отправляется
+            с инлайн-кнопками, см. ask_inline.
 
             :param message: Сообщение от пользователя, содержащее его идентификатор.
         """
         chat_id = message.chat.id
-        word, correct_translation, text_buttons = self.word_generator(message)
+        if self.mode == GAME_MODE_INLINE:
+            self.ask_inline(chat_id, message)
+            return
+
+        generated = self.word_generator(message)
+        if generated is None:
+            self.bot.send_message(chat_id, MSG_NO_WORDS, reply_markup=start_button())
+            return
+        word, correct_translation, text_buttons, id_word_db = generated
 
         text_buttons.append(correct_translation)
-        id_word_db = self.db.search_word(word)
+        if id_word_db is None:
+            id_word_db = self.db.search_word(word)
         markup = translation_buttons(text_buttons)
 
+        self.sessions.set(chat_id, id_word_db, correct_translation)
         self.bot.send_message(chat_id, f"Как перевести слово '<b>{word}</b>'?",
                               reply_markup=markup, parse_mode="HTML")
 
-        self.bot.register_next_step_handler_by_chat_id(chat_id, self.check_answer,
-                                                       id_word_db, correct_translation)
+    def process_answer(self, message):
+        """
+            Передаёт сообщение в check_answer, если чат ожидает ответ на вопрос.
+
+            Ожидаемый ответ забирается из хранилища сессий, поэтому одно сообщение
+            засчитывается один раз, в том числе после перезапуска бота.
+
+            :param message: Сообщение от пользователя.
+
+            :return: True, если сообщение обработано как ответ, иначе False.
+        """
+        session = self.sessions.take(message.chat.id)
+        if session is None:
+            return False
+        self.check_answer(message, session.word_id, session.answer)
+        return True
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='check_answer')
     def check_answer(self, message, id_word, correct_translation):
         """
             Проверяет правильность ответа пользователя и обновляет его очки.
@@ -107,8 +222,7 @@ class GameUtils:
 
         if user_answer == correct_translation:
             self.bot.send_message(chat_id, "Превосходно! Вы справились! 🌟 +1 балл!")
-            self.db.update_points(user_id, 1)
-            self.db.update_times_shown(user_id, id_word)
+            self._record_answer(user_id, id_word, correct=True)
             self.start_game(message)
         elif user_answer == VIEW_RATING:
             result = self.display_player_rating(user_id)
@@ -117,41 +231,167 @@ class GameUtils:
                                   reply_markup=start_button())
         else:
             self.bot.send_message(chat_id, "Не совсем так. Но не отчаивайтесь! 💔 -3 балла!")
-            self.db.update_points(user_id, 3, add=False)
+            self._record_answer(user_id, id_word, correct=False)
             self.start_game(message)
 
+    def _record_answer(self, user_id, id_word, correct):
+        """
+            Начисляет или списывает очки за ответ и обновляет расписание повторений слова.
+
+            :param user_id: ID пользователя в Telegram.
+            :param id_word: Идентификатор слова в базе данных или None.
+            :param correct: Ответ правильный.
+        """
+        if correct:
+            self.db.update_points(user_id, 1)
+            self.db.update_times_shown(user_id, id_word)
+        else:
+            self.db.update_points(user_id, 3, add=False)
+        if id_word is not None:
+            self.scheduler.record(user_id, id_word, correct=correct)
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='ask_inline')
+    def ask_inline(self, chat_id, source, message_id=None, header=''):
+        """
+            Задаёт вопрос с инлайн-кнопками вариантов перевода.
+
+            Если передан message_id, вопрос заменяет текст этого сообщения, иначе отправляется
+            новое сообщение. Ответ приходит нажатием кнопки в handle_callback, поэтому
+            обработчик следующего шага не регистрируется.
+
+            :param chat_id: Идентификатор чата.
+            :param source: Сообщение или CallbackQuery пользователя (нужен from_user.id).
+            :param message_id: ID сообщения с предыдущим вопросом или None.
+            :param header: Текст перед вопросом, например результат предыдущего ответа.
+        """
+        generated = self.word_generator(source)
+        id_word_db = None
+        if generated is not None:
+            word, correct_translation, text_buttons, id_word_db = generated
+            text_buttons.append(correct_translation)
+            if id_word_db is None:
+                id_word_db = self.db.search_word(word)
+
+        if generated is None:
+            text = MSG_NO_WORDS
+            markup = continue_button()
+        elif id_word_db is None:
+            # Без ID слова ответ с кнопки нельзя проверить
+            logger.warning(f'Слово {word} не найдено в базе данных, вопрос не задан')
+            text = 'Не удалось подобрать слово, попробуйте ещё раз'
+            markup = continue_button()
+        else:
+            text = f"Как перевести слово '<b>{word}</b>'?"
+            markup = answer_buttons(id_word_db, text_buttons)
+        if header:
+            text = f'{header}\n\n{text}'
+
+        if message_id is None:
+            self.bot.send_message(chat_id, text, reply_markup=markup, parse_mode="HTML")
+        else:
+            if id_word_db is not None:
+                # Новый вопрос с тем же словом: ответ на него не должен считаться повторным нажатием
+                with self._answered_lock:
+                    if self._answered.get((chat_id, message_id)) == id_word_db:
+                        self._answered.pop((chat_id, message_id))
+            self.bot.edit_message_text(text, chat_id, message_id, reply_markup=markup, parse_mode="HTML")
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='handle_callback')
+    def handle_callback(self, call):
+        """
+            Обрабатывает нажатие инлайн-кнопки в режиме inline.
+
+            Ответ проверяется по переводу слова из базы данных: отпечаток правильного перевода
+            сравнивается с отпечатком из callback_data. Затем сообщение с вопросом редактируется:
+            в него записывается результат ответа и следующий вопрос. Повторное нажатие кнопки
+            того же вопроса не засчитывается.
+
+            :param call: CallbackQuery от пользователя.
+        """
+        chat_id = call.message.chat.id
+        message_id = call.message.message_id
+        user_id = call.from_user.id
+        kind, id_word, token = parse_callback(call.data)
+        self.bot.answer_callback_query(call.id)
+
+        if kind == CALLBACK_RATING:
+            result = self.display_player_rating(user_id)
+            self.bot.edit_message_text(result, chat_id, message_id, reply_markup=continue_button(),
+                                       parse_mode='HTML')
+        elif kind == CALLBACK_NEXT:
+            self.ask_inline(chat_id, call, message_id)
+        elif kind == CALLBACK_ANSWER:
+            key = (chat_id, message_id)
+            with self._answered_lock:
+                if self._answered.get(key) == id_word:
+                    return
+                self._answered.set(key, id_word)
+
+            # Перевод слова из расписания повторений берётся из памяти
+            translation = self.scheduler.translation(user_id, id_word) or self.db.get_translation(id_word)
+            if translation is None:
+                self.ask_inline(chat_id, call, message_id)
+                return
+            correct = answer_token(translation) == token
+            self._record_answer(user_id, id_word, correct=correct)
+            if correct:
+                header = "Превосходно! Вы справились! 🌟 +1 балл!"
+            else:
+                header = f"Не совсем так, правильно: <b>{translation}</b>. Не отчаивайтесь! 💔 -3 балла!"
+            self.ask_inline(chat_id, call, message_id, header)
+        else:
+            logger.warning(f'Неизвестные данные кнопки: {call.data!r}')
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='word_generator')
     def word_generator(self, message):
         """
         Генерирует слова для перевода и соответствующие варианты перевода.
 
-        Эта функция выбирает случайный источник слов (из CSV-файла или базы данных),
-        а затем извлекает одно слово и его перевод. Также она генерирует список
-        неправильных вариантов перевода для использования в качестве кнопок выбора.
+        Если пользователю пора повторить слово по расписанию, выбирается оно вместе с ID и переводом
+        из карточки расписания, без запросов к таблице word. Иначе функция
+        выбирает случайный источник слов (из CSV-файла или базы данных) и извлекает одно слово
+        и его перевод. Неправильные варианты берутся из индекса неправильных вариантов в памяти
+        без запросов к базе данных; только если словарь слишком мал, недостающие варианты
+        читаются из базы данных.
 
         :param message: Объект сообщения от пользователя в Telegram, используемый
                         для получения ID пользователя.
 
-        :return: Кортеж, содержащий выбранное слово, его правильный перевод и
-                 список неправильных вариантов перевода.
+        Если выбранный источник не вернул слов, слово читается из другого источника.
+
+        :return: Кортеж, содержащий выбранное слово, его правильный перевод,
+                 список неправильных вариантов перевода и ID слова (None, если слово
+                 выбрано не из расписания и его ID нужно найти в базе данных).
+                 None, если слов для пользователя нет ни в CSV-файле, ни в базе данных.
         """
         id_user = message.from_user.id
-        flag = random.randint(0, 1)
-        if flag == 0:
-            word_dicr = self.read_words_csv(id_user)
-
+        word_id = None
+        due = self.scheduler.next_due(id_user)
+        if due is not None:
+            word_id, word, translation = due
         else:
-            word_dicr = self.read_words_bd(id_user)
-
-        word = list(word_dicr.keys())[0]
-        translation = word_dicr[word]
-        text_buttons = list(word_dicr.values())[1:]
-        return word, translation, text_buttons
-
+            sources = [self.read_words_csv, self.read_words_bd]
+            random.shuffle(sources)
+            word_dicr = sources[0](id_user, 1) or sources[1](id_user, 1)
+            if not word_dicr:
+                logger.warning(f'Нет слов для пользователя {id_user}')
+                return None
+            word, translation = next(iter(word_dicr.items()))
+
+        text_buttons = self.distractors.pick(translation)
+        if len(text_buttons) < 3:
+            options = self.read_words_bd(id_user)
+            text_buttons += [option for option in options.values()
+                             if option != translation and option not in text_buttons][:3 - len(text_buttons)]
+        return word, translation, text_buttons, word_id
+
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='read_words_csv')
     def read_words_csv(self, user_id: int, quantity: int = 4):
         """
-            Читает указанное количество уникальных слов из CSV-файла,
+            Выдаёт указанное количество неиспользованных слов из словаря CSV-файла,
             проверяет их на дубликаты в базе данных, сохраняет найденные слова вместе
-            с их английскими переводами в словаре и удаляет выбранные слова из CSV-файла.
+            с их английскими переводами в словаре. Выданные слова отмечаются
+            в журнале хранилища и больше не выдаются.
 
             :param user_id: ID пользователя в Telegram.
             :param quantity: Необязательный параметр, определяющий требуемое количество слов
@@ -162,30 +402,19 @@ class GameUtils:
         """
         words_dict = {}
         try:
-            with open('russian_english_words.csv', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                words = list(reader)
-
-            selected_words = random.sample(words[1:],
-                                           len(words[1:]) if len(words[1:]) < quantity else quantity)
+            selected_words = self.vocabulary.take(quantity)
 
-            for word_list in selected_words:
-                check_word_bd = self.db.search_word(word_list[0])
+            for word, translation in selected_words:
+                check_word_bd = self.db.search_word(word)
                 if check_word_bd is None:
-                    self.db.save_word(word_list[0], word_list[1])
+                    self.db.save_word(word, translation)
 
-                words_dict[word_list[0]] = word_list[1]
+                words_dict[word] = translation
 
             if len(words_dict) < quantity:
                 result = self.db.get_random_words_for_user(user_id, quantity - len(words_dict))
                 words_dict.update(result)
 
-            remaining_words = [word for word in words if word not in selected_words]
-            with open('russian_english_words.csv', 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                for word in remaining_words:
-                    writer.writerow(word)
-
             return words_dict
 
         except Exception as e:
@@ -193,7 +422,8 @@ class GameUtils:
             words_dict.update(self.read_words_bd(user_id))
             return words_dict
 
-    def read_words_bd(self, user_id):
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='read_words_bd')
+    def read_words_bd(self, user_id, quantity: int = 4):
         """
         Запрашивает слова с переводом из базы данных.
 
@@ -202,17 +432,20 @@ class GameUtils:
         оставшиеся слова выбираются из CSV-файла.
 
         :param user_id: ID пользователя в Telegram.
+        :param quantity: Необязательный параметр, определяющий требуемое количество слов
+                         (по умолчанию 4).
 
         :return: dict Словарь, содержащий русские слова в качестве ключей и их
                  английские переводы в качестве значений.
         """
-        result = self.db.get_random_words_for_user(user_id)
+        result = self.db.get_random_words_for_user(user_id, quantity)
 
-        if len(result) < 4:
-            csv_word = self.read_words_csv(user_id, 4 - len(result))
+        if len(result) < quantity:
+            csv_word = self.read_words_csv(user_id, quantity - len(result))
             result.update(csv_word)
         return result
 
+    @timed(HANDLER_SECONDS, HANDLER_ERRORS, handler='display_player_rating')
     def display_player_rating(self, telegram_user_id):
         """
             Отображает рейтинг игроков с учетом позиции запрашивающего пользователя.
@@ -222,33 +455,33 @@ class GameUtils:
             - Если пользователь на 4 или 5 месте, отображаются его место и предыдущее.
             - Если пользователь на 6 месте или ниже, отображаются топ-3, многоточие и его место.
 
+            Место и записи берутся из рейтинга в памяти (Leaderboard), поэтому время
+            ответа не зависит от количества пользователей.
+
             :param telegram_user_id: Идентификатор пользователя в Telegram.
 
             :return: Сообщение с рейтингом для отправки пользователю.
         """
         msg = ''
-        rating_data = self.db.get_player_ratings()
-        user_position = None
-        for idx, user in enumerate(rating_data):
-            if user['telegram_user_id'] == telegram_user_id:
-                user_position = idx + 1
-                break
+        leaderboard = self.db.leaderboard
+        user_position = leaderboard.rank(telegram_user_id)
 
         if user_position:
             if user_position <= 3:
-                for idx, user in enumerate(rating_data[:3]):
+                for idx, user in enumerate(leaderboard.top(3)):
                     msg += self._format_rating_entry(user_position, idx + 1, user)
 
             elif user_position in [4, 5]:
-                for idx, user in enumerate(rating_data[:user_position]):
+                for idx, user in enumerate(leaderboard.top(user_position)):
                     msg += self._format_rating_entry(user_position, idx + 1, user)
 
             else:
-                for idx, user in enumerate(rating_data[:3]):
+                for idx, user in enumerate(leaderboard.top(3)):
                     msg += f'{self._get_medal(idx + 1)} {user["name"]} - "{user["points"]} очков"\n'
+                user = leaderboard.at(user_position)
                 msg += '...\n'
-                msg += f'<b>\t{user_position}.{rating_data[user_position - 1]["name"]} - ' \
-                       f'"{rating_data[user_position - 1]["points"]} очков"</b>'
+                msg += f'<b>\t{user_position}.{user["name"]} - ' \
+                       f'"{user["points"]} очков"</b>'
         else:
             msg += 'Пользователь не найден в рейтинге.'
         return msg
@@ -291,45 +524,85 @@ class GameUtils:
 class DatabaseUtils(Database):
     """
        Класс для управления базой данных, наследующий методы и свойства из класса Database.
+
+       Attributes:
+           leaderboard (Leaderboard): Рейтинг игроков в памяти, обновляемый при начислении очков.
+           write_behind (WriteBehindBuffer): Буфер отложенной записи очков и показов слов
+               или None, если изменения записываются сразу.
+           user_cache (TTLCache): Кэш {id, name, points} пользователей по Telegram ID.
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, write_behind=False, pool=None, backend=None):
+        """
+            :param write_behind: Записывать очки и показы слов через буфер отложенной записи.
+            :param pool: Необязательный готовый пул соединений.
+            :param backend: Необязательное готовое хранилище базы данных.
+        """
+        super().__init__(pool=pool, backend=backend)
+        for name, query in PREPARED_STATEMENTS.items():
+            self.statements.register(name, query)
+        self.leaderboard = Leaderboard(self.get_player_ratings, ttl=LEADERBOARD_TTL)
+        self.user_cache = TTLCache(maxsize=USER_CACHE['maxsize'], ttl=USER_CACHE['ttl'])
+        self.write_behind = None
+        if write_behind and self.backend.name == 'sqlite':
+            # Буфер пишет пачки запросами UPDATE ... FROM (VALUES ...) PostgreSQL, а запись в SQLite
+            # выполняется в процессе бота без сетевых задержек
+            logger.warning('Отложенная запись не поддерживается для SQLite, изменения записываются сразу')
+        elif write_behind:
+            self.write_behind = WriteBehindBuffer(self, max_batch=WRITE_BEHIND['max_batch'],
+                                                  max_delay=WRITE_BEHIND['max_delay'],
+                                                  on_points=self._points_saved,
+                                                  retry_cap=WRITE_BEHIND['retry_cap'])
+
+    def _points_saved(self, rows):
+        """
+           Передаёт в рейтинг очки пользователей, записанные буфером отложенной записи.
+
+           :param rows: Список кортежей (telegram_user_id, очки после записи).
+        """
+        for telegram_user_id, points in rows:
+            self.leaderboard.set_points(telegram_user_id, points)
 
     def add_tabl(self):
         """
-           Создает необходимые таблицы в базе данных:
+           Приводит схему базы данных к актуальной версии, применяя миграции из migrations.py:
            - users: информация о пользователях.
            - word: информация о словах и их переводах.
            - users_word: связь пользователей и слов, а также количество показов каждого слова.
+
+           :return: list Версии применённых миграций.
        """
-        table_name_user = 'users'
-        columns_user = [
-            ('id', 'SERIAL PRIMARY KEY'),
-            ('telegram_user_id', 'BIGINT NOT NULL UNIQUE'),
-            ('name', 'VARCHAR(255)'),
-            ('points', 'INTEGER DEFAULT 0')
-        ]
-
-        table_name_word = 'word'
-        columns_word = [
-            ('id', 'SERIAL PRIMARY KEY'),
-            ('russian_words', 'VARCHAR(255)'),
-            ('translation', 'VARCHAR(255)'),
-
-        ]
-
-        table_name_user_word = 'users_word'
-        columns_user_word = [
-            ('id', 'SERIAL PRIMARY KEY'),
-            ('user_id', 'INTEGER REFERENCES users(id) ON DELETE CASCADE'),
-            ('word_id', 'INTEGER REFERENCES word(id) ON DELETE CASCADE'),
-            ('times_shown', 'INTEGER DEFAULT 0')
-        ]
-
-        self.create_table(table_name_user, columns_user)
-        self.create_table(table_name_word, columns_word)
-        self.create_table(table_name_user_word, columns_user_word)
+        return migrate(self)
+
+    def seed_words(self, path='russian_english_words.csv'):
+        """
+            Массово загружает слова из CSV-файла в таблицу `word`.
+
+            Файл загружается одной транзакцией (в PostgreSQL - командой COPY), уже существующие
+            слова пропускаются по уникальному индексу на `russian_words`.
+
+            :param path: Путь к CSV-файлу в формате "russian_word,english_word" с заголовком.
+
+            :return: dict Количество прочитанных и добавленных строк, время загрузки
+                     в секундах и скорость в строках в секунду, или None при ошибке.
+        """
+        started = time.perf_counter()
+        result = self.bulk_insert_csv('word', ('russian_words', 'translation'), path,
+                                      conflict_columns=('russian_words',))
+        if result is None:
+            return None
+
+        elapsed = time.perf_counter() - started
+        read_rows, inserted_rows = result
+        report = {
+            'read': read_rows,
+            'inserted': inserted_rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(read_rows / elapsed) if elapsed else read_rows,
+        }
+        logger.info(f"Загрузка слов из {path}: прочитано {read_rows}, добавлено {inserted_rows} "
+                    f"за {report['seconds']} с ({report['rows_per_second']} строк/с)")
+        return report
 
     def save_user(self, name, tg_user_id):
         """
@@ -346,7 +619,10 @@ class DatabaseUtils(Database):
             'telegram_user_id': tg_user_id,
             'name': name
         }
-        self.insert_data(table_name=table_name, data=data)
+        user_id = self.insert_data(table_name=table_name, data=data)
+        if user_id is not None:
+            self.user_cache.set(tg_user_id, {'id': user_id, 'name': name, 'points': 0})
+            self.leaderboard.add_user(tg_user_id, name)
 
     def search_user(self, tg_user_id):
         """
@@ -356,23 +632,29 @@ class DatabaseUtils(Database):
         идентификатору в Телеграме. Если пользователь найден, возвращает словарь с
         информацией о пользователе (ID, имя, очки). В противном случае возвращает `None`.
 
+        Найденные пользователи кэшируются, повторные запросы обслуживаются из кэша.
+
         :param tg_user_id: int Идентификатор пользователя в Телеграме.
 
         :return: dict Словарь с информацией о пользователе (ID, имя, очки) или `None`,
                       если пользователь не найден.
         """
-        table_name = 'users'
-        columns = 'id,name,points'
-        values = (tg_user_id,)
-        condition = 'telegram_user_id = %s'
-        result = self.select_data(table_name=table_name, columns=columns,
-                                  values=values, condition=condition)
+        cached = self.user_cache.get(tg_user_id)
+        if cached is not None:
+            return dict(cached)
+
+        try:
+            result = self.execute_prepared('search_user', (tg_user_id,), fetch='all')
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка при поиске пользователя {tg_user_id}: {e}')
+            result = []
         if result:
             user_info = {
                 'id': result[0][0],
                 'name': result[0][1],
                 'points': result[0][2]
             }
+            self.user_cache.set(tg_user_id, dict(user_info))
         else:
             user_info = None
         return user_info
@@ -388,11 +670,32 @@ class DatabaseUtils(Database):
 
         :return: int Идентификатор слова в базе данных или `None`, если слово не найдено.
         """
-        table_name = 'word'
-        condition = 'russian_words = %s'
+        try:
+            result = self.execute_prepared('search_word', (word,), fetch='all')
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка при поиске слова {word}: {e}')
+            result = []
+        if result:
+            answer = result[0][0]
+        else:
+            answer = None
+        return answer
+
+    def get_translation(self, word_id):
+        """
+        Возвращает перевод слова по его ID.
+
+        Используется для проверки ответа, пришедшего с инлайн-кнопки.
 
-        result = self.select_data(table_name, 'id',
-                                  condition=condition, values=(word,))
+        :param word_id: int Идентификатор слова в базе данных.
+
+        :return: str Перевод слова или `None`, если слово не найдено.
+        """
+        try:
+            result = self.execute_prepared('word_translation', (word_id,), fetch='all')
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка при поиске перевода слова {word_id}: {e}')
+            result = []
         if result:
             answer = result[0][0]
         else:
@@ -422,10 +725,13 @@ class DatabaseUtils(Database):
 
             Функция выбирает слова, которые еще не были показаны пользователю 4 и более раз,
             и ограничивает выбор указанным количеством (по умолчанию 4).
-            Результаты выбираются случайным образом и возвращаются в виде словаря,
-            где ключами являются слова на русском языке, а значениями их переводы на английский.
+            Вместо сортировки всей таблицы через ORDER BY RANDOM() у каждого слова есть
+            индексированный случайный ключ `random_key`. Выбирается случайная точка и
+            читается небольшое окно слов по индексу начиная с неё (с переходом
+            в начало диапазона, если до конца не хватило слов), из окна берутся
+            случайные слова. Стоимость запроса не зависит от размера таблицы.
 
-            :param user_id: int Идентификатор пользователя в базе данных.
+            :param user_id: int Идентификатор пользователя в Telegram.
             :param quantity: int Количество случайных слов для выбора (по умолчанию 4).
 
             :return: dict Словарь с выбранными словами, где ключами являются русские слова,
@@ -433,83 +739,83 @@ class DatabaseUtils(Database):
         """
 
         words_dict = {}
-        table_name = 'word w'
-        columns = 'w.russian_words, w.translation'
-        condition = f"""
-            w.id NOT IN (
-                SELECT uw.word_id
-                FROM users_word uw
-                WHERE uw.user_id = {user_id}
-                GROUP BY uw.word_id
-                HAVING SUM(uw.times_shown) >= 4
-            )
-            ORDER BY RANDOM()
-            LIMIT {quantity};        
-        """
-
-        result_bd_word = self.select_data(table_name=table_name,
-                                          columns=columns,
-                                          condition=condition
-                                          )
-        for words in result_bd_word:
+        window = quantity * SAMPLE_WINDOW
+        start_key = random.random()
+
+        try:
+            result_bd_word = self.execute_prepared('random_words_from', (start_key, user_id, window),
+                                                   fetch='all')
+            if len(result_bd_word) < window:
+                result_bd_word += self.execute_prepared('random_words_wrap',
+                                                        (start_key, user_id, window - len(result_bd_word)),
+                                                        fetch='all')
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка при выборе случайных слов: {e}')
+            result_bd_word = []
+
+        for words in random.sample(result_bd_word, min(quantity, len(result_bd_word))):
             words_dict[words[0]] = words[1]
 
         return words_dict
 
     def update_points(self, user_id, points: int, add=True):
         """
-            Обновляет количество очков пользователя.
+            Обновляет количество очков пользователя в базе данных и в рейтинге.
+            Если включён буфер отложенной записи, изменение записывается в базу данных пачкой позже,
+            а рейтинг обновляется после записи пачки.
 
             :param user_id: ID пользователя, для которого обновляются очки.
             :param points: Количество очков для добавления или вычитания.
             :param add: Флаг, указывающий, добавлять (True) или вычитать (False) очки.
         """
-        if add:
-            data = {'points': f'points + {points}'}
-        else:
-            data = {'points': f'points - {points}'}
+        delta = points if add else -points
+        if self.write_behind:
+            self.write_behind.add_points(user_id, delta)
+            self._patch_cached_points(user_id, delta)
+            return
 
-        table_name = 'users'
-        condition = f'users.telegram_user_id = {user_id}'
-        self.update_data(table_name=table_name, data=data, condition=condition)
+        try:
+            row = self.execute_prepared('update_points', (delta, user_id), fetch='one')
+        except psycopg2.DatabaseError as e:
+            logger.error(f'Ошибка при обновлении очков пользователя {user_id}: {e}')
+            return
+        if row is not None:
+            self.leaderboard.set_points(user_id, row[0])
+            self._patch_cached_points(user_id, delta)
+
+    def _patch_cached_points(self, telegram_user_id, delta):
+        """
+            Применяет изменение очков к кэшу пользователей.
+
+            :param telegram_user_id: ID пользователя в Telegram.
+            :param delta: Изменение очков.
+        """
+        cached = self.user_cache.get(telegram_user_id)
+        if cached is not None:
+            self.user_cache.patch(telegram_user_id, points=cached['points'] + delta)
 
     def update_times_shown(self, telegram_user_id, word_id: int):
         """
         Обновляет количество показов слова для пользователя.
 
+        Выполняется одним запросом INSERT ... ON CONFLICT (user_id, word_id) DO UPDATE:
+        строка создаётся при первом показе, а дальше times_shown увеличивается на 1.
+        Если включён буфер отложенной записи, изменение записывается в базу данных пачкой позже.
+
         :param telegram_user_id: ID пользователя в Telegram.
         :param word_id: ID слова.
         """
-        table_name = 'users_word uw'
-        columns = 'uw.id'
-        condition = """ uw.word_id = %s
-                            AND uw.user_id = (
-                                SELECT u.id 
-                                FROM users AS u
-                                WHERE u.telegram_user_id = %s
-                            );
-                    """
-        values = (word_id, telegram_user_id)
-        user_word_id = self.select_data(table_name=table_name, columns=columns,
-                                        condition=condition, values=values)
-        if user_word_id:
-            data = {'times_shown': 'times_shown + 1'}
-            condition = 'id = %s'
-            values = (user_word_id[0][0],)
-            self.update_data(table_name=table_name[:-3], data=data,
-                             condition=condition, values=values)
-        else:
-            user_id = self.select_data(table_name='users', columns='id',
-                                       condition='telegram_user_id = %s',
-                                       values=(telegram_user_id,))
-
-            data = {
-                'user_id': user_id[0][0],
-                'word_id': word_id,
-                'times_shown': 1
-            }
-            self.insert_data(table_name='users_word', data=data)
+        if self.write_behind:
+            self.write_behind.add_times_shown(telegram_user_id, word_id)
+            return
 
+        cached = self.user_cache.get(telegram_user_id)
+        user_id = cached['id'] if cached else None
+        self.upsert('users_word', user_word_data(telegram_user_id, word_id, user_id),
+                    conflict_columns=('user_id', 'word_id'),
+                    update={'times_shown': 'users_word.times_shown + 1'})
+
+    @timed(DB_SECONDS, operation='get_player_ratings')
     def get_player_ratings(self):
         """
             Получает рейтинг игроков на основе их очков.
@@ -517,19 +823,22 @@ class DatabaseUtils(Database):
             Функция выполняет запрос к базе данных для получения списка игроков,
             отсортированного по количеству очков в порядке убывания. Возвращает
             результат в виде списка, где каждый элемент содержит идентификатор пользователя
-            в Telegram, имя и количество очков.
+            в Telegram, имя и количество очков. В отличие от select_data ошибка базы данных
+            не превращается в пустой список: рейтинг загружается из этой функции,
+            и пустой список заменил бы рейтинг всех игроков.
 
-            :return: list Список кортежей с информацией о пользователях,
+            :return: list Список словарей с информацией о пользователях,
                           отсортированный по убыванию очков.
+            :raises psycopg2.Error: При ошибке базы данных.
         """
-        table_name = 'users ORDER BY points DESC'
-        columns = 'telegram_user_id, name, points'
-
-        result = self.select_data(table_name=table_name, columns=columns)
-        rating_list = [{'telegram_user_id': row[0], 'name': row[1], 'points': row[2]} for row in result]
-        return rating_list
-
+        rows = self._execute('SELECT telegram_user_id, name, points FROM users '
+                             'ORDER BY points DESC, telegram_user_id', fetch='all', idempotent=True)
+        return [{'telegram_user_id': row[0], 'name': row[1], 'points': row[2]} for row in rows]
 
 if __name__ == '__main__':
     r = DatabaseUtils()
-    print(r.get_player_ratings())
+    if len(sys.argv) > 1 and sys.argv[1] == 'seed':
+        r.add_tabl()
+        print(r.seed_words(*sys.argv[2:3]))
+    else:
+        print(r.get_player_ratings())
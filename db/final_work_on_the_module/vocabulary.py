@@ -0,0 +1,145 @@
+"""
+    Модуль для работы со словарём слов из CSV-файла.
+    Файл загружается в память один раз, а использованные слова
+    записываются в отдельный журнал без перезаписи самого CSV-файла.
+"""
+import csv
+import logging
+import os
+import random
+import threading
+from array import array
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('vocabulary')
+
+
+class VocabularyStore:
+    """
+        Хранилище слов из CSV-файла в памяти.
+
+        Слова хранятся в двух параллельных списках, а номера ещё не выданных строк -
+        в компактном массиве. Выдача слова - это удаление случайного элемента
+        массива за O(1). Номера выданных строк дописываются в журнал, поэтому
+        после перезапуска уже использованные слова не выдаются повторно.
+
+        Attributes:
+            path (str): Путь к CSV-файлу в формате "russian_word,english_word" с заголовком.
+            log_path (str): Путь к журналу использованных строк.
+    """
+
+    def __init__(self, path='russian_english_words.csv', log_path=None):
+        """
+        Инициализация хранилища. Файл читается при первом обращении.
+
+        :param path: Путь к CSV-файлу со словами.
+        :param log_path: Путь к журналу использованных слов, по умолчанию "<path>.used".
+        """
+        self.path = path
+        self.log_path = log_path or f'{path}.used'
+        self._words = []
+        self._translations = []
+        self._available = array('I')
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def fingerprint(self):
+        """
+        Отпечаток CSV-файла: размер и время изменения.
+        Если файл заменили, журнал использованных слов начинается заново.
+
+        :return: str Строка-отпечаток.
+        """
+        stat = os.stat(self.path)
+        return f'# {stat.st_size}:{stat.st_mtime_ns}'
+
+    def _read_log(self, fingerprint):
+        """
+        Читает номера использованных строк из журнала.
+
+        :param fingerprint: Отпечаток текущего CSV-файла.
+        :return: set Номера использованных строк.
+        """
+        used = set()
+        try:
+            with open(self.log_path, encoding='utf-8') as log:
+                if log.readline().rstrip('\n') != fingerprint:
+                    return None
+                for line in log:
+                    line = line.strip()
+                    if line.isdigit():
+                        used.add(int(line))
+        except FileNotFoundError:
+            return None
+        return used
+
+    def load(self):
+        """
+        Загружает слова из CSV-файла и журнал использованных строк.
+        Повторный вызов ничего не делает.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                with open(self.path, newline='', encoding='utf-8') as csvfile:
+                    reader = csv.reader(csvfile)
+                    next(reader, None)  # заголовок
+                    for row in reader:
+                        if len(row) >= 2:
+                            self._words.append(row[0])
+                            self._translations.append(row[1])
+                fingerprint = self.fingerprint()
+            except FileNotFoundError:
+                logger.warning(f'Файл {self.path} не найден, слова берутся только из базы данных')
+                return
+
+            used = self._read_log(fingerprint)
+            if used is None:
+                used = set()
+                with open(self.log_path, 'w', encoding='utf-8') as log:
+                    log.write(f'{fingerprint}\n')
+
+            self._available = array('I', (idx for idx in range(len(self._words)) if idx not in used))
+            logger.info(f'Загружено слов из {self.path}: {len(self._words)}, '
+                        f'доступно: {len(self._available)}')
+
+    def take(self, quantity):
+        """
+        Выдаёт случайные неиспользованные слова и отмечает их в журнале.
+
+        :param quantity: Требуемое количество слов.
+        :return: list Список кортежей (русское слово, перевод), может быть короче quantity.
+        """
+        self.load()
+        with self._lock:
+            selected = []
+            for _ in range(min(quantity, len(self._available))):
+                pos = random.randrange(len(self._available))
+                self._available[pos], self._available[-1] = self._available[-1], self._available[pos]
+                selected.append(self._available.pop())
+
+            if selected:
+                with open(self.log_path, 'a', encoding='utf-8') as log:
+                    log.write(''.join(f'{idx}\n' for idx in selected))
+
+        return [(self._words[idx], self._translations[idx]) for idx in selected]
+
+    def translations(self):
+        """
+        Переводы всех слов словаря, включая уже выданные.
+
+        :return: list Список переводов.
+        """
+        self.load()
+        return list(self._translations)
+
+    def __len__(self):
+        """
+        Количество ещё не использованных слов.
+        """
+        self.load()
+        return len(self._available)
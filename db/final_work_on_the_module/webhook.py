@@ -0,0 +1,256 @@
+"""
+    Модуль для приёма обновлений Telegram через webhook.
+    Локальный HTTP-сервер принимает обновления, складывает их в ограниченную очередь,
+    а пул рабочих потоков передаёт их обработчикам бота.
+
+    Для проверки без Telegram записанные обновления можно отправить на сервер командой:
+        python webhook.py replay updates.json http://127.0.0.1:8080/webhook
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+from config import config_logging
+
+config_logging()
+logger = logging.getLogger('webhook')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+        HTTP-сервер для приёма обновлений Telegram.
+
+        POST-запрос на path кладёт обновление в очередь и сразу отвечает 200.
+        Если очередь заполнена, сервер отвечает 503, и Telegram повторит доставку позже.
+        Запрос без корректного Content-Length отклоняется с 400, а тело больше max_body байт -
+        с 413 без чтения.
+        GET-запрос на /status возвращает статистику и глубину очереди в JSON.
+
+        Attributes:
+            bot (telebot.TeleBot): Бот, обработчики которого получают обновления.
+            path (str): Путь, на который Telegram отправляет обновления.
+            secret_token (str): Секрет из заголовка X-Telegram-Bot-Api-Secret-Token.
+            updates (queue.Queue): Очередь принятых обновлений.
+            max_body (int): Максимальный размер тела запроса в байтах.
+    """
+
+    def __init__(self, bot, host='127.0.0.1', port=8080, path='/webhook',
+                 queue_size=1000, workers=4, secret_token=None, max_body=1048576):
+        """
+        Инициализация сервера и очереди обновлений.
+
+        :param bot: Объект TeleBot (лучше с threaded=False, чтобы обработка шла в потоках сервера).
+        :param host: Адрес, на котором слушает сервер.
+        :param port: Порт сервера.
+        :param path: Путь для приёма обновлений.
+        :param queue_size: Максимальная длина очереди обновлений.
+        :param workers: Количество рабочих потоков.
+        :param secret_token: Секрет для проверки запросов от Telegram, None - без проверки.
+        :param max_body: Максимальный размер тела запроса в байтах.
+        """
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.max_body = max_body
+        self.updates = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self._threads = []
+        self._stats = {'received': 0, 'processed': 0, 'rejected': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _count(self, name):
+        """
+        Увеличивает счётчик статистики.
+
+        :param name: Имя счётчика.
+        """
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """
+        Статистика сервера.
+
+        :return: dict Счётчики принятых, обработанных и отклонённых обновлений и глубина очереди.
+        """
+        with self._stats_lock:
+            result = dict(self._stats)
+        result['queue_depth'] = self.updates.qsize()
+        result['queue_size'] = self.updates.maxsize
+        result['workers'] = self.workers
+        return result
+
+    def enqueue(self, payload):
+        """
+        Разбирает обновление и кладёт его в очередь.
+
+        :param payload: str JSON-строка обновления Telegram.
+        :return: True, если обновление принято, False, если очередь заполнена.
+        :raises ValueError: Если тело запроса не является обновлением Telegram.
+        """
+        update = types.Update.de_json(payload)
+        if update is None:
+            raise ValueError('Пустое обновление')
+        try:
+            self.updates.put_nowait(update)
+        except queue.Full:
+            self._count('rejected')
+            logger.warning(f'Очередь обновлений заполнена ({self.updates.maxsize}), обновление отклонено')
+            return False
+        self._count('received')
+        return True
+
+    def _make_handler(self):
+        """
+        Создаёт класс обработчика HTTP-запросов, связанный с этим сервером.
+
+        :return: Подкласс BaseHTTPRequestHandler.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code, body=b''):
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                if server.secret_token and self.headers.get(SECRET_HEADER) != server.secret_token:
+                    self._reply(403)
+                    return
+                length = self.headers.get('Content-Length', '')
+                if not length.isdigit():
+                    logger.error(f'Некорректный заголовок Content-Length: {length!r}')
+                    self._reply(400)
+                    return
+                if int(length) > server.max_body:
+                    logger.error(f'Тело запроса {length} байт больше допустимых {server.max_body}')
+                    # Тело не читается, поэтому соединение нельзя использовать для следующего запроса
+                    self.close_connection = True
+                    self._reply(413)
+                    return
+                try:
+                    accepted = server.enqueue(self.rfile.read(int(length)).decode('utf-8'))
+                except (ValueError, KeyError) as e:
+                    logger.error(f'Некорректное обновление: {e}')
+                    self._reply(400)
+                    return
+                self._reply(200 if accepted else 503)
+
+            def do_GET(self):
+                if self.path != '/status':
+                    self._reply(404)
+                    return
+                self._reply(200, json.dumps(server.stats()).encode('utf-8'))
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def _worker(self):
+        """
+        Рабочий поток: берёт обновления из очереди и передаёт их обработчикам бота.
+        """
+        while True:
+            update = self.updates.get()
+            if update is None:
+                self.updates.task_done()
+                return
+            try:
+                self.bot.process_new_updates([update])
+                self._count('processed')
+            except Exception as e:
+                self._count('errors')
+                logger.error(f'Ошибка обработки обновления {update.update_id}: {e}', exc_info=True)
+            finally:
+                self.updates.task_done()
+
+    def _start_workers(self):
+        """
+        Запускает рабочие потоки обработки очереди.
+        """
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        host, port = self.httpd.server_address[:2]
+        logger.info(f'Webhook-сервер слушает http://{host}:{port}{self.path}')
+
+    def start(self):
+        """
+        Запускает рабочие потоки и HTTP-сервер в фоновом потоке.
+        """
+        self._start_workers()
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def serve_forever(self):
+        """
+        Запускает рабочие потоки и обслуживает HTTP-запросы в текущем потоке.
+        """
+        self._start_workers()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """
+        Останавливает приём запросов и дожидается обработки уже принятых обновлений.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.updates.join()
+        for _ in range(self.workers):
+            self.updates.put(None)
+
+
+def replay_updates(path, url, secret_token=None):
+    """
+    Отправляет записанные обновления на webhook-сервер.
+
+    :param path: Путь к JSON-файлу с обновлением или списком обновлений.
+    :param url: Адрес webhook-сервера.
+    :param secret_token: Секрет для заголовка X-Telegram-Bot-Api-Secret-Token.
+    :return: list Коды ответов сервера.
+    """
+    with open(path, encoding='utf-8') as file:
+        updates = json.load(file)
+    if isinstance(updates, dict):
+        updates = [updates]
+
+    codes = []
+    for update in updates:
+        request = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        if secret_token:
+            request.add_header(SECRET_HEADER, secret_token)
+        try:
+            with urllib.request.urlopen(request) as response:
+                codes.append(response.status)
+        except urllib.error.HTTPError as e:
+            codes.append(e.code)
+    return codes
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'replay':
+        target = sys.argv[3] if len(sys.argv) > 3 else 'http://127.0.0.1:8080/webhook'
+        print(replay_updates(sys.argv[2], target))
+    else:
+        print('Использование: python webhook.py replay <updates.json> [url]')
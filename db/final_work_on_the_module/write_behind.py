@@ -0,0 +1,273 @@
+"""
+    Модуль с буфером отложенной записи очков, количества показов слов и карточек расписания повторений.
+    Изменения копятся в памяти и записываются в базу данных пачкой одной транзакцией.
+"""
+import atexit
+import logging
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from config import config_logging
+from pool import backoff_delay
+
+config_logging()
+logger = logging.getLogger('write_behind')
+
+
+class WriteBehindBuffer:
+    """
+        Буфер отложенной записи для users.points, users_word.times_shown и word_schedule.
+
+        Изменения одного пользователя (и одного слова) суммируются в памяти,
+        из нескольких состояний одной карточки расписания записывается последнее.
+        Буфер записывается в базу данных, когда накопилось max_batch изменений
+        или прошло max_delay секунд с первого незаписанного изменения.
+        max_delay - максимальное окно потери данных при аварийном завершении процесса.
+        При обычном завершении буфер записывается через atexit.
+        После неудачной записи фоновый поток ждёт перед следующей попыткой с растущей задержкой
+        (не больше retry_cap секунд), даже если в буфере накопилось max_batch изменений.
+
+        Attributes:
+            db (Database): Объект базы данных, из пула которого берётся соединение.
+            max_batch (int): Количество изменений, после которого буфер записывается сразу.
+            max_delay (float): Максимальное время хранения изменения в памяти, секунды.
+            on_points (callable): Вызывается после записи пачки со списком
+                (telegram_user_id, очки после записи), например, чтобы обновить рейтинг. None - не вызывать.
+            retry_cap (float): Максимальная задержка повторной записи после ошибок, секунды.
+    """
+
+    def __init__(self, db, max_batch=200, max_delay=1.0, on_points=None, retry_cap=30.0):
+        """
+        Инициализация буфера и запуск фонового потока записи.
+
+        :param db: Объект Database.
+        :param max_batch: Количество изменений для немедленной записи.
+        :param max_delay: Максимальная задержка записи в секундах.
+        :param on_points: Функция, получающая записанные очки пользователей.
+        :param retry_cap: Максимальная задержка повторной записи после ошибок в секундах.
+        """
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_points = on_points
+        self.retry_cap = retry_cap
+        self._failures = 0
+        self._retry_at = None
+        self._points = {}
+        self._times_shown = {}
+        self._cards = {}
+        self._pending = 0
+        self._first_pending_at = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {'flushes': 0, 'flushed': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _add(self, target, key, value, replace=False):
+        """
+        Добавляет изменение в буфер и будит поток записи при необходимости.
+
+        :param target: Словарь изменений.
+        :param key: Ключ изменения.
+        :param value: Величина изменения.
+        :param replace: Заменить прежнее значение ключа, а не прибавить к нему.
+        """
+        with self._wakeup:
+            target[key] = value if replace else target.get(key, 0) + value
+            self._pending += 1
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+                self._wakeup.notify()
+            elif self._pending >= self.max_batch:
+                self._wakeup.notify()
+
+    def add_points(self, telegram_user_id, delta):
+        """
+        Откладывает изменение очков пользователя.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param delta: Изменение очков (отрицательное для вычитания).
+        """
+        self._add(self._points, telegram_user_id, delta)
+
+    def add_times_shown(self, telegram_user_id, word_id):
+        """
+        Откладывает увеличение количества показов слова пользователю.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param word_id: ID слова.
+        """
+        self._add(self._times_shown, (telegram_user_id, word_id), 1)
+
+    def add_card(self, telegram_user_id, word_id, ease, interval, repetitions, lapses, due):
+        """
+        Откладывает запись карточки слова в расписание повторений пользователя.
+
+        :param telegram_user_id: Идентификатор пользователя в Telegram.
+        :param word_id: ID слова.
+        :param ease: Коэффициент лёгкости SM-2.
+        :param interval: Интервал повторения в секундах.
+        :param repetitions: Правильных ответов подряд.
+        :param lapses: Всего неправильных ответов.
+        :param due: Время следующего показа (Unix time).
+        """
+        self._add(self._cards, (telegram_user_id, word_id), (ease, interval, repetitions, lapses, due), replace=True)
+
+    def _run(self):
+        """
+        Фоновый поток: записывает буфер по размеру или по времени,
+        а после ошибки записи - не раньше назначенного времени повтора.
+        """
+        while True:
+            with self._wakeup:
+                while not self._closed:
+                    if self._retry_at is not None:
+                        remaining = self._retry_at - time.monotonic()
+                        if remaining > 0:
+                            self._wakeup.wait(remaining)
+                            continue
+                    if self._pending >= self.max_batch:
+                        break
+                    if self._first_pending_at is not None:
+                        remaining = self._first_pending_at + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._wakeup.wait(remaining)
+                    else:
+                        self._wakeup.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self, raise_errors=False):
+        """
+        Записывает все накопленные изменения одной транзакцией.
+        При ошибке изменения возвращаются в буфер и будут записаны при следующей попытке.
+
+        :param raise_errors: Передать ошибку записи вызывающему после возврата изменений в буфер.
+        :return: int Количество записанных изменений.
+        """
+        with self._flush_lock:
+            with self._lock:
+                points, self._points = self._points, {}
+                times_shown, self._times_shown = self._times_shown, {}
+                cards, self._cards = self._cards, {}
+                pending, self._pending = self._pending, 0
+                self._first_pending_at = None
+            if not pending:
+                return 0
+
+            saved = []
+            try:
+                with self.db.cursor() as cur:
+                    if points:
+                        saved = execute_values(cur, """
+                            UPDATE users u
+                            SET points = u.points + v.delta
+                            FROM (VALUES %s) AS v(telegram_user_id, delta)
+                            WHERE u.telegram_user_id = v.telegram_user_id
+                            RETURNING u.telegram_user_id, u.points
+                        """, list(points.items()), fetch=True)
+                    if times_shown:
+                        self._write_times_shown(cur, [(tg_id, word_id, count)
+                                                      for (tg_id, word_id), count in times_shown.items()])
+                    if cards:
+                        self._write_cards(cur, [key + value for key, value in cards.items()])
+            except psycopg2.DatabaseError as e:
+                logger.error(f'Ошибка записи буфера ({pending} изменений), повтор позже: {e}')
+                with self._lock:
+                    for key, value in points.items():
+                        self._points[key] = self._points.get(key, 0) + value
+                    for key, value in times_shown.items():
+                        self._times_shown[key] = self._times_shown.get(key, 0) + value
+                    for key, value in cards.items():
+                        # Более новое состояние карточки, добавленное во время записи, не заменяется
+                        self._cards.setdefault(key, value)
+                    self._pending += pending
+                    if self._first_pending_at is None:
+                        self._first_pending_at = time.monotonic()
+                    self._stats['errors'] += 1
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + backoff_delay(self._failures, base=max(self.max_delay, 0.1),
+                                                                      cap=self.retry_cap)
+                if raise_errors:
+                    raise
+                return 0
+
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed'] += pending
+                self._failures = 0
+                self._retry_at = None
+            logger.info('Записано отложенных изменений: %s', pending)
+            if saved and self.on_points is not None:
+                # Вызывается под _flush_lock: очки одного пользователя передаются в порядке записи
+                self.on_points(saved)
+            return pending
+
+    @staticmethod
+    def _write_times_shown(cur, rows):
+        """
+        Увеличивает times_shown в users_word одним запросом INSERT ... ON CONFLICT DO UPDATE.
+
+        :param cur: Курсор открытой транзакции.
+        :param rows: Список кортежей (telegram_user_id, word_id, количество показов).
+        """
+        execute_values(cur, """
+            INSERT INTO users_word (user_id, word_id, times_shown)
+            SELECT u.id, v.word_id, v.shown
+            FROM (VALUES %s) AS v(telegram_user_id, word_id, shown)
+            JOIN users u ON u.telegram_user_id = v.telegram_user_id
+            ON CONFLICT (user_id, word_id) DO UPDATE SET times_shown = users_word.times_shown + EXCLUDED.times_shown
+        """, rows)
+
+    @staticmethod
+    def _write_cards(cur, rows):
+        """
+        Записывает карточки расписания в word_schedule одним запросом INSERT ... ON CONFLICT DO UPDATE.
+
+        :param cur: Курсор открытой транзакции.
+        :param rows: Список кортежей (telegram_user_id, word_id, ease, interval, repetitions, lapses, due).
+        """
+        execute_values(cur, """
+            INSERT INTO word_schedule (user_id, word_id, ease, interval_s, repetitions, lapses, due_at)
+            SELECT u.id, v.word_id, v.ease, v.interval_s, v.repetitions, v.lapses, to_timestamp(v.due::float8)
+            FROM (VALUES %s) AS v(telegram_user_id, word_id, ease, interval_s, repetitions, lapses, due)
+            JOIN users u ON u.telegram_user_id = v.telegram_user_id
+            ON CONFLICT (user_id, word_id) DO UPDATE SET
+                ease = EXCLUDED.ease,
+                interval_s = EXCLUDED.interval_s,
+                repetitions = EXCLUDED.repetitions,
+                lapses = EXCLUDED.lapses,
+                due_at = EXCLUDED.due_at
+        """, rows)
+
+    def stats(self):
+        """
+        Статистика буфера.
+
+        :return: dict Количество записей, записанных и ожидающих изменений, ошибок.
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result['pending'] = self._pending
+        return result
+
+    def close(self):
+        """
+        Останавливает фоновый поток и записывает оставшиеся изменения.
+        """
+        with self._wakeup:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+        self.flush()